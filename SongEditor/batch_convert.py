@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+
+from __future__ import annotations
+import argparse
+from dataclasses import dataclass, field
+import functools
+import os
+from typing import Callable, Iterable
+
+from batch_jobs import BatchJobs
+from funzl_board import FunzlBoard
+from midi_loader import MIDI_EXTENSIONS, MidiLoader
+from song_file import SongFile
+
+@dataclass
+class ConversionOptions:
+    output_dir: str
+    write_song: bool = True
+    write_header: bool = False
+    assign_buzzers: bool = False
+    fix_overlaps: bool = False
+
+@dataclass
+class ConversionResult:
+    source: str
+    outputs: list[str] = field(default_factory=list)
+    notes_count: int = 0
+    error: str | None = None
+
+class BatchConverter:
+    '''Converts MIDI files to song files and firmware headers on a process pool.'''
+
+    @staticmethod
+    def find_midi_files(paths: Iterable[str]) -> list[str]:
+        return BatchJobs.find_files(paths, MIDI_EXTENSIONS)
+
+    @staticmethod
+    def output_names(source: str, options: ConversionOptions) -> tuple[str | None, str | None]:
+        # MidiLoader names the song after the file, the header name is derived from the song name.
+        base_name = os.path.basename(source)
+        song_name = os.path.join(options.output_dir, os.path.splitext(base_name)[0] + '.fbsong')
+        header_name = os.path.join(options.output_dir, FunzlBoard.header_file_name(base_name))
+        return song_name if options.write_song else None, header_name if options.write_header else None
+
+    @staticmethod
+    def convert_file(source: str, options: ConversionOptions) -> ConversionResult:
+        result = ConversionResult(source=source)
+        try:
+            song = MidiLoader.load_midi_file(source)
+            if options.assign_buzzers:
+                song.auto_assign_buzzers()
+            if options.fix_overlaps:
+                song.fix_overlaps()
+            result.notes_count = song.notes_count
+
+            song_name, header_name = BatchConverter.output_names(source, options)
+            if song_name:
+                SongFile.save(song, song_name)
+                result.outputs.append(song_name)
+            if header_name:
+                with open(header_name, 'w') as f:
+                    f.write(FunzlBoard.export(song))
+                result.outputs.append(header_name)
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+        return result
+
+    @staticmethod
+    def convert_files(sources: Iterable[str], options: ConversionOptions, workers: int | None = None,
+                      progress_callback: Callable[[int, int, ConversionResult], None] | None = None
+                      ) -> list[ConversionResult]:
+        os.makedirs(options.output_dir, exist_ok=True)
+        return BatchJobs.run(sources, functools.partial(BatchConverter.convert_file, options=options),
+                             lambda source: [name for name in BatchConverter.output_names(source, options) if name],
+                             lambda source, error: ConversionResult(source=source, error=error),
+                             workers=workers, progress_callback=progress_callback)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert MIDI files to Funzl Board songs and firmware headers.")
+    parser.add_argument("inputs", nargs="+", help="MIDI files or directories to search for MIDI files")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--header", action="store_true", help="Also write firmware headers")
+    parser.add_argument("--no-song", action="store_true", help="Do not write .fbsong files")
+    parser.add_argument("--assign-buzzers", action="store_true", help="Assign buzzers automatically")
+    parser.add_argument("--fix-overlaps", action="store_true", help="Truncate overlapping notes")
+    args = parser.parse_args()
+
+    options = ConversionOptions(output_dir=args.output, write_song=not args.no_song, write_header=args.header,
+                                assign_buzzers=args.assign_buzzers, fix_overlaps=args.fix_overlaps)
+    sources = BatchConverter.find_midi_files(args.inputs)
+
+    def progress(done: int, total: int, result: ConversionResult):
+        status = f"error: {result.error}" if result.error else f"{result.notes_count} notes"
+        print(f"[{done}/{total}] {result.source}: {status}")
+
+    results = BatchConverter.convert_files(sources, options, workers=args.jobs, progress_callback=progress)
+    failed = [result for result in results if result.error]
+    print(f"Converted {len(results) - len(failed)} of {len(results)} files.")
+    for result in failed:
+        print(f"Failed: {result.source}: {result.error}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
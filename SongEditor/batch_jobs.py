@@ -0,0 +1,78 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+from typing import Callable, Iterable, TypeVar
+
+Result = TypeVar('Result')
+
+class BatchJobs:
+    '''Runs one job per input file on a process pool, shared by the batch scripts.
+
+    The results are returned in input order, so the output is the same for any number of workers.
+    '''
+
+    @staticmethod
+    def find_files(paths: Iterable[str], extensions: tuple[str, ...]) -> list[str]:
+        '''Files given directly, and the files with one of the extensions in the given directories.'''
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    files.extend(os.path.join(root, name) for name in sorted(names)
+                                 if name.lower().endswith(extensions))
+            else:
+                files.append(path)
+        return files
+
+    @staticmethod
+    def run(sources: Iterable[str], job: Callable[[str], Result], output_names: Callable[[str], Iterable[str]],
+            error_result: Callable[[str, str], Result], workers: int | None = None,
+            progress_callback: Callable[[int, int, Result], None] | None = None) -> list[Result]:
+        '''Calls job for every source, in worker processes unless workers is 1.
+
+        job must be picklable, e.g. a functools.partial of a module level function. error_result
+        makes the result of a source that failed outside of its job from the source and a message.
+        '''
+        sources = list(sources)
+        results: list[Result | None] = [None] * len(sources)
+
+        # Files that would overwrite the output of an earlier file are rejected up front, otherwise
+        # the surviving output would depend on which worker finishes last.
+        pending = []
+        outputs: dict[str, str] = {}
+        for i, source in enumerate(sources):
+            names = [os.path.normcase(name) for name in output_names(source)]
+            clash = next((outputs[name] for name in names if name in outputs), None)
+            if clash:
+                results[i] = error_result(source, f'Output name clashes with {clash}')
+            else:
+                outputs.update((name, source) for name in names)
+                pending.append(i)
+
+        done = 0
+        for result in results:
+            if result:
+                done += 1
+                if progress_callback:
+                    progress_callback(done, len(sources), result)
+        if workers == 1:
+            for i in pending:
+                results[i] = job(sources[i])
+                done += 1
+                if progress_callback:
+                    progress_callback(done, len(sources), results[i])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(job, sources[i]): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        # The worker process itself died, e.g. killed or out of memory.
+                        results[i] = error_result(sources[i], f'{type(e).__name__}: {e}')
+                    done += 1
+                    if progress_callback:
+                        progress_callback(done, len(sources), results[i])
+        return results
@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+from __future__ import annotations
+import argparse
+from dataclasses import dataclass
+import functools
+import os
+import time
+from typing import Callable, Iterable
+import wave
+
+import numpy as np
+
+from batch_jobs import BatchJobs
+from midi_loader import MIDI_EXTENSIONS, MidiLoader
+from note_columns import NoteColumns
+from song import Song
+from song_file import SongFile
+from synth import SquareWaveRenderer
+
+SONG_EXTENSIONS = ('.fbsong', '.json') + MIDI_EXTENSIONS
+
+class RenderTimeout(Exception):
+    pass
+
+class SilentSong(Exception):
+    pass
+
+@dataclass
+class RenderOptions:
+    output_dir: str
+    sample_rate: int = SquareWaveRenderer.SAMPLE_RATE
+    volume: float = 0.25
+    # Assign buzzers automatically, None for MIDI files only, as their notes have no buzzers.
+    assign_buzzers: bool | None = None
+    # Seconds per file, None for no limit.
+    time_limit: float | None = None
+
+@dataclass
+class RenderResult:
+    source: str
+    output: str | None = None
+    duration_us: int = 0
+    render_time: float = 0.0
+    error: str | None = None
+
+class BatchRenderer:
+    '''Renders songs and MIDI files to WAV files on a process pool.
+
+    The output is always 16 bit mono PCM at the requested sample rate. A file that takes longer than
+    the time limit is abandoned between render blocks and its partial output is removed. A song
+    without any note on a buzzer is an error, as its output would be silent.
+    '''
+
+    @staticmethod
+    def find_song_files(paths: Iterable[str]) -> list[str]:
+        return BatchJobs.find_files(paths, SONG_EXTENSIONS)
+
+    @staticmethod
+    def output_name(source: str, options: RenderOptions) -> str:
+        return os.path.join(options.output_dir, os.path.splitext(os.path.basename(source))[0] + '.wav')
+
+    @staticmethod
+    def load_song(source: str, deadline: float | None = None) -> Song:
+        if source.lower().endswith(MIDI_EXTENSIONS):
+            def check_deadline(track_index: int, track_count: int, messages: int):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise RenderTimeout()
+            return MidiLoader.load_midi_file(source, check_deadline)
+        return SongFile.load(source)
+
+    @staticmethod
+    def renderer(song: Song, sample_rate: int, volume: float) -> SquareWaveRenderer:
+        columns = [track.columns for track in song.tracks] or [NoteColumns.empty()]
+        return SquareWaveRenderer.from_arrays(np.concatenate([c.start_us for c in columns]),
+                                              np.concatenate([c.end_us for c in columns]),
+                                              np.concatenate([c.pitch for c in columns]),
+                                              np.concatenate([c.buzzer for c in columns]),
+                                              sample_rate, volume=volume)
+
+    @staticmethod
+    def render_file(source: str, options: RenderOptions) -> RenderResult:
+        result = RenderResult(source=source)
+        started = time.monotonic()
+        deadline = started + options.time_limit if options.time_limit is not None else None
+        output = BatchRenderer.output_name(source, options)
+        try:
+            song = BatchRenderer.load_song(source, deadline)
+            assign_buzzers = options.assign_buzzers
+            if assign_buzzers is None:
+                assign_buzzers = source.lower().endswith(MIDI_EXTENSIONS)
+            if assign_buzzers:
+                song.auto_assign_buzzers()
+            renderer = BatchRenderer.renderer(song, options.sample_rate, options.volume)
+            if not any(len(lane.starts) for lane in renderer.lanes):
+                raise SilentSong()
+            # The song ends with its last note, also if that note is not assigned to a buzzer.
+            sample_count = max(song.duration_us * options.sample_rate // 1000000, renderer.sample_count)
+            try:
+                with wave.open(output, 'wb') as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(options.sample_rate)
+                    for start in range(0, sample_count, SquareWaveRenderer.BLOCK_SAMPLES):
+                        if deadline is not None and time.monotonic() > deadline:
+                            raise RenderTimeout()
+                        f.writeframes(renderer.render(start, min(SquareWaveRenderer.BLOCK_SAMPLES,
+                                                                 sample_count - start)).tobytes())
+            except BaseException:
+                if os.path.exists(output):
+                    os.remove(output)
+                raise
+            result.output = output
+            result.duration_us = sample_count * 1000000 // options.sample_rate
+        except RenderTimeout:
+            result.error = f'Time limit of {options.time_limit:g} s exceeded'
+        except SilentSong:
+            result.error = 'No notes are assigned to a buzzer, the output would be silent'
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+        result.render_time = time.monotonic() - started
+        return result
+
+    @staticmethod
+    def render_files(sources: Iterable[str], options: RenderOptions, workers: int | None = None,
+                     progress_callback: Callable[[int, int, RenderResult], None] | None = None) -> list[RenderResult]:
+        os.makedirs(options.output_dir, exist_ok=True)
+        return BatchJobs.run(sources, functools.partial(BatchRenderer.render_file, options=options),
+                             lambda source: [BatchRenderer.output_name(source, options)],
+                             lambda source, error: RenderResult(source=source, error=error),
+                             workers=workers, progress_callback=progress_callback)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render Funzl Board songs and MIDI files to WAV files.")
+    parser.add_argument("inputs", nargs="+", help="Song or MIDI files, or directories to search for them")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("-r", "--sample-rate", type=int, default=SquareWaveRenderer.SAMPLE_RATE, help="Sample rate in Hz")
+    parser.add_argument("--volume", type=float, default=0.25, help="Volume of a single buzzer, 0 to 1")
+    assign = parser.add_mutually_exclusive_group()
+    assign.add_argument("--assign-buzzers", dest="assign_buzzers", action="store_const", const=True, default=None,
+                        help="Assign buzzers automatically, also for song files (default: MIDI files only)")
+    assign.add_argument("--no-assign-buzzers", dest="assign_buzzers", action="store_const", const=False,
+                        help="Keep the buzzers of the input, MIDI files without buzzers fail as silent")
+    parser.add_argument("-t", "--time-limit", type=float, default=None, help="Seconds allowed per file")
+    args = parser.parse_args()
+
+    options = RenderOptions(output_dir=args.output, sample_rate=args.sample_rate, volume=args.volume,
+                            assign_buzzers=args.assign_buzzers, time_limit=args.time_limit)
+    sources = BatchRenderer.find_song_files(args.inputs)
+
+    def progress(done: int, total: int, result: RenderResult):
+        status = f"error: {result.error}" if result.error else \
+            f"{result.duration_us / 1000000:.1f} s of audio in {result.render_time:.2f} s"
+        print(f"[{done}/{total}] {result.source}: {status}")
+
+    started = time.monotonic()
+    results = BatchRenderer.render_files(sources, options, workers=args.jobs, progress_callback=progress)
+    failed = [result for result in results if result.error]
+    print(f"Rendered {len(results) - len(failed)} of {len(results)} files in {time.monotonic() - started:.1f} s.")
+    for result in failed:
+        print(f"Failed: {result.source}: {result.error}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,34 @@
+#! /usr/bin/env python3
+
+import argparse
+import time
+
+from midi_loader import MidiLoader
+
+def best_time(load, fname: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(fname)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def same_notes(a, b) -> bool:
+    return [(t.name, t.columns.to_dicts()) for t in a.tracks] == [(t.name, t.columns.to_dicts()) for t in b.tracks]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the raw MIDI reader with the mido based loader.")
+    parser.add_argument("files", nargs="+", help="MIDI files")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Runs per loader, the best one counts")
+    args = parser.parse_args()
+
+    for fname in args.files:
+        fast = best_time(MidiLoader.load_midi_file, fname, args.repeat)
+        slow = best_time(MidiLoader.load_midi_file_mido, fname, args.repeat)
+        song = MidiLoader.load_midi_file(fname)
+        equal = same_notes(song, MidiLoader.load_midi_file_mido(fname))
+        print(f"{fname}: {song.notes_count} notes, raw {fast * 1000:.1f} ms, mido {slow * 1000:.1f} ms, "
+              f"{slow / fast:.1f}x{'' if equal else ', RESULTS DIFFER'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from song import Buzzer, Note, Song, Track
+
+def create_notes(track: Track, count: int) -> list[Note]:
+    return [Note(start_us=i * 1000, duration_us=900, pitch=40 + i % 48, velocity=100, buzzer=Buzzer.NONE, track=track)
+            for i in range(count)]
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory and speed of Note objects.")
+    parser.add_argument("-n", "--notes", type=int, default=100000, help="Number of notes")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Runs per measurement, the best one counts")
+    args = parser.parse_args()
+
+    song = Song(name="Benchmark", tracks=[])
+    track = Track("Benchmark", [], song)
+    song.tracks = [track]
+
+    gc.collect()
+    tracemalloc.start()
+    notes = create_notes(track, args.notes)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Memory: {memory / args.notes:.0f} B per note, including the list and the int values")
+
+    create = best_time(lambda: create_notes(track, args.notes), args.repeat)
+    print(f"Create: {create / args.notes * 1e9:.0f} ns per note")
+
+    read = best_time(lambda: sum(n.start_us + n.duration_us + n.pitch for n in notes), args.repeat)
+    print(f"Read three fields: {read / args.notes * 1e9:.0f} ns per note")
+
+    buzzer = best_time(lambda: [n.buzzer for n in notes], args.repeat)
+    print(f"Read buzzer: {buzzer / args.notes * 1e9:.0f} ns per note")
+
+    track.notes = notes
+    def set_velocity():
+        with song.batch():
+            for n in notes:
+                n.velocity = 90
+    write = best_time(set_velocity, args.repeat)
+    print(f"Set velocity in a batch: {write / args.notes * 1e9:.0f} ns per note")
+
+    def listeners():
+        listener = lambda: None
+        for n in notes:
+            n.add_change_listener(listener)
+        for n in notes:
+            n.remove_change_listener(listener)
+    subscribe = best_time(listeners, args.repeat)
+    print(f"Add and remove a listener: {subscribe / args.notes * 1e9:.0f} ns per note")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import enum
+import heapq
+from typing import Iterable
+
+from song import Buzzer, Note, PLAYABLE_BUZZERS, Song
+
+class AllocationPriority(enum.Enum):
+    PITCH = 'pitch'
+    TRACK = 'track'
+    VELOCITY = 'velocity'
+    DURATION = 'duration'
+
+@dataclass
+class AllocationReport:
+    assigned: int = 0
+    unplaced: list[Note] = field(default_factory=list)
+    # With preemption, notes that gave up their buzzer to a later note of higher priority. They keep
+    # the part before it.
+    truncated: list[Note] = field(default_factory=list)
+
+class BuzzerAllocator:
+    '''Interval scheduling of notes on the buzzers.
+
+    Notes are handed out in start order. Notes starting at the same time are ordered by the given
+    priorities: highest pitch, earlier (melody) track, louder or longer first. A note that finds no
+    free buzzer is reported as unplaced and left without buzzer; note lengths are never changed.
+
+    With preempt, such a note instead takes the buzzer of the lowest priority note holding one,
+    provided that note has a lower priority than itself. A preempted note always started earlier, as
+    notes starting together are handed out by priority, so it is truncated at the start of the
+    preempting note.
+    '''
+
+    def __init__(self, buzzers: Iterable[Buzzer] = PLAYABLE_BUZZERS,
+                 priorities: Iterable[AllocationPriority] = (AllocationPriority.PITCH, AllocationPriority.TRACK),
+                 preempt: bool = False):
+        self.buzzers = [buzzer.value for buzzer in buzzers]
+        self.priorities = list(priorities)
+        self.preempt = preempt
+
+    def allocate(self, song: Song) -> AllocationReport:
+        track_order = {track: i for i, track in enumerate(song.tracks)}
+        priority_keys = {
+            AllocationPriority.PITCH: lambda n: -n.pitch,
+            AllocationPriority.TRACK: lambda n: track_order[n.track],
+            AllocationPriority.VELOCITY: lambda n: -n.velocity,
+            AllocationPriority.DURATION: lambda n: -n.duration_us,
+        }
+        keys = [priority_keys[priority] for priority in self.priorities]
+        # Smaller is more important.
+        priority = lambda n: tuple(key(n) for key in keys)
+        notes = [note for track in song.tracks for note in track.notes]
+        notes.sort(key=lambda n: (n.start_us, *priority(n)))
+
+        report = AllocationReport()
+        free = list(self.buzzers)
+        heapq.heapify(free)
+        busy: list[tuple[int, int]] = []
+        holders: dict[int, Note] = {}
+        with song.batch():
+            for note in notes:
+                while busy and busy[0][0] <= note.start_us:
+                    heapq.heappush(free, heapq.heappop(busy)[1])
+                if not free and self.preempt:
+                    buzzer, holder = max(holders.items(), key=lambda item: priority(item[1]))
+                    if priority(holder) > priority(note):
+                        busy = [entry for entry in busy if entry[1] != buzzer]
+                        heapq.heapify(busy)
+                        heapq.heappush(free, buzzer)
+                        holder.duration_us = note.start_us - holder.start_us
+                        report.truncated.append(holder)
+                if free:
+                    buzzer = heapq.heappop(free)
+                    heapq.heappush(busy, (note.start_us + note.duration_us, buzzer))
+                    holders[buzzer] = note
+                    if note.buzzer_index != buzzer:
+                        note.buzzer = Buzzer(buzzer)
+                    report.assigned += 1
+                else:
+                    if note.buzzer is not Buzzer.NONE:
+                        note.buzzer = Buzzer.NONE
+                    report.unplaced.append(note)
+        return report
@@ -25,6 +25,9 @@ class ConfigClass:
     SELECTION_FRAME_COLOR = QColor.fromRgba(0x1155FF55)
     SELECTION_FRAME_NOTE_BORDER_COLOR = QColor.fromRgba(0xFFAAFFAA)
     SELECTION_FRAME_NOTE_FILL_BASE_COLOR = QColor.fromRgba(0x3355FF55)
+    PLAYHEAD_COLOR = QColor(0xFF8800)
+    PLAYHEAD_WIDTH = 2
+    PLAYHEAD_INTERVAL_MS = 16
 
     SELECT_MOUSE_BUTTON = Qt.MouseButton.LeftButton
     DRAG_MOUSE_BUTTON = Qt.MouseButton.RightButton
@@ -45,6 +48,9 @@ class ConfigClass:
 
     INDICATE_VELOCITY = False
 
+    MIDI_CACHE_DIRECTORY = ''
+    MIDI_CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+
     last_opened_directory = ''
     last_song = ''
 
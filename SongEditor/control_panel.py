@@ -1,8 +1,9 @@
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QLabel, QFileDialog,\
-                              QMainWindow, QStatusBar, QApplication
+                              QMainWindow, QStatusBar, QApplication, QProgressBar
 
 from song_widget import SongWidget
-from midi_loader import MidiLoader
+from midi_cache import MidiCache
+from midi_import_thread import MidiImportThread
 from song_player import Player
 from config import Config
 from funzl_board import FunzlBoard
@@ -21,24 +22,39 @@ class ControlPanel(QWidget):
         self.send_song_btn = QPushButton("Send Song")
         self.send_selected_btn = QPushButton("Send Selected")
         self.stop_btn = QPushButton("Send Stop")
+        self.play_btn = QPushButton("Preview")
+        self.stop_preview_btn = QPushButton("Stop Preview")
         self.open_btn = QPushButton("Import MIDI")
+        self.cancel_import_btn = QPushButton("Cancel Import")
+        self.import_progress = QProgressBar()
         self.fix_overlaps_btn = QPushButton("Fix Overlaps")
         self.auto_buzzer_btn = QPushButton("Auto Buzzer Assign")
 
         layout.addWidget(self.send_song_btn)
         layout.addWidget(self.send_selected_btn)
         layout.addWidget(self.stop_btn)
+        layout.addWidget(self.play_btn)
+        layout.addWidget(self.stop_preview_btn)
         layout.addWidget(self.open_btn)
+        layout.addWidget(self.import_progress)
+        layout.addWidget(self.cancel_import_btn)
         layout.addWidget(self.fix_overlaps_btn)
         layout.addWidget(self.auto_buzzer_btn)
 
         self.send_song_btn.clicked.connect(self.send_song)
         self.send_selected_btn.clicked.connect(self.send_selected)
         self.stop_btn.clicked.connect(self.stop)
+        self.play_btn.clicked.connect(self.play)
+        self.stop_preview_btn.clicked.connect(self.stop_preview)
         self.open_btn.clicked.connect(self.open_file)
+        self.cancel_import_btn.clicked.connect(self.cancel_import)
         self.fix_overlaps_btn.clicked.connect(self.fix_overlaps)
         self.auto_buzzer_btn.clicked.connect(self.auto_assign_buzzers)
-        self.player: Player | None = None
+        self.player = Player()
+        self.midi_cache = MidiCache(Config.MIDI_CACHE_DIRECTORY or None, Config.MIDI_CACHE_SIZE_LIMIT)
+        self.import_thread: MidiImportThread | None = None
+        self.import_progress.hide()
+        self.cancel_import_btn.hide()
 
         self.on_song_changed(song)
         self.selected_notes_changed([])
@@ -76,7 +92,7 @@ class ControlPanel(QWidget):
     def on_song_has_changed(self):
         '''Called when the song content has changed.'''
         if self._song:
-            self.send_song_btn.setEnabled(len(self._song.error_notes) == 0 and len(self._song.all_notes) > 0)
+            self.send_song_btn.setEnabled(self._song.error_notes_count == 0 and self._song.notes_count > 0)
 
     def open_file(self):
         fname, _ = QFileDialog.getOpenFileName(self, "Open MIDI File", Config.last_opened_directory, "MIDI Files (*.mid *.midi)")
@@ -85,24 +101,72 @@ class ControlPanel(QWidget):
             self.add_file(fname)
 
     def add_file(self, fname: str):
-        song = MidiLoader.load_midi_file(fname)
-        self.canvas.set_song(song)
-        self.status_bar.showMessage(f"Loaded: {fname}", 2000)
+        if self.import_thread:
+            return
+        self.import_thread = MidiImportThread(self.midi_cache, fname, self)
+        self.import_thread.progress.connect(self.on_import_progress)
+        self.import_thread.imported.connect(lambda song: self.on_import_finished(fname, song))
+        self.import_thread.failed.connect(lambda error: self.on_import_finished(fname, None, error))
+        self.import_thread.cancelled.connect(lambda: self.on_import_finished(fname, None))
+        self.open_btn.setEnabled(False)
+        self.import_progress.setRange(0, 0)
+        self.import_progress.show()
+        self.cancel_import_btn.show()
+        self.status_bar.showMessage(f"Importing {fname}")
+        self.import_thread.start()
+
+    def on_import_progress(self, track_index: int, track_count: int, messages: int):
+        self.import_progress.setRange(0, track_count)
+        self.import_progress.setValue(track_index)
+        self.import_progress.setFormat(f"Track {track_index + 1}/{track_count}: {messages} messages")
+
+    def on_import_finished(self, fname: str, song: Song | None, error: str | None = None):
+        self.import_thread.wait()
+        self.import_thread.deleteLater()
+        self.import_thread = None
+        self.open_btn.setEnabled(True)
+        self.import_progress.hide()
+        self.cancel_import_btn.hide()
+        if song:
+            self.canvas.set_song(song)
+            self.status_bar.showMessage(f"Loaded: {fname}", 2000)
+        elif error:
+            self.status_bar.showMessage(f"Import of {fname} failed: {error}", 5000)
+        else:
+            self.status_bar.showMessage(f"Import of {fname} cancelled.", 2000)
+
+    def cancel_import(self):
+        if self.import_thread:
+            self.import_thread.cancel()
 
     def play(self):
-        self.player = Player(self.canvas._song)
-        self.player.start()
+        if not self.canvas._song:
+            return
+        self.player.stop()
+        self.player.load(self.canvas._song)
+        self.player.play()
+        self.canvas.set_playhead_source(self.player.position_us)
+
+    def stop_preview(self):
+        self.player.stop()
 
     def stop(self):
         result = FunzlBoard.send_stop()
 
+    def shutdown(self):
+        self.canvas.set_playhead_source(None)
+        self.player.shutdown()
+        if self.import_thread:
+            self.import_thread.cancel()
+            self.import_thread.wait()
+
     def selected_notes_changed(self, notes):
         self._selected_notes = notes
         if not notes:
             self.send_selected_btn.setEnabled(False)
             return
         for note in notes:
-            if note in self.canvas._song.error_notes:
+            if note in note.track.error_notes:
                 self.send_selected_btn.setEnabled(False)
                 return
         notes_with_buzzer = [note for note in notes if note.buzzer != None]
@@ -111,9 +175,14 @@ class ControlPanel(QWidget):
     def fix_overlaps(self):
         if not self.canvas._song:
             return
-        self.canvas._song.fix_overlaps()
+        report = self.canvas._song.fix_overlaps()
+        self.status_bar.showMessage(f"Truncated {len(report.truncated)} notes.", 2000)
 
     def auto_assign_buzzers(self):
         if not self.canvas._song:
             return
-        self.canvas._song.auto_assign_buzzers()
+        report = self.canvas._song.auto_assign_buzzers()
+        if report.unplaced:
+            self.status_bar.showMessage(f"Assigned {report.assigned} notes, {len(report.unplaced)} notes could not be placed.", 5000)
+        else:
+            self.status_bar.showMessage(f"Assigned {report.assigned} notes.", 2000)
@@ -0,0 +1,320 @@
+#! /usr/bin/env python3
+
+from __future__ import annotations
+import argparse
+from dataclasses import dataclass
+import math
+import random
+import wave
+
+import numpy as np
+
+from synth import BuzzerLane, SquareWaveRenderer
+
+class FirmwareStreamError(ValueError):
+    pass
+
+@dataclass
+class FirmwareNote:
+    start_us: int
+    end_us: int
+    pitch: int
+
+@dataclass
+class FirmwareSong:
+    tracks: list[list[FirmwareNote]]
+    loop: bool
+
+@dataclass
+class LoopLatencyModel:
+    '''Time the firmware spends in its playback loop, in microseconds.'''
+    # One pass of the loop over all players when no event is due.
+    poll_us: float = 2.0
+    # Buzzer::tone writing a new frequency and duty to the LEDC.
+    tone_us: float = 15.0
+    # Buzzer::off writing the duty.
+    off_us: float = 5.0
+    # Random delay of the pass that sees an event, e.g. by interrupts or the USB stack.
+    jitter_us: float = 0.0
+    seed: int = 0
+
+@dataclass
+class NoteTiming:
+    buzzer: int
+    index: int
+    start_us: int
+    end_us: int
+    pitch: int
+    frequency: int
+    on_us: float
+    off_us: float
+    # False if Buzzer::tone skipped the write, as the buzzer already played the frequency.
+    tone_written: bool = True
+    # The note was due while the previous note of its buzzer was still playing.
+    delayed_by_previous: bool = False
+    # False if the note was switched off in the same loop call that switched it on.
+    sounded: bool = True
+
+    @property
+    def start_error_us(self) -> float:
+        return self.on_us - self.start_us
+
+    @property
+    def end_error_us(self) -> float:
+        return self.off_us - self.end_us
+
+@dataclass
+class EmulationReport:
+    notes: list[NoteTiming]
+    tone_writes: int
+    skipped_tone_writes: int
+    duration_us: float
+
+    def late_notes(self, tolerance_us: float) -> list[NoteTiming]:
+        return [n for n in self.notes if abs(n.start_error_us) > tolerance_us or abs(n.end_error_us) > tolerance_us]
+
+    @property
+    def delayed_notes(self) -> list[NoteTiming]:
+        return [n for n in self.notes if n.delayed_by_previous]
+
+    @property
+    def silent_notes(self) -> list[NoteTiming]:
+        return [n for n in self.notes if not n.sounded]
+
+    @property
+    def max_start_error_us(self) -> float:
+        return max((abs(n.start_error_us) for n in self.notes), default=0.0)
+
+    @property
+    def mean_start_error_us(self) -> float:
+        return sum(abs(n.start_error_us) for n in self.notes) / len(self.notes) if self.notes else 0.0
+
+    @property
+    def max_end_error_us(self) -> float:
+        return max((abs(n.end_error_us) for n in self.notes), default=0.0)
+
+class _Buzzers:
+    '''Buzzer::tone and Buzzer::off, which skip writing a frequency the buzzer already plays.'''
+
+    def __init__(self, count: int, latency: LoopLatencyModel):
+        self.current_frequencies = [0] * count
+        self.latency = latency
+        self.writes = 0
+        self.skipped_writes = 0
+
+    @staticmethod
+    def frequency(pitch: int) -> int:
+        # The firmware computes the frequency as float and rounds it half away from zero.
+        hz = float(np.float32(440.0 * 2.0 ** ((pitch - 69) / 12.0)))
+        return int(math.floor(hz + 0.5))
+
+    def tone(self, buzzer: int, frequency: int) -> float:
+        '''Returns the time the call takes.'''
+        if self.current_frequencies[buzzer] == frequency:
+            self.skipped_writes += 1
+            return 0.0
+        self.current_frequencies[buzzer] = frequency
+        self.writes += 1
+        return self.latency.tone_us
+
+    def off(self, buzzer: int) -> float:
+        self.current_frequencies[buzzer] = 0
+        return self.latency.off_us
+
+class _Player:
+    '''Player::loop of the firmware with the song starting at time 0.'''
+
+    def __init__(self, notes: list[FirmwareNote], buzzer: int, buzzers: _Buzzers, timings: list[NoteTiming]):
+        self.notes = notes
+        self.buzzer = buzzer
+        self.buzzers = buzzers
+        self.timings = timings
+        self.index = 0
+        self.note_on = False
+        self.note_on_us = 0.0
+        self.timing: NoteTiming | None = None
+        self.finished = not notes
+        self.next_event_us = notes[0].start_us if notes else 0
+
+    def loop(self, now: float) -> float:
+        '''Returns the time the call takes.'''
+        elapsed = 0.0
+        if self.finished:
+            return elapsed
+        while self.next_event_us <= now:
+            if self.index >= len(self.notes):
+                self.finished = True
+                elapsed += self.buzzers.off(self.buzzer)
+                return elapsed
+            note = self.notes[self.index]
+            if not self.note_on and now >= note.start_us:
+                frequency = _Buzzers.frequency(note.pitch)
+                written = self.buzzers.writes
+                elapsed += self.buzzers.tone(self.buzzer, frequency)
+                previous_end = self.notes[self.index - 1].end_us if self.index else 0
+                self.timing = NoteTiming(buzzer=self.buzzer, index=self.index, start_us=note.start_us,
+                                         end_us=note.end_us, pitch=note.pitch, frequency=frequency,
+                                         on_us=now + elapsed, off_us=now + elapsed,
+                                         tone_written=self.buzzers.writes != written,
+                                         delayed_by_previous=note.start_us < previous_end)
+                self.timings.append(self.timing)
+                self.note_on = True
+                self.note_on_us = now
+                self.next_event_us = note.end_us
+            elif self.note_on and now >= note.end_us:
+                elapsed += self.buzzers.off(self.buzzer)
+                self.timing.off_us = now + elapsed
+                self.timing.sounded = now > self.note_on_us
+                self.note_on = False
+                self.index += 1
+                if self.index < len(self.notes):
+                    self.next_event_us = self.notes[self.index].start_us
+            else:
+                break
+        return elapsed
+
+class FirmwareEmulator:
+    '''Replays the byte stream of FunzlBoard.send_song like the firmware does.
+
+    Each buzzer plays its notes one after another in Player::loop, which polls the clock. A note
+    starts once it is due and the previous note has ended, frequencies are rounded to whole Hertz.
+    How long the loop and the buzzer writes take is given by a LoopLatencyModel.
+    '''
+
+    BUZZER_COUNT = 3
+    NOTE_SIZE = 9
+
+    @staticmethod
+    def parse(data: bytes) -> FirmwareSong:
+        '''Reads the stream like handleSerial and readSongFromSerial, line breaks before the command are ignored.'''
+        view = memoryview(data)
+        position = 0
+        while position < len(view) and view[position] in b'\r\n':
+            position += 1
+        if position >= len(view) or view[position] != ord('S'):
+            raise FirmwareStreamError('Missing play command')
+        position += 1
+        tracks = []
+        for _ in range(FirmwareEmulator.BUZZER_COUNT):
+            if position + 4 > len(view):
+                raise FirmwareStreamError('Truncated track length')
+            count = int.from_bytes(view[position:position + 4], 'little')
+            position += 4
+            end = position + count * FirmwareEmulator.NOTE_SIZE
+            if end > len(view):
+                raise FirmwareStreamError('Truncated notes')
+            tracks.append([FirmwareNote(start_us=int.from_bytes(view[p:p + 4], 'little'),
+                                        end_us=int.from_bytes(view[p + 4:p + 8], 'little'), pitch=view[p + 8])
+                           for p in range(position, end, FirmwareEmulator.NOTE_SIZE)])
+            position = end
+        if position >= len(view):
+            raise FirmwareStreamError('Missing loop flag')
+        return FirmwareSong(tracks=tracks, loop=view[position] != 0)
+
+    @staticmethod
+    def run(song: FirmwareSong, latency: LoopLatencyModel | None = None) -> EmulationReport:
+        '''Plays the song once, the serial play command ignores the loop flag.'''
+        latency = latency or LoopLatencyModel()
+        rng = random.Random(latency.seed)
+        buzzers = _Buzzers(FirmwareEmulator.BUZZER_COUNT, latency)
+        timings: list[NoteTiming] = []
+        players = [_Player(notes, i, buzzers, timings) for i, notes in enumerate(song.tracks) if notes]
+        now = 0.0
+        while True:
+            any_playing = False
+            busy = False
+            for player in players:
+                if not player.finished:
+                    elapsed = player.loop(now)
+                    now += elapsed
+                    busy = busy or elapsed > 0
+                    any_playing = True
+            if not any_playing:
+                break
+            now += latency.poll_us
+            if not busy:
+                # Nothing happened, skip the passes until the next event is due.
+                next_event = min((p.next_event_us for p in players if not p.finished), default=now)
+                if next_event > now:
+                    if latency.poll_us > 0:
+                        now += math.ceil((next_event - now) / latency.poll_us) * latency.poll_us
+                    else:
+                        now = float(next_event)
+                    now += rng.uniform(0, latency.jitter_us)
+        timings.sort(key=lambda n: (n.buzzer, n.index))
+        return EmulationReport(notes=timings, tone_writes=buzzers.writes, skipped_tone_writes=buzzers.skipped_writes,
+                               duration_us=now)
+
+    @staticmethod
+    def emulate(data: bytes, latency: LoopLatencyModel | None = None) -> EmulationReport:
+        return FirmwareEmulator.run(FirmwareEmulator.parse(data), latency)
+
+    @staticmethod
+    def renderer(report: EmulationReport, sample_rate: int = SquareWaveRenderer.SAMPLE_RATE) -> SquareWaveRenderer:
+        '''Renders the buzzers as the emulated firmware switched them.'''
+        lanes = []
+        for buzzer in range(FirmwareEmulator.BUZZER_COUNT):
+            notes = [n for n in report.notes if n.buzzer == buzzer]
+            lanes.append(BuzzerLane(
+                starts=np.array([round(n.on_us * sample_rate / 1000000) for n in notes], dtype=np.int64),
+                ends=np.array([round(n.off_us * sample_rate / 1000000) for n in notes], dtype=np.int64),
+                frequencies=np.array([n.frequency for n in notes], dtype=np.int64)))
+        return SquareWaveRenderer(lanes, sample_rate)
+
+def main():
+    from funzl_board import FunzlBoard
+    from midi_loader import MIDI_EXTENSIONS, MidiLoader
+    from song_file import SongFile
+
+    parser = argparse.ArgumentParser(description="Replay a song like the Funzl Board firmware and report its timing.")
+    parser.add_argument("song", help="Song file, MIDI file or raw play command (*.bin)")
+    parser.add_argument("--wav", default=None, help="Write the emulated buzzers to this WAV file")
+    parser.add_argument("--assign-buzzers", action="store_true", help="Assign buzzers automatically")
+    parser.add_argument("--poll-us", type=float, default=LoopLatencyModel.poll_us, help="Duration of an idle loop pass")
+    parser.add_argument("--tone-us", type=float, default=LoopLatencyModel.tone_us, help="Duration of a frequency write")
+    parser.add_argument("--off-us", type=float, default=LoopLatencyModel.off_us, help="Duration of switching a buzzer off")
+    parser.add_argument("--jitter-us", type=float, default=LoopLatencyModel.jitter_us, help="Maximum random delay of a loop pass")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the jitter")
+    parser.add_argument("--tolerance-us", type=float, default=1000, help="Largest accepted timing error")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every problematic note")
+    args = parser.parse_args()
+
+    if args.song.lower().endswith('.bin'):
+        with open(args.song, 'rb') as f:
+            data = f.read()
+    else:
+        if args.song.lower().endswith(MIDI_EXTENSIONS):
+            song = MidiLoader.load_midi_file(args.song)
+        else:
+            song = SongFile.load(args.song)
+        if args.assign_buzzers:
+            song.auto_assign_buzzers()
+        data = FunzlBoard.song_bytes(song)
+
+    latency = LoopLatencyModel(poll_us=args.poll_us, tone_us=args.tone_us, off_us=args.off_us,
+                               jitter_us=args.jitter_us, seed=args.seed)
+    report = FirmwareEmulator.emulate(data, latency)
+    late = report.late_notes(args.tolerance_us)
+    delayed = report.delayed_notes
+    silent = report.silent_notes
+    print(f"{len(report.notes)} notes, {report.duration_us / 1000000:.3f} s, {report.tone_writes} frequency writes "
+          f"({report.skipped_tone_writes} skipped)")
+    print(f"Start error: max {report.max_start_error_us:.1f} us, mean {report.mean_start_error_us:.1f} us; "
+          f"end error: max {report.max_end_error_us:.1f} us")
+    print(f"{len(late)} notes off by more than {args.tolerance_us:g} us, {len(delayed)} notes delayed by the "
+          f"previous note, {len(silent)} silent notes")
+    if args.verbose:
+        for n in sorted({id(n): n for n in late + delayed + silent}.values(), key=lambda n: n.on_us):
+            print(f"  buzzer {n.buzzer + 1} note {n.index}: pitch {n.pitch} at {n.start_us}-{n.end_us} us, "
+                  f"played {n.on_us:.0f}-{n.off_us:.0f} us")
+    if args.wav:
+        renderer = FirmwareEmulator.renderer(report)
+        with wave.open(args.wav, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(renderer.sample_rate)
+            f.writeframes(renderer.render().tobytes())
+    return 1 if late or delayed or silent else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
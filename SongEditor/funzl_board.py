@@ -6,28 +6,55 @@ from song import Song, Note, Buzzer
 import re
 
 class FunzlBoard:
+    BAUD_RATE = 115200
+    BLOCK_SIZE = 1024
+    # The firmware buffers this many received bytes (Serial.setRxBufferSize), pass it to send() to
+    # pace the writes for a board behind a USB to UART bridge.
+    RX_BUFFER_SIZE = 4096
+
     @staticmethod
-    def send(command: bytes, progress_callback: Callable[[str], None] | None = None) -> str:
+    def send(command: bytes, progress_callback: Callable[[str], None] | None = None, block_size: int = BLOCK_SIZE,
+             rx_buffer_size: int | None = None) -> str:
+        '''Writes the command with one write() per block of block_size bytes.
+
+        The ESP32-C3 reads over native USB CDC, which is not limited by the baud rate: write() blocks
+        while the device does not take more data and flush() waits for the rest. With an
+        rx_buffer_size, writing is paced so that no more than that many bytes are ahead of what the
+        board can have read at the baud rate.
+        '''
         ports = list_ports.comports()
         candidates = [p.device for p in ports if p.device and ('ttyACM' in p.device or 'ttyUSB' in p.device)]
         if not candidates:
             return 'No serial USB device found.'
 
-        with serial.Serial(str(candidates[0]), 115200, timeout=1) as ser:
-            t = 0
-            length = len(command)
-            sent = 0
-            for char in command:
-                if progress_callback and t < time.time() - 0.1:
-                    progress_callback(f'Sending {length} bytes: {sent / length * 100:.2f} %')
-                    t = time.time()
-                ser.write(bytes([char]))
-                sent += 1
-            return f'Sent to {candidates[0]}.'
+        if rx_buffer_size:
+            block_size = min(block_size, rx_buffer_size)
+        bytes_per_second = FunzlBoard.BAUD_RATE / 10
+        with serial.Serial(str(candidates[0]), FunzlBoard.BAUD_RATE, timeout=1) as ser:
+            view = memoryview(command)
+            length = len(view)
+            start = time.monotonic()
+            for sent in range(0, length, block_size):
+                block = view[sent:sent + block_size]
+                if rx_buffer_size:
+                    drained = (time.monotonic() - start) * bytes_per_second
+                    ahead = sent + len(block) - drained
+                    if ahead > rx_buffer_size:
+                        time.sleep((ahead - rx_buffer_size) / bytes_per_second)
+                ser.write(block)
+                if progress_callback:
+                    elapsed = time.monotonic() - start
+                    progress_callback(f'Sending {length} bytes: {(sent + len(block)) / length * 100:.2f} %, '
+                                      f'{(sent + len(block)) / max(elapsed, 1e-6) / 1024:.1f} KiB/s')
+            ser.flush()
+            elapsed = time.monotonic() - start
+            return (f'Sent {length} bytes to {candidates[0]} in {elapsed:.2f} s '
+                    f'({length / max(elapsed, 1e-6) / 1024:.1f} KiB/s).')
 
     @staticmethod
-    def send_song(song: Song, progress_callback: Callable[[str], None] | None = None) -> str:
-        result = b'\nS'
+    def song_bytes(song: Song) -> bytes:
+        '''The play command for a song as read by readSongFromSerial in the firmware.'''
+        result = bytearray(b'\nS')
         notes = song.to_buzzer_tracks()
         for buzzer in [Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3]:
             buzzer_notes = notes[buzzer]
@@ -37,13 +64,22 @@ class FunzlBoard:
                 result += (note.start_us + note.duration_us).to_bytes(4, 'little')
                 result += note.pitch.to_bytes(1, 'little')
         result += 0x00.to_bytes(1, 'little')
-        return FunzlBoard.send(result, progress_callback=progress_callback)
+        return bytes(result)
+
+    @staticmethod
+    def send_song(song: Song, progress_callback: Callable[[str], None] | None = None) -> str:
+        return FunzlBoard.send(FunzlBoard.song_bytes(song), progress_callback=progress_callback)
 
     @staticmethod
     def send_stop() -> str:
         result = FunzlBoard.send(b'\n')
         return result
 
+    @staticmethod
+    def header_file_name(song_name: str) -> str:
+        name = ''.join(p.capitalize() for p in [p for p in re.split(r'[^0-9A-Za-z]+', song_name) if p]) or 'Song'
+        return name[0].lower() + name[1:] + '.h'
+
     @staticmethod
     def export(song: Song) -> str:
         namespace = ''.join(p.capitalize() for p in [p for p in re.split(r'[^0-9A-Za-z]+', song.name) if p]) or 'Song'
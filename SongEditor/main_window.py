@@ -1,4 +1,3 @@
-import re
 from PySide6.QtGui import QCloseEvent
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import QMainWindow, QDockWidget, QSizePolicy, QLabel, QFileDialog
@@ -14,6 +13,7 @@ from control_panel import ControlPanel
 from tracks_list_widget import TracksListWidget
 from notes_list_widget import NotesListWidget
 from song import Song
+from song_file import SongFile
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -96,6 +96,7 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event: QCloseEvent) -> None:
         self.control_panel.stop()
+        self.control_panel.shutdown()
         return super().closeEvent(event)
 
     def update_status_keys(self, status: int):
@@ -123,26 +124,23 @@ class MainWindow(QMainWindow):
             self.save_file(self.file_name)
 
     def save_file(self, file_name: str):
-        with open(file_name, 'w') as f:
-            f.write(self.song_widget.song.to_json())
+        SongFile.save(self.song_widget.song, file_name)
         self.statusBar().showMessage(f"Saved song to {file_name}", 5000)
         print(f"Saved song to {file_name}")
 
     def save_as_clicked(self):
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save Song As", Config.last_opened_directory, "Funzl Board Song Files (*.fbsong);;All Files (*)")
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save Song As", Config.last_opened_directory, "Funzl Board Song Files (*.fbsong);;JSON Song Files (*.json);;All Files (*)")
         if file_name:
             self.file_name = file_name
             self.save_file(self.file_name)
 
     def open_file_clicked(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open Song", Config.last_opened_directory, "Funzl Board Song Files (*.fbsong);;All Files (*)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open Song", Config.last_opened_directory, "Funzl Board Song Files (*.fbsong *.json);;All Files (*)")
         if file_name:
             self.open_file(file_name)
 
     def open_file(self, file_name: str):
-        with open(file_name, 'r') as f:
-            data = f.read()
-        song = Song.from_json(data)
+        song = SongFile.load(file_name)
         self.song_widget.set_song(song)
         self.song_details_widget.set_song(song)
         for track in song.tracks:
@@ -157,8 +155,7 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage("No song to export.", 2000)
             return
 
-        file_name = namespace = ''.join(p.capitalize() for p in [p for p in re.split(r'[^0-9A-Za-z]+', self.song_widget.song.name) if p]) or 'Song'
-        file_name = file_name[0].lower() + file_name[1:] + '.h'
+        file_name = FunzlBoard.header_file_name(self.song_widget.song.name)
         file_name = f'/home/thomas/Develop/ESP32/FunzlBrett/src/music/songs/{file_name}'
 
         file_name, _ = QFileDialog.getSaveFileName(self, "Export Song", file_name, "C++ Header Files (*.h);;All Files (*)")
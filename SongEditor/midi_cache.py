@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+
+from __future__ import annotations
+import argparse
+import hashlib
+import os
+import struct
+import tempfile
+from typing import Callable
+
+from midi_loader import MidiLoader
+from song import Song
+from song_file import SongFile
+
+class MidiCache:
+    '''On-disk cache of imported MIDI files.
+
+    Entries are binary song files named after the hash of the MIDI file content and the loader
+    version. The modification time of an entry is its last use, the least recently used entries are
+    removed once the cache grows beyond its size limit.
+    '''
+
+    EXTENSION = '.fbsong'
+
+    def __init__(self, directory: str | None = None, size_limit: int = 256 * 1024 * 1024):
+        self.directory = directory or MidiCache.default_directory()
+        self.size_limit = size_limit
+
+    @staticmethod
+    def default_directory() -> str:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'funzlboard', 'midi')
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(f'loader {MidiLoader.VERSION}'.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + MidiCache.EXTENSION)
+
+    def load(self, fname: str, progress_callback: Callable[[int, int, int], None] | None = None) -> Song:
+        with open(fname, 'rb') as f:
+            path = self._path(MidiCache.key(f.read()))
+        name = os.path.basename(fname)
+        try:
+            # Entries are always binary, SongFile.load would take a damaged entry for a JSON song.
+            with open(path, 'rb') as f:
+                song = SongFile.from_buffer(f.read())
+            os.utime(path)
+            song.name = name
+            return song
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Could not read cached import {path}: {e}")
+
+        song = MidiLoader.load_midi_file(fname, progress_callback)
+        try:
+            self._store(path, song)
+            self.evict()
+        except OSError as e:
+            print(f"Could not cache import of {fname}: {e}")
+        return song
+
+    def _store(self, path: str, song: Song):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written to a temporary file first, so a concurrent import never sees a partial entry.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(SongFile.to_bytes(song))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def entries(self) -> list[os.DirEntry]:
+        '''Cache entries, least recently used first.'''
+        try:
+            with os.scandir(self.directory) as it:
+                entries = [entry for entry in it if entry.is_file() and entry.name.endswith(MidiCache.EXTENSION)]
+        except FileNotFoundError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        return entries
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self.size_limit:
+                break
+            entry_size = entry.stat().st_size
+            try:
+                os.unlink(entry.path)
+                size -= entry_size
+            except OSError as e:
+                print(f"Could not remove cached import {entry.path}: {e}")
+
+    def clear(self):
+        for entry in self.entries():
+            try:
+                os.unlink(entry.path)
+            except OSError as e:
+                print(f"Could not remove cached import {entry.path}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the MIDI import cache.")
+    parser.add_argument("-d", "--directory", default=None, help="Cache directory")
+    parser.add_argument("--clear", action="store_true", help="Remove all cached imports")
+    args = parser.parse_args()
+
+    cache = MidiCache(args.directory)
+    if args.clear:
+        cache.clear()
+    print(f"{cache.directory}: {len(cache.entries())} entries, {cache.size() / 1024 / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
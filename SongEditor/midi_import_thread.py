@@ -0,0 +1,38 @@
+import threading
+
+from PySide6.QtCore import QThread, Signal
+
+from midi_cache import MidiCache
+from midi_loader import ImportCancelled
+
+class MidiImportThread(QThread):
+    '''Imports a MIDI file off the GUI thread. The song is only emitted once it is complete.'''
+
+    progress = Signal(int, int, int)
+    imported = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, cache: MidiCache, fname: str, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.fname = fname
+        self._cancel_requested = threading.Event()
+
+    def cancel(self):
+        self._cancel_requested.set()
+
+    def run(self):
+        try:
+            song = self.cache.load(self.fname, self._on_progress)
+        except ImportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+        else:
+            self.imported.emit(song)
+
+    def _on_progress(self, track_index: int, track_count: int, messages: int):
+        if self._cancel_requested.is_set():
+            raise ImportCancelled()
+        self.progress.emit(track_index, track_count, messages)
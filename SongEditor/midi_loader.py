@@ -1,35 +1,74 @@
-from mido import MidiFile
+from __future__ import annotations
+import bisect
+from typing import Callable, Iterable
 
-from song import Buzzer, Note, Track, Song
+from mido import MidiFile, MidiTrack
+import numpy as np
+
+from note_columns import NoteColumns
+from smf_reader import SmfError, SmfFile, SmfReader
+from song import Buzzer, Track, Song
 import os
 
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+class ImportCancelled(Exception):
+    '''Raised by a progress callback to abort an import.'''
+
 class MidiLoader:
+    # Increase whenever the conversion result changes, it invalidates the import cache.
+    VERSION = 1
+
+    @staticmethod
+    def load_midi_file(fname: str, progress_callback: Callable[[int, int, int], None] | None = None) -> Song:
+        '''progress_callback gets the track index, the track count and the messages read in the track.'''
+        try:
+            smf = SmfReader.read(fname, progress_callback)
+        except SmfError as e:
+            print(f"Fast MIDI reader failed ({e}), loading {fname} with mido")
+            return MidiLoader.load_midi_file_mido(fname, progress_callback)
+        return MidiLoader.from_smf(smf, os.path.basename(fname))
+
+    @staticmethod
+    def from_smf(smf: SmfFile, name: str) -> Song:
+        song = Song(name=name, tracks=[])
+        tempo_map = TempoMap((change for track in smf.tracks for change in track.tempo_changes), smf.ticks_per_beat)
+        tracks = []
+        for smf_track in smf.tracks:
+            if smf.format == 2:
+                tempo_map = TempoMap(smf_track.tempo_changes, smf.ticks_per_beat)
+            if not smf_track.start_ticks:
+                continue
+            starts = tempo_map.ticks_to_microseconds_array(np.array(smf_track.start_ticks, dtype=np.int64))
+            ends = tempo_map.ticks_to_microseconds_array(np.array(smf_track.end_ticks, dtype=np.int64))
+            columns = NoteColumns.from_arrays(starts, ends - starts, smf_track.pitch, smf_track.velocity,
+                                              np.full(len(starts), Buzzer.NONE.value))
+            tracks.append(Track.from_columns(smf_track.name, columns, song))
+        song.tracks = tracks
+        return song
+
     @staticmethod
-    def load_midi_file(fname: str) -> Song:
+    def load_midi_file_mido(fname: str, progress_callback: Callable[[int, int, int], None] | None = None) -> Song:
         tracks = []
         file = MidiFile(fname, clip=True)
         file_name = file.filename if file.filename else "Unnamed"
         file_name = os.path.basename(file_name)
-        tempo_map = MidiLoader.get_tempo_map(file)
-        ticks_per_beat = file.ticks_per_beat
+        tempo_map = MidiLoader.get_tempo_map(file.tracks, file.ticks_per_beat)
         song = Song(name=file_name, tracks=[])
 
-        for midi_track in file.tracks:
+        for track_index, midi_track in enumerate(file.tracks):
+            if file.type == 2:
+                # Format 2 tracks are independent sequences, each with its own tempo.
+                tempo_map = MidiLoader.get_tempo_map([midi_track], file.ticks_per_beat)
             abs_ticks = 0
-            tempo_index = 0
             on_notes = {}
-            notes = []
-            track = Track(name=midi_track.name, notes=[], song=song)
+            starts, durations, pitches, velocities = [], [], [], []
 
-            for msg in midi_track:
+            for message_index, msg in enumerate(midi_track):
+                if progress_callback and message_index % SmfReader.PROGRESS_INTERVAL == 0:
+                    progress_callback(track_index, len(file.tracks), message_index)
                 abs_ticks += msg.time
-
-                while (tempo_index + 1 < len(tempo_map) and
-                       abs_ticks >= tempo_map[tempo_index + 1][0]):
-                    tempo_index += 1
-
-                abs_time_us = MidiLoader.ticks_to_microseconds(
-                    abs_ticks, tempo_map, ticks_per_beat)
+                abs_time_us = tempo_map.ticks_to_microseconds(abs_ticks)
 
                 if msg.type == 'note_on' or msg.type == 'note_off':
                     off = msg.velocity == 0 or msg.type == 'note_off'
@@ -38,52 +77,61 @@ class MidiLoader:
                     else:
                         if msg.note in on_notes:
                             start_us, velocity = on_notes.pop(msg.note)
-                            duration = abs_time_us - start_us
-                            note = Note(start_us=start_us, duration_us=duration,
-                                      pitch=msg.note, velocity=velocity,
-                                      buzzer=Buzzer.NONE, track=track)
-                            notes.append(note)
+                            starts.append(start_us)
+                            durations.append(abs_time_us - start_us)
+                            pitches.append(msg.note)
+                            velocities.append(velocity)
 
-            if notes:
-                track.notes = notes
-                tracks.append(track)
+            if starts:
+                columns = NoteColumns.from_arrays(starts, durations, pitches, velocities,
+                                                  [Buzzer.NONE.value] * len(starts))
+                tracks.append(Track.from_columns(midi_track.name, columns, song))
 
         song.tracks = tracks
         return song
 
     @staticmethod
-    def get_tempo_map(file: MidiFile) -> list[tuple[int, int]]:
-        tempo_map = []
-        abs_ticks = 0
-        tempo = 500000
-        track = file.tracks[0]
-        tempo_map.append((abs_ticks, tempo))
-        for msg in track:
-            abs_ticks += msg.time
-            if msg.type == 'set_tempo':
-                tempo = msg.tempo
-                tempo_map.append((abs_ticks, tempo))
-        return tempo_map
+    def get_tempo_map(midi_tracks: Iterable[MidiTrack], ticks_per_beat: int) -> TempoMap:
+        # In format 1 files tempo changes belong to the whole song, whichever track they are stored in.
+        changes = []
+        for track in midi_tracks:
+            abs_ticks = 0
+            for msg in track:
+                abs_ticks += msg.time
+                if msg.type == 'set_tempo':
+                    changes.append((abs_ticks, msg.tempo))
+        return TempoMap(changes, ticks_per_beat)
 
-    @staticmethod
-    def ticks_to_microseconds(ticks: int, tempo_map: list[tuple[int, int]],
-                             ticks_per_beat: int) -> int:
-        us = 0
-        last_tick = 0
-        tempo = tempo_map[0][1]
-
-        for tempo_tick, new_tempo in tempo_map:
-            if tempo_tick >= ticks:
-                remaining_ticks = ticks - last_tick
-                us += remaining_ticks * tempo // ticks_per_beat
-                break
-            else:
-                tick_delta = tempo_tick - last_tick
-                us += tick_delta * tempo // ticks_per_beat
-                last_tick = tempo_tick
-                tempo = new_tempo
-        else:
-            remaining_ticks = ticks - last_tick
-            us += remaining_ticks * tempo // ticks_per_beat
-
-        return us
+class TempoMap:
+    '''Tempo changes with the accumulated time at each change, for bisect lookups.'''
+
+    DEFAULT_TEMPO = 500000
+
+    def __init__(self, changes: Iterable[tuple[int, int]], ticks_per_beat: int):
+        self.ticks_per_beat = ticks_per_beat
+        self.ticks = [0]
+        self.tempos = [TempoMap.DEFAULT_TEMPO]
+        self.microseconds = [0]
+        # Stable sort: of several changes at the same tick the last one in file order wins.
+        for tick, tempo in sorted(changes, key=lambda change: change[0]):
+            if tick == self.ticks[-1]:
+                self.tempos[-1] = tempo
+                continue
+            self.microseconds.append(self._elapsed(len(self.ticks) - 1, tick))
+            self.ticks.append(tick)
+            self.tempos.append(tempo)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def _elapsed(self, index: int, ticks: int) -> int:
+        return self.microseconds[index] + (ticks - self.ticks[index]) * self.tempos[index] // self.ticks_per_beat
+
+    def ticks_to_microseconds(self, ticks: int) -> int:
+        return self._elapsed(bisect.bisect_right(self.ticks, ticks) - 1, ticks)
+
+    def ticks_to_microseconds_array(self, ticks: np.ndarray) -> np.ndarray:
+        indices = np.searchsorted(np.array(self.ticks, dtype=np.int64), ticks, side='right') - 1
+        tempos = np.array(self.tempos, dtype=np.int64)[indices]
+        offsets = ticks - np.array(self.ticks, dtype=np.int64)[indices]
+        return np.array(self.microseconds, dtype=np.int64)[indices] + offsets * tempos // self.ticks_per_beat
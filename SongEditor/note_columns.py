@@ -0,0 +1,72 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from song import Buzzer, Note, Track
+
+@dataclass
+class NoteColumns:
+    start_us: np.ndarray
+    duration_us: np.ndarray
+    pitch: np.ndarray
+    velocity: np.ndarray
+    buzzer: np.ndarray
+
+    TIME_DTYPE = np.int64
+    VALUE_DTYPE = np.uint8
+
+    @staticmethod
+    def from_arrays(start_us, duration_us, pitch, velocity, buzzer) -> NoteColumns:
+        return NoteColumns(
+            start_us=np.asarray(start_us, dtype=NoteColumns.TIME_DTYPE),
+            duration_us=np.asarray(duration_us, dtype=NoteColumns.TIME_DTYPE),
+            pitch=np.asarray(pitch, dtype=NoteColumns.VALUE_DTYPE),
+            velocity=np.asarray(velocity, dtype=NoteColumns.VALUE_DTYPE),
+            buzzer=np.asarray(buzzer, dtype=NoteColumns.VALUE_DTYPE))
+
+    @staticmethod
+    def empty() -> NoteColumns:
+        return NoteColumns.from_arrays([], [], [], [], [])
+
+    @staticmethod
+    def from_notes(notes: Iterable[Note]) -> NoteColumns:
+        notes = list(notes)
+        count = len(notes)
+        return NoteColumns(
+            start_us=np.fromiter((n.start_us for n in notes), NoteColumns.TIME_DTYPE, count),
+            duration_us=np.fromiter((n.duration_us for n in notes), NoteColumns.TIME_DTYPE, count),
+            pitch=np.fromiter((n.pitch for n in notes), NoteColumns.VALUE_DTYPE, count),
+            velocity=np.fromiter((n.velocity for n in notes), NoteColumns.VALUE_DTYPE, count),
+            buzzer=np.fromiter((n.buzzer_index for n in notes), NoteColumns.VALUE_DTYPE, count))
+
+    def to_notes(self, track: Track) -> list[Note]:
+        from song import Buzzer, Note
+        buzzers = tuple(Buzzer)
+        return [Note(start_us=start, duration_us=duration, pitch=pitch, velocity=velocity,
+                     buzzer=buzzers[buzzer], track=track)
+                for start, duration, pitch, velocity, buzzer in zip(
+                    self.start_us.tolist(), self.duration_us.tolist(), self.pitch.tolist(),
+                    self.velocity.tolist(), self.buzzer.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.start_us)
+
+    @property
+    def end_us(self) -> np.ndarray:
+        return self.start_us + self.duration_us
+
+    def to_dicts(self) -> list[dict]:
+        from song import Buzzer
+        names = [buzzer.name for buzzer in Buzzer]
+        return [{
+                    'start_us': start,
+                    'duration_us': duration,
+                    'pitch': pitch,
+                    'velocity': velocity,
+                    'buzzer': names[buzzer]
+                } for start, duration, pitch, velocity, buzzer in zip(
+                    self.start_us.tolist(), self.duration_us.tolist(), self.pitch.tolist(),
+                    self.velocity.tolist(), self.buzzer.tolist())]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from sortedcontainers import SortedList
+
+from note_statistics import CountedMultiset
+
+if TYPE_CHECKING:
+    from song import Note
+
+# An index entry is (start_us, duration_us, pitch, id(note), note), the order of Song.all_notes.
+_Entry = tuple
+
+class NoteIndex:
+    '''Notes kept sorted by start time for bisect based range queries.'''
+
+    def __init__(self, notes: Iterable[Note] = ()):
+        entries = [self._entry(note) for note in notes]
+        self._sorted = SortedList(entries)
+        self._entries: dict[Note, _Entry] = {entry[-1]: entry for entry in entries}
+        self._durations = CountedMultiset()
+        for entry in entries:
+            self._durations.add(entry[1])
+
+    @staticmethod
+    def _entry(note: Note) -> _Entry:
+        return (note.start_us, note.duration_us, note.pitch, id(note), note)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def __iter__(self) -> Iterator[Note]:
+        return (entry[-1] for entry in self._sorted)
+
+    def add(self, note: Note):
+        entry = self._entry(note)
+        self._sorted.add(entry)
+        self._entries[note] = entry
+        self._durations.add(entry[1])
+
+    def remove(self, note: Note):
+        entry = self._entries.pop(note)
+        self._sorted.remove(entry)
+        self._durations.remove(entry[1])
+
+    def update(self, note: Note):
+        self.remove(note)
+        self.add(note)
+
+    def notes_in_range(self, start_us: int, end_us: int,
+                       min_pitch: int | None = None, max_pitch: int | None = None) -> Iterator[Note]:
+        '''Notes sounding in [start_us, end_us) in start order, optionally limited to a pitch range.'''
+        lowest_start = start_us - self._durations.max()
+        for entry in self._sorted.irange((lowest_start,), (end_us,), inclusive=(True, False)):
+            start, duration, pitch = entry[0], entry[1], entry[2]
+            if start + duration <= start_us and not (duration == 0 and start >= start_us):
+                continue
+            if (min_pitch is not None and pitch < min_pitch) or (max_pitch is not None and pitch > max_pitch):
+                continue
+            yield entry[-1]
+
+    @staticmethod
+    def sort_key(note: Note) -> tuple:
+        return (note.start_us, note.duration_us, note.pitch)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+from sortedcontainers import SortedList
+
+from note_columns import NoteColumns
+
+if TYPE_CHECKING:
+    from song import Note
+
+class CountedMultiset:
+    def __init__(self, values: np.ndarray | None = None):
+        if values is not None and len(values):
+            keys, counts = np.unique(values, return_counts=True)
+            self._counts: dict[int, int] = dict(zip(keys.tolist(), counts.tolist()))
+        else:
+            self._counts = {}
+        self._keys = SortedList(self._counts)
+
+    def add(self, value: int):
+        count = self._counts.get(value, 0)
+        if count == 0:
+            self._keys.add(value)
+        self._counts[value] = count + 1
+
+    def remove(self, value: int):
+        count = self._counts[value] - 1
+        if count == 0:
+            del self._counts[value]
+            self._keys.remove(value)
+        else:
+            self._counts[value] = count
+
+    def min(self, default: int = 0) -> int:
+        return self._keys[0] if self._keys else default
+
+    def max(self, default: int = 0) -> int:
+        return self._keys[-1] if self._keys else default
+
+class NoteStatistics:
+    def __init__(self, columns: NoteColumns):
+        self.count = len(columns)
+        self.end_us = CountedMultiset(columns.end_us)
+        self.pitch = CountedMultiset(columns.pitch)
+        self.velocity = CountedMultiset(columns.velocity)
+        self.buzzers: list[int] = np.bincount(columns.buzzer, minlength=4).tolist()
+
+    def add(self, note: Note):
+        self.count += 1
+        self.end_us.add(note.start_us + note.duration_us)
+        self.pitch.add(note.pitch)
+        self.velocity.add(note.velocity)
+        self.buzzers[note.buzzer_index] += 1
+
+    def remove(self, note: Note):
+        self.count -= 1
+        self.end_us.remove(note.start_us + note.duration_us)
+        self.pitch.remove(note.pitch)
+        self.velocity.remove(note.velocity)
+        self.buzzers[note.buzzer_index] -= 1
+
+    def note_changed(self, note: Note, name: str, old):
+        if name == 'start_us':
+            self.end_us.remove(old + note.duration_us)
+            self.end_us.add(note.start_us + note.duration_us)
+        elif name == 'duration_us':
+            self.end_us.remove(note.start_us + old)
+            self.end_us.add(note.start_us + note.duration_us)
+        elif name == 'pitch':
+            self.pitch.remove(old)
+            self.pitch.add(note.pitch)
+        elif name == 'velocity':
+            self.velocity.remove(old)
+            self.velocity.add(note.velocity)
+        elif name == 'buzzer':
+            self.buzzers[old.value] -= 1
+            self.buzzers[note.buzzer_index] += 1
+
+@dataclass
+class TrackSummary:
+    notes_count: int
+    end_us: int
+    min_pitch: int
+    max_pitch: int
+    min_velocity: int
+    max_velocity: int
+    buzzers: list[int]
+
+    @staticmethod
+    def from_statistics(statistics: NoteStatistics) -> TrackSummary:
+        return TrackSummary(
+            notes_count=statistics.count,
+            end_us=statistics.end_us.max(),
+            min_pitch=statistics.pitch.min(),
+            max_pitch=statistics.pitch.max(),
+            min_velocity=statistics.velocity.min(),
+            max_velocity=statistics.velocity.max(),
+            buzzers=list(statistics.buzzers))
@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 from typing import Any
 from PySide6.QtCore import Signal, QItemSelectionModel, QEvent
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QTableView, \
@@ -143,7 +144,7 @@ class NotesListWidget(QWidget):
                 pass  # Note not in list
 
     def set_selected_notes(self, notes: list[Note]):
-        self.selected_notes = sorted(notes, key=lambda n: (n.start_us, n.duration_us, n.pitch, n.buzzer.value))
+        self.selected_notes = sorted(notes, key=lambda n: (n.start_us, n.duration_us, n.pitch, n.buzzer_index))
         self.selected_notes_model.set_node_list(self.selected_notes)
         if notes:
             for btn, _, b in self.buzzer_buttons:
@@ -159,8 +160,12 @@ class NotesListWidget(QWidget):
             btn.setChecked(b in buzzers)
 
     def _set_selected_buzzer(self, buzzer: Buzzer):
+        song = self.selected_notes[0].track.song if self.selected_notes else None
+        with song.batch() if song else nullcontext():
+            for note in self.selected_notes:
+                note.buzzer = buzzer
+        # Listeners get the notes once the batch has updated the song.
         for note in self.selected_notes:
-            note.buzzer = buzzer
             self.note_changed.emit(note)
         for btn, _, b in self.buzzer_buttons:
             btn.setChecked(b == buzzer)
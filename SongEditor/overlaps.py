@@ -0,0 +1,140 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+from sortedcontainers import SortedList
+
+from note_columns import NoteColumns
+
+if TYPE_CHECKING:
+    from song import Note, Track
+
+# A lane entry is (start_us, end_us, id(note), note). The id breaks ties so notes are never compared.
+_Entry = tuple
+
+class OverlapIndex:
+    '''Notes that overlap another note on the same buzzer, kept in one sorted lane per buzzer.
+
+    Two notes conflict when the later one in lane order starts before the earlier one ends.
+    '''
+
+    def __init__(self, buzzers: Iterable[int]):
+        self._lanes: dict = {buzzer: SortedList() for buzzer in buzzers}
+        self._durations: dict = {buzzer: SortedList() for buzzer in self._lanes}
+        self._entries: dict[Note, tuple] = {}
+        self.error_notes: set[Note] = set()
+        self._errors_by_track: dict[Track, set[Note]] = {}
+
+    @staticmethod
+    def _entry(note: Note) -> _Entry:
+        return (note.start_us, note.start_us + note.duration_us, id(note), note)
+
+    def build(self, notes: Iterable[Note]):
+        lanes: dict = {buzzer: [] for buzzer in self._lanes}
+        self._entries.clear()
+        self.error_notes = set()
+        self._errors_by_track = {}
+        for note in notes:
+            lane = lanes.get(note.buzzer_index)
+            if lane is not None:
+                entry = self._entry(note)
+                lane.append(entry)
+                self._entries[note] = (note.buzzer_index, entry)
+        for buzzer, entries in lanes.items():
+            entries.sort()
+            self._lanes[buzzer] = SortedList(entries)
+            self._durations[buzzer] = SortedList(e[1] - e[0] for e in entries)
+            max_end = None
+            for i, (start, end, _, note) in enumerate(entries):
+                if max_end is not None and start < max_end:
+                    self._set_error(note, True)
+                elif i + 1 < len(entries) and entries[i + 1][0] < end:
+                    self._set_error(note, True)
+                if max_end is None or end > max_end:
+                    max_end = end
+
+    def update(self, note: Note):
+        '''Re-evaluates conflicts after start, duration or buzzer of a single note changed.'''
+        affected: set[Note] = {note}
+        old = self._entries.pop(note, None)
+        if old is not None:
+            buzzer, entry = old
+            affected.update(self._conflicting(buzzer, entry))
+            self._lanes[buzzer].remove(entry)
+            self._durations[buzzer].remove(entry[1] - entry[0])
+        buzzer = note.buzzer_index
+        if buzzer in self._lanes:
+            entry = self._entry(note)
+            self._lanes[buzzer].add(entry)
+            self._durations[buzzer].add(entry[1] - entry[0])
+            self._entries[note] = (buzzer, entry)
+            affected.update(self._conflicting(buzzer, entry))
+        for n in affected:
+            lane = self._entries.get(n)
+            self._set_error(n, lane is not None and any(True for _ in self._conflicting(*lane)))
+
+    def remove(self, note: Note):
+        old = self._entries.pop(note, None)
+        if old is None:
+            return
+        buzzer, entry = old
+        affected = set(self._conflicting(buzzer, entry))
+        self._lanes[buzzer].remove(entry)
+        self._durations[buzzer].remove(entry[1] - entry[0])
+        self._set_error(note, False)
+        for n in affected:
+            self._set_error(n, any(True for _ in self._conflicting(*self._entries[n])))
+
+    def track_error_notes(self, track: Track) -> set[Note]:
+        return self._errors_by_track.get(track, set())
+
+    def _conflicting(self, buzzer, entry: _Entry) -> Iterable[Note]:
+        lane = self._lanes[buzzer]
+        durations = self._durations[buzzer]
+        if not durations:
+            return
+        start, end = entry[0], entry[1]
+        for other in lane.irange((start - durations[-1],), (end,), inclusive=(True, False)):
+            if other is entry or other[3] is entry[3]:
+                continue
+            first, second = (other, entry) if other < entry else (entry, other)
+            if second[0] < first[1]:
+                yield other[3]
+
+    def _set_error(self, note: Note, error: bool):
+        if error:
+            self.error_notes.add(note)
+            self._errors_by_track.setdefault(note.track, set()).add(note)
+        elif note in self.error_notes:
+            self.error_notes.discard(note)
+            self._errors_by_track[note.track].discard(note)
+
+def overlap_masks(columns: list[NoteColumns], buzzers: Iterable[int]) -> list[np.ndarray]:
+    '''Vectorized sweep over note columns, returns one boolean error mask per columns entry.
+
+    Uses the same conflict rule as OverlapIndex without building any Note objects.
+    '''
+    if not columns:
+        return []
+    start = np.concatenate([c.start_us for c in columns])
+    end = start + np.concatenate([c.duration_us for c in columns])
+    buzzer = np.concatenate([c.buzzer for c in columns])
+    errors = np.zeros(len(start), dtype=bool)
+    for b in buzzers:
+        lane = np.flatnonzero(buzzer == b)
+        if len(lane) < 2:
+            continue
+        lane = lane[np.lexsort((end[lane], start[lane]))]
+        lane_start = start[lane]
+        lane_end = end[lane]
+        lane_errors = np.zeros(len(lane), dtype=bool)
+        lane_errors[1:] = lane_start[1:] < np.maximum.accumulate(lane_end)[:-1]
+        lane_errors[:-1] |= lane_start[1:] < lane_end[:-1]
+        errors[lane[lane_errors]] = True
+    return np.split(errors, np.cumsum([len(c) for c in columns])[:-1])
+
+@dataclass
+class OverlapFixReport:
+    truncated: list[Note] = field(default_factory=list)
+    removed: list[Note] = field(default_factory=list)
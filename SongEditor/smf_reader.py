@@ -0,0 +1,157 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable
+
+class SmfError(ValueError):
+    pass
+
+@dataclass
+class SmfTrack:
+    name: str = ''
+    start_ticks: list[int] = field(default_factory=list)
+    end_ticks: list[int] = field(default_factory=list)
+    pitch: list[int] = field(default_factory=list)
+    velocity: list[int] = field(default_factory=list)
+    tempo_changes: list[tuple[int, int]] = field(default_factory=list)
+
+@dataclass
+class SmfFile:
+    format: int
+    ticks_per_beat: int
+    tracks: list[SmfTrack]
+
+class SmfReader:
+    '''Minimal standard MIDI file reader working directly on the file bytes.
+
+    Only note on/off, tempo and track name events are decoded, everything else is skipped by its
+    length. Notes are paired per pitch like MidiLoader does with mido messages.
+    '''
+
+    # Data bytes following a status byte, indexed by status >> 4 for channel messages.
+    _CHANNEL_DATA_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+    _SYSTEM_DATA_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+    PROGRESS_INTERVAL = 8192
+
+    @staticmethod
+    def read(fname: str, progress_callback: Callable[[int, int, int], None] | None = None) -> SmfFile:
+        with open(fname, 'rb') as f:
+            return SmfReader.parse(f.read(), progress_callback)
+
+    @staticmethod
+    def parse(data: bytes, progress_callback: Callable[[int, int, int], None] | None = None) -> SmfFile:
+        '''progress_callback gets the track index, the track count and the messages read in the track.'''
+        view = memoryview(data)
+        if bytes(view[0:4]) != b'MThd':
+            raise SmfError('Missing MThd header')
+        header_length = int.from_bytes(view[4:8], 'big')
+        if header_length < 6:
+            raise SmfError('Truncated MThd header')
+        file_format = int.from_bytes(view[8:10], 'big')
+        track_count = int.from_bytes(view[10:12], 'big')
+        division = int.from_bytes(view[12:14], 'big')
+        if division & 0x8000:
+            raise SmfError('SMPTE time division is not supported')
+
+        tracks = []
+        position = 8 + header_length
+        while position + 8 <= len(view):
+            chunk_type = bytes(view[position:position + 4])
+            chunk_length = int.from_bytes(view[position + 4:position + 8], 'big')
+            position += 8
+            if position + chunk_length > len(view):
+                raise SmfError('Truncated chunk')
+            if chunk_type == b'MTrk':
+                tracks.append(SmfReader._parse_track(view[position:position + chunk_length], len(tracks),
+                                                     max(track_count, len(tracks) + 1), progress_callback))
+            position += chunk_length
+        return SmfFile(format=file_format, ticks_per_beat=division, tracks=tracks)
+
+    @staticmethod
+    def _parse_track(data: memoryview, track_index: int, track_count: int,
+                     progress_callback: Callable[[int, int, int], None] | None) -> SmfTrack:
+        track = SmfTrack()
+        on_notes: dict[int, tuple[int, int]] = {}
+        channel_lengths = SmfReader._CHANNEL_DATA_LENGTHS
+        system_lengths = SmfReader._SYSTEM_DATA_LENGTHS
+        has_name = False
+        ticks = 0
+        running_status = None
+        position = 0
+        end = len(data)
+        messages = 0
+        next_progress = SmfReader.PROGRESS_INTERVAL if progress_callback else -1
+        if progress_callback:
+            progress_callback(track_index, track_count, 0)
+        try:
+            while position < end:
+                messages += 1
+                if messages == next_progress:
+                    progress_callback(track_index, track_count, messages)
+                    next_progress += SmfReader.PROGRESS_INTERVAL
+                delta = 0
+                while True:
+                    byte = data[position]
+                    position += 1
+                    delta = (delta << 7) | (byte & 0x7F)
+                    if byte < 0x80:
+                        break
+                ticks += delta
+
+                status = data[position]
+                if status < 0x80:
+                    if running_status is None:
+                        raise SmfError('Running status without previous status')
+                    status = running_status
+                else:
+                    position += 1
+                    if status != 0xFF:
+                        # Meta events do not change the running status, like in mido.
+                        running_status = status
+
+                kind = status >> 4
+                if kind == 0x8 or kind == 0x9:
+                    pitch = data[position]
+                    velocity = min(data[position + 1], 127)
+                    position += 2
+                    if kind == 0x9 and velocity > 0:
+                        on_notes[pitch] = (ticks, velocity)
+                    elif pitch in on_notes:
+                        start, on_velocity = on_notes.pop(pitch)
+                        track.start_ticks.append(start)
+                        track.end_ticks.append(ticks)
+                        track.pitch.append(pitch)
+                        track.velocity.append(on_velocity)
+                elif kind < 0xF:
+                    position += channel_lengths[kind]
+                elif status == 0xFF:
+                    meta_type = data[position]
+                    position += 1
+                    length, position = SmfReader._read_variable_length(data, position)
+                    if meta_type == 0x51 and length == 3:
+                        track.tempo_changes.append((ticks, int.from_bytes(data[position:position + 3], 'big')))
+                    elif meta_type == 0x03 and not has_name:
+                        track.name = bytes(data[position:position + length]).decode('latin1')
+                        has_name = True
+                    position += length
+                elif status == 0xF0 or status == 0xF7:
+                    length, position = SmfReader._read_variable_length(data, position)
+                    position += length
+                else:
+                    position += system_lengths.get(status, 0)
+        except IndexError:
+            raise SmfError('Truncated track') from None
+        if position > end:
+            raise SmfError('Truncated track')
+        if progress_callback:
+            progress_callback(track_index, track_count, messages)
+        return track
+
+    @staticmethod
+    def _read_variable_length(data: memoryview, position: int) -> tuple[int, int]:
+        value = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value = (value << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                return value, position
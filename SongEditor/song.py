@@ -1,8 +1,21 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass, field
 import enum
+import heapq
 import json
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+import numpy as np
+
+from note_columns import NoteColumns
+from note_index import NoteIndex
+from note_statistics import NoteStatistics, TrackSummary
+from overlaps import OverlapFixReport, OverlapIndex, overlap_masks
+
+if TYPE_CHECKING:
+    import mmap
+    from buzzer_allocator import AllocationPriority, AllocationReport
 
 class Buzzer(enum.Enum):
     NONE = 0
@@ -10,29 +23,45 @@ class Buzzer(enum.Enum):
     BUZZER_2 = 2
     BUZZER_3 = 3
 
-@dataclass
-class Note:
-    start_us: int
-    duration_us: int
-    pitch: int
-    velocity: int
-    buzzer: Buzzer
+PLAYABLE_BUZZERS = (Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3)
 
-    track: Track = field(repr=False)
+_BUZZERS = tuple(Buzzer)
+_NOTE_FIELDS = frozenset({'start_us', 'duration_us', 'pitch', 'velocity', 'buzzer'})
 
-    _change_listeners: set[Callable[[], None]] = field(default_factory=set, init=False, repr=False)
+class Note:
+    # Hardly any note has listeners, the listener set is only created on the first subscription.
+    __slots__ = ('start_us', 'duration_us', 'pitch', 'velocity', 'buzzer_index', 'track', '_listeners')
+
+    def __init__(self, start_us: int, duration_us: int, pitch: int, velocity: int, buzzer: Buzzer, track: Track):
+        object.__setattr__(self, 'start_us', start_us)
+        object.__setattr__(self, 'duration_us', duration_us)
+        object.__setattr__(self, 'pitch', pitch)
+        object.__setattr__(self, 'velocity', velocity)
+        object.__setattr__(self, 'buzzer_index', buzzer.value)
+        object.__setattr__(self, 'track', track)
+        object.__setattr__(self, '_listeners', None)
 
     def add_change_listener(self, listener: Callable[[], None]):
-        self._change_listeners.add(listener)
+        if self._listeners is None:
+            object.__setattr__(self, '_listeners', set())
+        self._listeners.add(listener)
 
     def remove_change_listener(self, listener: Callable[[], None]):
-        self._change_listeners.discard(listener)
+        if self._listeners is not None:
+            self._listeners.discard(listener)
+            if not self._listeners:
+                object.__setattr__(self, '_listeners', None)
 
     def _notify_change_listeners(self):
-        if hasattr(self, '_change_listeners'):
-            for listener in self._change_listeners:
+        listeners = self._listeners
+        if listeners:
+            for listener in listeners:
                 listener()
 
+    @property
+    def buzzer(self) -> Buzzer:
+        return _BUZZERS[self.buzzer_index]
+
     @property
     def frequency(self) -> float:
         return 440.0 * (2 ** ((self.pitch - 69) / 12.0))
@@ -47,11 +76,20 @@ class Note:
     def __eq__(self, other):
         return self is other
 
+    def __repr__(self) -> str:
+        return (f'Note(start_us={self.start_us!r}, duration_us={self.duration_us!r}, pitch={self.pitch!r}, '
+                f'velocity={self.velocity!r}, buzzer={self.buzzer!r})')
+
     def __setattr__(self, name: str, value) -> None:
-        super().__setattr__(name, value)
-        if name in {'start_us', 'duration_us', 'pitch', 'velocity', 'buzzer'}:
-            if hasattr(self, 'track'):
-                self.track.invalidate_cache()
+        if name not in _NOTE_FIELDS:
+            object.__setattr__(self, name, value)
+            return
+        old = getattr(self, name)
+        if name == 'buzzer':
+            object.__setattr__(self, 'buzzer_index', value.value)
+        else:
+            object.__setattr__(self, name, value)
+        if not self.track._note_changed(self, name, old):
             self._notify_change_listeners()
 
     def to_dict(self) -> dict:
@@ -64,34 +102,114 @@ class Note:
         }
 
 
-@dataclass
 class Track:
-    name: str
-    notes: list[Note]
-    song: Song | None = field(repr=False)
+    def __init__(self, name: str, notes: list[Note] | None, song: Song | None,
+                 columns: NoteColumns | None = None, summary: TrackSummary | None = None):
+        self.name = name
+        self.song = song
+        self._notes: list[Note] | None = notes if notes is not None or columns is not None else []
+        self._columns: NoteColumns | None = columns
+        self._statistics: NoteStatistics | None = None
+        self._summary: TrackSummary | None = summary
+        self._index: NoteIndex | None = None
+        self._change_listeners: set[Callable[[], None]] = set()
 
-    _duration_us: int | None = field(default=None, init=False, repr=False)
-    _min_pitch: int | None = field(default=None, init=False, repr=False)
-    _max_pitch: int | None = field(default=None, init=False, repr=False)
-    _min_velocity: int | None = field(default=None, init=False, repr=False)
-    _max_velocity: int | None = field(default=None, init=False, repr=False)
-    _buzzers_usage: dict[Buzzer, int] | None = field(init=False, repr=False)
-    _error_notes: set[Note] | None = field(default=None, init=False, repr=False)
+    @staticmethod
+    def from_columns(name: str, columns: NoteColumns, song: Song | None, summary: TrackSummary | None = None) -> Track:
+        return Track(name=name, notes=None, song=song, columns=columns, summary=summary)
 
-    _change_listeners: set[Callable[[], None]] = field(default_factory=set, init=False, repr=False)
+    @property
+    def notes(self) -> list[Note]:
+        if self._notes is None:
+            self._notes = self.columns.to_notes(self)
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes: list[Note]):
+        self._notes = notes
+        self._columns = None
+        self._statistics = None
+        self._summary = None
+        self._index = None
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._notes is not None
+
+    @property
+    def columns(self) -> NoteColumns:
+        if self._columns is None:
+            self._columns = NoteColumns.from_notes(self._notes or [])
+        return self._columns
+
+    @property
+    def index(self) -> NoteIndex:
+        if self._index is None:
+            self._index = NoteIndex(self.notes)
+        return self._index
+
+    def notes_in_range(self, start_us: int, end_us: int,
+                       min_pitch: int | None = None, max_pitch: int | None = None) -> Iterator[Note]:
+        return self.index.notes_in_range(start_us, end_us, min_pitch, max_pitch)
+
+    @property
+    def statistics(self) -> NoteStatistics:
+        if self._statistics is None:
+            self._statistics = NoteStatistics(self.columns)
+        return self._statistics
+
+    @property
+    def summary(self) -> TrackSummary:
+        if self._summary is None:
+            self._summary = TrackSummary.from_statistics(self.statistics)
+        return self._summary
 
     def invalidate_cache(self):
-        self._duration_us = None
-        self._min_pitch = None
-        self._max_pitch = None
-        self._min_velocity = None
-        self._max_velocity = None
-        self._buzzers_usage = None
-        self._error_notes = None
+        if self._notes is not None:
+            self._columns = None
+        self._statistics = None
+        self._summary = None
+        self._index = None
         if self.song:
             self.song.invalidate_cache()
+            if self.song._defer_notifications(self):
+                return
+        self._notify_change_listeners()
+
+    def remove_notes(self, notes: Iterable[Note]):
+        removed = set(notes)
+        if not removed:
+            return
+        self._notes = [note for note in self.notes if note not in removed]
+        self._columns = None
+        self._summary = None
+        for note in removed:
+            if self._statistics is not None:
+                self._statistics.remove(note)
+            if self._index is not None:
+                self._index.remove(note)
+        if self.song:
+            self.song._notes_removed(removed)
+            if self.song._defer_notifications(self):
+                return
         self._notify_change_listeners()
 
+    def _note_changed(self, note: Note, name: str, old) -> bool:
+        '''Returns True if notifications are held back by a batch of the song.'''
+        if self._notes is not None:
+            self._columns = None
+        if self._statistics is not None:
+            self._statistics.note_changed(note, name, old)
+        self._summary = None
+        if self._index is not None and name in {'start_us', 'duration_us', 'pitch'}:
+            self._index.update(note)
+        if self.song:
+            self.song._note_changed(note, name, old)
+            if self.song._defer_notifications(self, note):
+                return True
+        self._notify_change_listeners()
+        return False
+
     def add_change_listener(self, listener: Callable[[], None]):
         self._change_listeners.add(listener)
 
@@ -99,54 +217,28 @@ class Track:
         self._change_listeners.discard(listener)
 
     def _notify_change_listeners(self):
-        if hasattr(self, '_change_listeners'):
-            for listener in self._change_listeners:
-                listener()
+        for listener in self._change_listeners:
+            listener()
 
     @property
     def duration_us(self) -> int:
-        if self._duration_us is None:
-            if not self.notes:
-                self._duration_us = 0
-            else:
-                self._duration_us = max(note.start_us + note.duration_us for note in self.notes)
-        return self._duration_us
+        return self.summary.end_us
 
     @property
     def min_pitch(self) -> int:
-        if self._min_pitch is None:
-            if not self.notes:
-                self._min_pitch = 0
-            else:
-                self._min_pitch = min(note.pitch for note in self.notes)
-        return self._min_pitch
+        return self.summary.min_pitch
 
     @property
     def max_pitch(self) -> int:
-        if self._max_pitch is None:
-            if not self.notes:
-                self._max_pitch = 0
-            else:
-                self._max_pitch = max(note.pitch for note in self.notes)
-        return self._max_pitch
+        return self.summary.max_pitch
 
     @property
     def min_velocity(self) -> int:
-        if self._min_velocity is None:
-            if not self.notes:
-                self._min_velocity = 0
-            else:
-                self._min_velocity = min(note.velocity for note in self.notes)
-        return self._min_velocity
+        return self.summary.min_velocity
 
     @property
     def max_velocity(self) -> int:
-        if self._max_velocity is None:
-            if not self.notes:
-                self._max_velocity = 0
-            else:
-                self._max_velocity = max(note.velocity for note in self.notes)
-        return self._max_velocity
+        return self.summary.max_velocity
 
     @property
     def pitch_range(self) -> int:
@@ -158,32 +250,26 @@ class Track:
 
     @property
     def notes_count(self) -> int:
-        return len(self.notes)
+        return self.summary.notes_count
 
     @property
     def buzzers_usage(self) -> dict[Buzzer, int]:
-        if not hasattr(self, '_buzzers_usage'):
-            return { buzzer: 0 for buzzer in Buzzer }
-        if self._buzzers_usage is None:
-            usage = {buzzer: 0 for buzzer in Buzzer}
-            for note in self.notes:
-                usage[note.buzzer] += 1
-            self._buzzers_usage = usage
-        return self._buzzers_usage
+        return {buzzer: self.summary.buzzers[buzzer.value] for buzzer in Buzzer}
 
     @property
     def error_notes(self) -> set[Note]:
-        if self._error_notes:
-            return self._error_notes
         if self.song:
-            self._error_notes = {note for note in self.song.error_notes if note.track is self}
-        else:
-            self._error_notes = set()
-        return self._error_notes
+            return self.song.track_error_notes(self)
+        return set()
 
     @property
     def error_notes_count(self) -> int:
-        return len(self.error_notes)
+        if self.song:
+            return self.song.track_error_notes_count(self)
+        return 0
+
+    def __repr__(self) -> str:
+        return f'Track(name={self.name!r}, notes_count={self.notes_count})'
 
     def __hash__(self):
         return id(self)
@@ -194,7 +280,7 @@ class Track:
     def to_dict(self) -> dict:
         return {
             'name': self.name,
-            'notes': [note.to_dict() for note in self.notes]
+            'notes': [note.to_dict() for note in self._notes] if self._notes is not None else self.columns.to_dicts()
         }
 
 @dataclass
@@ -207,17 +293,107 @@ class Song:
     _velocity_range: tuple[int, int] | None = field(default=None, init=False, repr=False)
     _notes_count: int | None = field(default=None, init=False, repr=False)
     _buzzer_usage: dict[Buzzer, int] | None = field(default=None, init=False, repr=False)
-    _error_notes: set[Note] | None = field(default=None, init=False, repr=False)
+    _overlaps: OverlapIndex | None = field(default=None, init=False, repr=False)
+    _error_masks: dict[Track, np.ndarray] | None = field(default=None, init=False, repr=False)
+    _error_masks_notes: dict[Track, set[Note]] = field(default_factory=dict, init=False, repr=False)
+    _errors_from_columns: bool = field(default=True, init=False, repr=False)
+
+    _batch_depth: int = field(default=0, init=False, repr=False)
+    _batch_invalidated: bool = field(default=False, init=False, repr=False)
+    _batch_notes: set[Note] = field(default_factory=set, init=False, repr=False)
+    _batch_moved_notes: set[Note] = field(default_factory=set, init=False, repr=False)
+    _batch_tracks: set[Track] = field(default_factory=set, init=False, repr=False)
 
     _change_listeners: set[Callable[[], None]] = field(default_factory=set, init=False, repr=False)
+    # The mapped song file that the columns of unmaterialized tracks are views into.
+    _mapped_file: mmap.mmap | None = field(default=None, init=False, repr=False)
 
     def invalidate_cache(self):
+        if self._batch_depth:
+            self._batch_invalidated = True
+            return
+        self._reset_aggregates()
+        self._notes_count = None
+        self._overlaps = None
+        self._error_masks = None
+        self._errors_from_columns = True
+        self._notify_change_listeners()
+
+    def _reset_aggregates(self):
         self._duration_us = None
         self._pitch_range = None
         self._velocity_range = None
-        self._notes_count = None
         self._buzzer_usage = None
-        self._error_notes = None
+
+    def _note_changed(self, note: Note, name: str, old):
+        moved = name in {'start_us', 'duration_us', 'buzzer'}
+        if moved:
+            self._drop_error_masks()
+        if self._batch_depth:
+            if moved:
+                self._batch_moved_notes.add(note)
+            return
+        self._reset_aggregates()
+        if self._overlaps is not None and moved:
+            self._overlaps.update(note)
+        self._notify_change_listeners()
+
+    def _notes_removed(self, notes: set[Note]):
+        self._drop_error_masks()
+        if self._overlaps is not None:
+            for note in notes:
+                self._overlaps.remove(note)
+        self._batch_moved_notes -= notes
+        self._notes_count = None
+        if self._batch_depth:
+            return
+        self._reset_aggregates()
+        self._notify_change_listeners()
+
+    @contextmanager
+    def batch(self) -> Iterator[Song]:
+        '''Holds back cache invalidation and change notifications until the outermost batch ends.'''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._commit_batch()
+
+    def _defer_notifications(self, track: Track, note: Note | None = None) -> bool:
+        if not self._batch_depth:
+            return False
+        self._batch_tracks.add(track)
+        if note is not None:
+            self._batch_notes.add(note)
+        return True
+
+    def _commit_batch(self):
+        notes, self._batch_notes = self._batch_notes, set()
+        moved_notes, self._batch_moved_notes = self._batch_moved_notes, set()
+        tracks, self._batch_tracks = self._batch_tracks, set()
+        invalidated, self._batch_invalidated = self._batch_invalidated, False
+        if not (notes or tracks or invalidated):
+            return
+
+        self._reset_aggregates()
+        if invalidated:
+            self._notes_count = None
+            self._overlaps = None
+            self._error_masks = None
+            self._errors_from_columns = True
+        elif self._overlaps is not None and moved_notes:
+            if len(moved_notes) * 4 > self.notes_count:
+                self._overlaps = None
+            else:
+                for note in moved_notes:
+                    self._overlaps.update(note)
+
+        for note in notes:
+            note._notify_change_listeners()
+        for track in tracks:
+            track._notify_change_listeners()
         self._notify_change_listeners()
 
     def add_change_listener(self, listener: Callable[[], None]):
@@ -265,7 +441,7 @@ class Song:
     @property
     def notes_count(self) -> int:
         if self._notes_count is None:
-            self._notes_count = sum(len(track.notes) for track in self.tracks)
+            self._notes_count = sum(track.notes_count for track in self.tracks)
         return self._notes_count
 
     @property
@@ -280,16 +456,63 @@ class Song:
 
     @property
     def error_notes(self) -> set[Note]:
-        if self._error_notes is None:
-            self._error_notes = self._calculate_error_notes()
-        return self._error_notes
+        return self._overlap_index.error_notes
+
+    @property
+    def error_notes_count(self) -> int:
+        masks = self._column_error_masks()
+        if masks is not None:
+            return sum(int(mask.sum()) for mask in masks.values())
+        return len(self._overlap_index.error_notes)
+
+    def track_error_notes(self, track: Track) -> set[Note]:
+        masks = self._column_error_masks()
+        if masks is not None:
+            if track not in self._error_masks_notes:
+                notes = track.notes
+                self._error_masks_notes[track] = {notes[i] for i in np.flatnonzero(masks[track]).tolist()}
+            return self._error_masks_notes[track]
+        return self._overlap_index.track_error_notes(track)
+
+    def track_error_notes_count(self, track: Track) -> int:
+        masks = self._column_error_masks()
+        if masks is not None:
+            return int(masks[track].sum())
+        return len(self._overlap_index.track_error_notes(track))
+
+    def _column_error_masks(self) -> dict[Track, np.ndarray] | None:
+        '''Error masks computed from the note columns, so a freshly loaded song needs no Note objects.
+
+        They are only used until the first edit, from then on the incremental overlap index takes over.
+        '''
+        if self._overlaps is not None or not self._errors_from_columns:
+            return None
+        if self._error_masks is None:
+            masks = overlap_masks([track.columns for track in self.tracks], [buzzer.value for buzzer in PLAYABLE_BUZZERS])
+            self._error_masks = dict(zip(self.tracks, masks))
+            self._error_masks_notes = {}
+        return self._error_masks
+
+    def _drop_error_masks(self):
+        self._error_masks = None
+        self._error_masks_notes = {}
+        self._errors_from_columns = False
+
+    @property
+    def _overlap_index(self) -> OverlapIndex:
+        if self._overlaps is None:
+            self._overlaps = OverlapIndex(buzzer.value for buzzer in PLAYABLE_BUZZERS)
+            self._overlaps.build(note for track in self.tracks for note in track.notes)
+        return self._overlaps
 
     @property
     def all_notes(self) -> list[Note]:
-        notes = []
-        for track in self.tracks:
-            notes.extend(track.notes)
-        return sorted(notes, key=lambda n: (n.start_us, n.duration_us, n.pitch))
+        return list(heapq.merge(*(track.index for track in self.tracks), key=NoteIndex.sort_key))
+
+    def notes_in_range(self, start_us: int, end_us: int,
+                       min_pitch: int | None = None, max_pitch: int | None = None) -> Iterator[Note]:
+        return heapq.merge(*(track.notes_in_range(start_us, end_us, min_pitch, max_pitch) for track in self.tracks),
+                           key=NoteIndex.sort_key)
 
     def to_dict(self) -> dict:
         return {
@@ -312,80 +535,53 @@ class Song:
 
         tracks = []
         for track_data in obj['tracks']:
-            track = Track(
-                name=track_data['name'],
-                notes=[],
-                song=song)
-            notes = []
-            for note_data in track_data['notes']:
-                note = Note(
-                    start_us=note_data['start_us'],
-                    duration_us=note_data['duration_us'],
-                    pitch=note_data['pitch'],
-                    velocity=note_data['velocity'],
-                    buzzer=Buzzer[note_data['buzzer']],
-                    track=track
-                )
-                notes.append(note)
-            track.notes = notes
-            track.invalidate_cache()
-            tracks.append(track)
+            notes_data = track_data['notes']
+            columns = NoteColumns.from_arrays(
+                start_us=[note_data['start_us'] for note_data in notes_data],
+                duration_us=[note_data['duration_us'] for note_data in notes_data],
+                pitch=[note_data['pitch'] for note_data in notes_data],
+                velocity=[note_data['velocity'] for note_data in notes_data],
+                buzzer=[Buzzer[note_data['buzzer']].value for note_data in notes_data])
+            tracks.append(Track.from_columns(track_data['name'], columns, song))
         song.tracks = tracks
         song.invalidate_cache()
 
         return song
 
-    def _calculate_error_notes(self) -> set[Note]:
-        error_notes = set()
-        for buzzer in {Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3}:
-            buzzer_notes = []
-            for track in self.tracks:
-                for note in track.notes:
-                    if note.buzzer == buzzer:
-                        buzzer_notes.append(note)
-            buzzer_notes.sort(key=lambda n: n.start_us)
-            active_notes: set[Note] = set()
-            for note in buzzer_notes:
-                active_notes_copy = active_notes.copy()
-                for active_note in active_notes_copy:
-                    if note.start_us < active_note.end_us:
-                        error_notes.add(note)
-                        error_notes.add(active_note)
-                    else:
-                        active_notes.remove(active_note)
-                active_notes.add(note)
-        return error_notes
-
-    def fix_overlaps(self):
-        for buzzer in {Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3}:
-            buzzer_notes = []
-            for track in self.tracks:
-                for note in track.notes:
-                    if note.buzzer == buzzer:
-                        buzzer_notes.append(note)
-            buzzer_notes.sort(key=lambda n: n.start_us)
-            active_notes: list[Note] = []
-            for note in buzzer_notes:
-                active_notes_copy = active_notes.copy()
-                for active_note in active_notes_copy:
-                    if note.start_us < active_note.end_us:
-                        active_note.duration_us = note.start_us - active_note.start_us
-                active_notes.append(note)
-        self.invalidate_cache()
-
-    def auto_assign_buzzers(self):
-        buzzer_end_times = {
-            Buzzer.BUZZER_1: 0,
-            Buzzer.BUZZER_2: 0,
-            Buzzer.BUZZER_3: 0
-        }
-
-        sorted_notes = sorted(self.all_notes, key=lambda n: n.start_us)
-
-        for note in sorted_notes:
-            earliest_buzzer = min(buzzer_end_times, key=lambda b: buzzer_end_times[b])
-            note.buzzer = earliest_buzzer
-            buzzer_end_times[earliest_buzzer] = note.end_us
+    def fix_overlaps(self, drop_empty: bool = False) -> OverlapFixReport:
+        '''Truncates every note that is still sounding when the next note on its buzzer starts.'''
+        lanes: dict[int, list[Note]] = {buzzer.value: [] for buzzer in PLAYABLE_BUZZERS}
+        for track in self.tracks:
+            for note in track.notes:
+                lane = lanes.get(note.buzzer_index)
+                if lane is not None:
+                    lane.append(note)
+
+        report = OverlapFixReport()
+        with self.batch():
+            for lane in lanes.values():
+                lane.sort(key=lambda n: (n.start_us, n.start_us + n.duration_us))
+                previous: Note | None = None
+                for note in lane:
+                    if previous is not None and note.start_us < previous.end_us:
+                        previous.duration_us = note.start_us - previous.start_us
+                        report.truncated.append(previous)
+                        if drop_empty and previous.duration_us == 0:
+                            report.removed.append(previous)
+                    previous = note
+            removed_by_track: dict[Track, list[Note]] = {}
+            for note in report.removed:
+                removed_by_track.setdefault(note.track, []).append(note)
+            for track, notes in removed_by_track.items():
+                track.remove_notes(notes)
+        return report
+
+    def auto_assign_buzzers(self, priorities: Iterable[AllocationPriority] | None = None,
+                            preempt: bool = False) -> AllocationReport:
+        from buzzer_allocator import BuzzerAllocator
+        allocator = BuzzerAllocator(priorities=priorities, preempt=preempt) if priorities is not None \
+            else BuzzerAllocator(preempt=preempt)
+        return allocator.allocate(self)
 
     def to_buzzer_tracks(self) -> dict[Buzzer, list[Note]]:
         buzzer_tracks: dict[Buzzer, list[Note]] = {
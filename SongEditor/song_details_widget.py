@@ -141,16 +141,13 @@ class SongDetailsWidget(QWidget):
             self.pitch_range_label.setText(f'{min_pitch}-{max_pitch}')
             min_velocity, max_velocity = self.song.velocity_range
             self.velocity_range_label.setText(f'{min_velocity}-{max_velocity}')
-            self.notes_count_label.setText(str(sum(len(track.notes) for track in self.song.tracks)))
-            buzzers_usage = {buzzer: 0 for buzzer in Buzzer}
-            for track in self.song.tracks:
-                for note in track.notes:
-                    buzzers_usage[note.buzzer] += 1
+            self.notes_count_label.setText(str(self.song.notes_count))
+            buzzers_usage = self.song.buzzer_usage
             self.notes_buzzer_none_label.setText(str(buzzers_usage[Buzzer.NONE]))
             self.notes_buzzer_1_label.setText(str(buzzers_usage[Buzzer.BUZZER_1]))
             self.notes_buzzer_2_label.setText(str(buzzers_usage[Buzzer.BUZZER_2]))
             self.notes_buzzer_3_label.setText(str(buzzers_usage[Buzzer.BUZZER_3]))
-            self.notes_error_label.setText(str(sum(track.error_notes_count for track in self.song.tracks)))
+            self.notes_error_label.setText(str(self.song.error_notes_count))
         else:
             self.duration_label.setText("0.00 s")
             self.pitch_range_label.setText("0-0")
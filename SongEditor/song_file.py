@@ -0,0 +1,138 @@
+from __future__ import annotations
+import mmap
+import os
+import stat
+import struct
+import tempfile
+
+import numpy as np
+
+from note_columns import NoteColumns
+from note_statistics import TrackSummary
+from song import Song, Track
+
+class SongFile:
+    '''Binary song container.
+
+    Layout (little endian): header, song name, track table, packed note records.
+    - header: magic, format version, reserved, track count, song name length
+    - track table entry: name length, note count, file offset of the notes, followed by the name
+      (since version 2 the summary of the track sits between the offset and the name)
+    - note record: start_us (i8), duration_us (i8), pitch (u1), velocity (u1), buzzer (u1)
+    '''
+
+    MAGIC = b'FBSG'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHII')
+    TRACK_ENTRY = struct.Struct('<IIQ')
+    TRACK_SUMMARY = struct.Struct('<qBBBB4I')
+    NOTE_RECORD = np.dtype([
+        ('start_us', '<i8'),
+        ('duration_us', '<i8'),
+        ('pitch', 'u1'),
+        ('velocity', 'u1'),
+        ('buzzer', 'u1')])
+
+    @staticmethod
+    def is_binary(fname: str) -> bool:
+        with open(fname, 'rb') as f:
+            return f.read(len(SongFile.MAGIC)) == SongFile.MAGIC
+
+    @staticmethod
+    def load(fname: str) -> Song:
+        '''Loads a binary or JSON song, detected by the file content.'''
+        if not SongFile.is_binary(fname):
+            with open(fname, 'r') as f:
+                return Song.from_json(f.read())
+        with open(fname, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        song = SongFile.from_buffer(mapping)
+        # The note columns are views into the mapping until every track has been materialized. save()
+        # replaces the file instead of rewriting it, so the mapping keeps the content it was loaded with.
+        song._mapped_file = mapping
+        return song
+
+    @staticmethod
+    def save(song: Song, fname: str):
+        '''Saves JSON for *.json files and the binary format for everything else.
+
+        The song is serialized completely before the file is touched and then written to a temporary
+        file that replaces the target, so a failed save never leaves a truncated file behind.
+        '''
+        if os.path.splitext(fname)[1].lower() == '.json':
+            data = song.to_json().encode('utf-8')
+        else:
+            data = SongFile.to_bytes(song)
+        try:
+            mode = stat.S_IMODE(os.stat(fname).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, fname)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def to_bytes(song: Song) -> bytes:
+        song_name = song.name.encode('utf-8')
+        track_names = [track.name.encode('utf-8') for track in song.tracks]
+        offset = SongFile.HEADER.size + len(song_name) \
+            + sum(SongFile.TRACK_ENTRY.size + SongFile.TRACK_SUMMARY.size + len(name) for name in track_names)
+
+        parts = [SongFile.HEADER.pack(SongFile.MAGIC, SongFile.VERSION, 0, len(song.tracks), len(song_name)), song_name]
+        records = []
+        for track, name in zip(song.tracks, track_names):
+            columns = track.columns
+            track_records = np.empty(len(columns), dtype=SongFile.NOTE_RECORD)
+            track_records['start_us'] = columns.start_us
+            track_records['duration_us'] = columns.duration_us
+            track_records['pitch'] = columns.pitch
+            track_records['velocity'] = columns.velocity
+            track_records['buzzer'] = columns.buzzer
+            summary = track.summary
+            parts.append(SongFile.TRACK_ENTRY.pack(len(name), len(track_records), offset))
+            parts.append(SongFile.TRACK_SUMMARY.pack(summary.end_us, summary.min_pitch, summary.max_pitch,
+                                                     summary.min_velocity, summary.max_velocity, *summary.buzzers))
+            parts.append(name)
+            records.append(track_records.tobytes())
+            offset += track_records.nbytes
+        return b''.join(parts + records)
+
+    @staticmethod
+    def from_buffer(buffer) -> Song:
+        view = memoryview(buffer)
+        magic, version, _, track_count, name_length = SongFile.HEADER.unpack_from(view, 0)
+        if magic != SongFile.MAGIC:
+            raise ValueError('Not a binary song file')
+        if version > SongFile.VERSION:
+            raise ValueError(f'Unsupported song file version {version}')
+        position = SongFile.HEADER.size
+        song = Song(name=bytes(view[position:position + name_length]).decode('utf-8'), tracks=[])
+        position += name_length
+
+        tracks = []
+        for _ in range(track_count):
+            name_length, note_count, notes_offset = SongFile.TRACK_ENTRY.unpack_from(view, position)
+            position += SongFile.TRACK_ENTRY.size
+            summary = None
+            if version >= 2:
+                end_us, min_pitch, max_pitch, min_velocity, max_velocity, *buzzers = \
+                    SongFile.TRACK_SUMMARY.unpack_from(view, position)
+                summary = TrackSummary(note_count, end_us, min_pitch, max_pitch, min_velocity, max_velocity, buzzers)
+                position += SongFile.TRACK_SUMMARY.size
+            name = bytes(view[position:position + name_length]).decode('utf-8')
+            position += name_length
+            records = np.frombuffer(buffer, dtype=SongFile.NOTE_RECORD, count=note_count, offset=notes_offset)
+            columns = NoteColumns.from_arrays(records['start_us'], records['duration_us'], records['pitch'],
+                                              records['velocity'], records['buzzer'])
+            tracks.append(Track.from_columns(name, columns, song, summary))
+        view.release()
+        song.tracks = tracks
+        return song
@@ -1,75 +1,718 @@
-from song import Note, Track, Song
+from song import Song
+from synth import SquareWaveRenderer
 
-import simpleaudio as sa
-from sortedcontainers import SortedList
 import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import queue as queue_module
 
 from dataclasses import dataclass
+import threading
 import time
+from typing import Callable
+import wave
 import numpy as np
 
+@dataclass
+class OutputStats:
+    '''Gaps between the chunks handed to the sink, in microseconds.
+
+    A gap is the time the sink waited for the next chunk after the previous write returned, it is
+    zero as long as the render thread keeps ahead of the output.
+    '''
+    writes: int = 0
+    total_gap_us: int = 0
+    max_gap_us: int = 0
+
+    def add(self, gap_us: int):
+        self.writes += 1
+        self.total_gap_us += gap_us
+        self.max_gap_us = max(self.max_gap_us, gap_us)
+
+    @property
+    def mean_gap_us(self) -> float:
+        return self.total_gap_us / self.writes if self.writes else 0.0
+
+class AudioSink:
+    '''Destination of rendered 16 bit mono samples. write() blocks while the device is busy.'''
+
+    # Sinks that cannot join separately written blocks without gaps take the song as one buffer.
+    streaming = True
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+
+    def write(self, samples: np.ndarray):
+        pass
+
+    def close(self):
+        pass
+
+class NullSink(AudioSink):
+    '''Discards the samples, optionally at the pace of a real device.'''
+
+    def __init__(self, sample_rate: int, realtime: bool = False):
+        super().__init__(sample_rate)
+        self.realtime = realtime
+        self.samples_written = 0
+        self._start = time.monotonic()
+
+    def write(self, samples: np.ndarray):
+        self.samples_written += len(samples)
+        if self.realtime:
+            delay = self._start + self.samples_written / self.sample_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._start -= delay
+
+class WaveFileSink(AudioSink):
+    def __init__(self, fname: str, sample_rate: int):
+        super().__init__(sample_rate)
+        self._file = wave.open(fname, 'wb')
+        self._file.setnchannels(1)
+        self._file.setsampwidth(2)
+        self._file.setframerate(sample_rate)
+
+    def write(self, samples: np.ndarray):
+        self._file.writeframes(samples.astype('<i2').tobytes())
+
+    def close(self):
+        self._file.close()
+
+class SimpleaudioSink(AudioSink):
+    '''Output through simpleaudio, which opens a new stream for every buffer.
+
+    Consecutive buffers would be separated by a gap, so this sink is fed by a BufferedPlayer with
+    the rest of the song at once.
+    '''
+
+    streaming = False
+
+    def __init__(self, sample_rate: int):
+        super().__init__(sample_rate)
+        import simpleaudio
+        self._simpleaudio = simpleaudio
+        self._play_obj = None
+
+    def start(self, samples: np.ndarray):
+        '''Starts playing the samples and returns immediately.'''
+        self.stop()
+        self._play_obj = self._simpleaudio.play_buffer(samples.tobytes(), 1, 2, self.sample_rate)
+
+    def stop(self):
+        if self._play_obj:
+            self._play_obj.stop()
+            self._play_obj = None
+
+    def write(self, samples: np.ndarray):
+        self.start(samples)
+        self._play_obj.wait_done()
+
+    def close(self):
+        self.stop()
+
+class SoundDeviceSink(AudioSink):
+    '''Gapless output through a sounddevice stream, the audio backend of the preview.'''
+
+    def __init__(self, sample_rate: int):
+        super().__init__(sample_rate)
+        import sounddevice
+        self._stream = sounddevice.RawOutputStream(samplerate=sample_rate, channels=1, dtype='int16')
+        self._stream.start()
+
+    def write(self, samples: np.ndarray):
+        self._stream.write(samples.tobytes())
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+def default_sink(sample_rate: int) -> AudioSink:
+    '''The sounddevice stream of requirements.txt, simpleaudio only if that cannot be opened.'''
+    try:
+        return SoundDeviceSink(sample_rate)
+    except Exception as e:
+        print(f"Warning: No sounddevice output ({type(e).__name__}: {e}), falling back to simpleaudio. "
+              f"The preview then renders the rest of the song into memory on every play, seek and loop change.")
+        return SimpleaudioSink(sample_rate)
+
+class RingBuffer:
+    '''Fixed size sample FIFO. Not thread safe, StreamingPlayer guards it with its lock.'''
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._read = 0
+        self.available = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.available
+
+    def write(self, samples: np.ndarray):
+        assert len(samples) <= self.free
+        position = (self._read + self.available) % self.capacity
+        first = min(len(samples), self.capacity - position)
+        self._data[position:position + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self.available += len(samples)
+
+    def read(self, count: int) -> np.ndarray:
+        count = min(count, self.available)
+        first = min(count, self.capacity - self._read)
+        samples = np.concatenate((self._data[self._read:self._read + first], self._data[:count - first]))
+        self._read = (self._read + count) % self.capacity
+        self.available -= count
+        return samples
+
+    def clear(self):
+        self._read = 0
+        self.available = 0
+
+class StreamingPlayer:
+    '''Plays a renderer through an audio sink, rendering fixed size chunks ahead into a ring buffer.
+
+    A render thread keeps the ring buffer filled and an output thread feeds the sink, so the memory
+    use only depends on the chunk and buffer sizes, not on the length of the song.
+
+    on_position(position, limit) is called whenever the position changes: after every chunk handed
+    to the sink, and on seeks and pauses. The playback can move on from position up to limit without
+    further calls, limit equals position when it stands still.
+    '''
+
+    CHUNK_SAMPLES = 4096
+    BUFFER_CHUNKS = 8
+
+    def __init__(self, renderer: SquareWaveRenderer, sink: AudioSink, end_sample: int | None = None,
+                 chunk_samples: int = CHUNK_SAMPLES, buffer_chunks: int = BUFFER_CHUNKS,
+                 on_finished: Callable[[], None] | None = None,
+                 on_position: Callable[[int, int], None] | None = None):
+        self.renderer = renderer
+        self.sink = sink
+        self.end_sample = renderer.sample_count if end_sample is None else end_sample
+        self.chunk_samples = chunk_samples
+        self.on_finished = on_finished
+        self.on_position = on_position
+        self.loop = False
+        self.loop_start = 0
+        self.loop_end = self.end_sample
+        self._buffer = RingBuffer(chunk_samples * buffer_chunks)
+        self._condition = threading.Condition()
+        self._render_position = 0
+        self._play_position = 0
+        # Sample positions of the buffered samples, so the play position stays right across loops.
+        self._buffered_positions: list[tuple[int, int]] = []
+        self.stats = OutputStats()
+        # Clock time at which the last write returned, None when the next chunk does not follow it.
+        self._last_write: float | None = None
+        self._generation = 0
+        self._playing = False
+        self._finished = False
+        self._closed = False
+        self._threads = [threading.Thread(target=self._render_loop, daemon=True),
+                         threading.Thread(target=self._output_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def is_playing(self) -> bool:
+        return self._playing
+
+    @property
+    def position(self) -> int:
+        '''Sample position of the next sample handed to the sink.'''
+        return self._play_position
+
+    @property
+    def position_us(self) -> int:
+        return self._play_position * 1000000 // self.renderer.sample_rate
+
+    def play(self):
+        with self._condition:
+            if self._finished:
+                self._seek(self.loop_start if self.loop else 0)
+            self._playing = True
+            self._condition.notify_all()
+
+    def pause(self):
+        with self._condition:
+            self._playing = False
+            self._last_write = None
+            self._report_position(self._play_position)
+            self._condition.notify_all()
+
+    def seek(self, sample: int):
+        with self._condition:
+            self._seek(sample)
+            self._condition.notify_all()
+
+    def seek_us(self, position_us: int):
+        self.seek(position_us * self.renderer.sample_rate // 1000000)
+
+    def set_loop(self, enabled: bool, start: int = 0, end: int | None = None):
+        with self._condition:
+            self.loop = enabled
+            self.loop_start = start
+            self.loop_end = self.end_sample if end is None else end
+            # Samples already rendered past the new loop end must not be played.
+            self._seek(self._play_position)
+            self._condition.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        '''Waits until the end of the song is played, returns False on timeout.'''
+        with self._condition:
+            return self._condition.wait_for(lambda: self._finished or self._closed, timeout)
+
+    def close(self, close_sink: bool = True):
+        with self._condition:
+            self._closed = True
+            self._playing = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        if close_sink:
+            self.sink.close()
+
+    def _seek(self, sample: int):
+        self._generation += 1
+        self._buffer.clear()
+        self._buffered_positions.clear()
+        self._last_write = None
+        self._render_position = max(0, min(sample, self.end_sample))
+        self._play_position = self._render_position
+        self._finished = False
+        self._report_position(self._play_position)
+
+    def _report_position(self, position: int, limit: int | None = None):
+        # Called with the lock held, so a report cannot overtake a later seek or pause.
+        if self.on_position:
+            self.on_position(position, position if limit is None else limit)
+
+    def _render_end(self) -> int:
+        return self.loop_end if self.loop and self._render_position < self.loop_end else self.end_sample
+
+    def _render_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or (
+                    self._buffer.free >= self.chunk_samples and self._render_position < self._render_end()))
+                if self._closed:
+                    return
+                generation = self._generation
+                start = self._render_position
+                count = min(self.chunk_samples, self._render_end() - start)
+            samples = self.renderer.render(start, count)
+            with self._condition:
+                if generation != self._generation:
+                    continue
+                self._buffer.write(samples)
+                self._buffered_positions.append((start, count))
+                self._render_position = start + count
+                if self.loop and self._render_position >= self.loop_end:
+                    self._render_position = self.loop_start
+                self._condition.notify_all()
+
+    def _output_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or (self._playing and (
+                    self._buffered_positions or self._render_position >= self._render_end())))
+                if self._closed:
+                    return
+                finished = not self._buffered_positions
+                if finished:
+                    # Everything up to the end of the song has been played.
+                    self._playing = False
+                    self._finished = True
+                else:
+                    generation = self._generation
+                    start, count = self._buffered_positions.pop(0)
+                    samples = self._buffer.read(count)
+                    if self._last_write is not None:
+                        self.stats.add(int((time.monotonic() - self._last_write) * 1000000))
+                self._condition.notify_all()
+            if finished:
+                if self.on_finished:
+                    self.on_finished()
+                continue
+            self.sink.write(samples)
+            with self._condition:
+                if generation == self._generation:
+                    self._play_position = start + count
+                    if self._playing:
+                        self._last_write = time.monotonic()
+                        # The next chunk does not continue past the loop end, it starts at the loop start.
+                        end = self.loop_end if self.loop and self._play_position <= self.loop_end else self.end_sample
+                        self._report_position(self._play_position, min(self._play_position + self.chunk_samples, end))
+
+class BufferedPlayer:
+    '''Plays a renderer through a non-streaming sink, with the interface of StreamingPlayer.
+
+    Each play, seek or loop change renders the rest of the song (up to the loop end) and starts it
+    as one buffer, so it plays without gaps. Unlike with StreamingPlayer, the memory grows with the
+    length of the song, about 5 MB per minute. The position follows the clock from the start of the buffer, on_position is
+    called like for StreamingPlayer whenever a buffer starts or the playback stops.
+    '''
+
+    def __init__(self, renderer: SquareWaveRenderer, sink: SimpleaudioSink, end_sample: int | None = None,
+                 on_finished: Callable[[], None] | None = None,
+                 on_position: Callable[[int, int], None] | None = None):
+        self.renderer = renderer
+        self.sink = sink
+        self.end_sample = renderer.sample_count if end_sample is None else end_sample
+        self.on_finished = on_finished
+        self.on_position = on_position
+        self.loop = False
+        self.loop_start = 0
+        self.loop_end = self.end_sample
+        # The whole buffer is handed over at once, so there are no gaps between chunks to count.
+        self.stats = OutputStats()
+        self._condition = threading.Condition()
+        # The position while not playing, the position at the start of the buffer while playing.
+        self._position = 0
+        self._buffer_end = 0
+        self._started = 0.0
+        self._generation = 0
+        self._playing = False
+        self._finished = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def is_playing(self) -> bool:
+        return self._playing
+
+    @property
+    def position(self) -> int:
+        with self._condition:
+            return self._current_position()
+
+    @property
+    def position_us(self) -> int:
+        return self.position * 1000000 // self.renderer.sample_rate
+
+    def play(self):
+        with self._condition:
+            if self._playing:
+                return
+            if self._finished:
+                self._position = self.loop_start if self.loop else 0
+                self._finished = False
+            self._start()
+
+    def pause(self):
+        with self._condition:
+            if self._playing:
+                self._position = self._current_position()
+                self._stop()
+                self._report_position(self._position)
+
+    def seek(self, sample: int):
+        with self._condition:
+            playing = self._playing
+            self._stop()
+            self._position = max(0, min(sample, self.end_sample))
+            self._finished = False
+            if playing:
+                self._start()
+            else:
+                self._report_position(self._position)
+
+    def seek_us(self, position_us: int):
+        self.seek(position_us * self.renderer.sample_rate // 1000000)
+
+    def set_loop(self, enabled: bool, start: int = 0, end: int | None = None):
+        with self._condition:
+            position = self._current_position()
+            playing = self._playing
+            self._stop()
+            self.loop = enabled
+            self.loop_start = start
+            self.loop_end = self.end_sample if end is None else end
+            self._position = position
+            if playing:
+                self._start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        '''Waits until the end of the song is played, returns False on timeout.'''
+        with self._condition:
+            return self._condition.wait_for(lambda: self._finished or self._closed, timeout)
+
+    def close(self, close_sink: bool = True):
+        with self._condition:
+            self._stop()
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        if close_sink:
+            self.sink.close()
+
+    def _report_position(self, position: int, limit: int | None = None):
+        if self.on_position:
+            self.on_position(position, position if limit is None else limit)
+
+    def _current_position(self) -> int:
+        if not self._playing:
+            return self._position
+        played = int((time.monotonic() - self._started) * self.renderer.sample_rate)
+        return min(self._position + played, self._buffer_end)
+
+    def _start(self):
+        self._buffer_end = self.loop_end if self.loop and self._position < self.loop_end else self.end_sample
+        self.sink.start(self.renderer.render(self._position, max(self._buffer_end - self._position, 0)))
+        self._started = time.monotonic()
+        self._playing = True
+        self._generation += 1
+        self._report_position(self._position, self._buffer_end)
+        self._condition.notify_all()
+
+    def _stop(self):
+        if self._playing:
+            self.sink.stop()
+            self._playing = False
+            self._generation += 1
+            self._condition.notify_all()
+
+    def _watch_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or self._playing)
+                if self._closed:
+                    return
+                generation = self._generation
+                remaining = (self._buffer_end - self._position) / self.renderer.sample_rate \
+                    - (time.monotonic() - self._started)
+                if self._condition.wait_for(lambda: self._closed or self._generation != generation,
+                                            max(remaining, 0)):
+                    continue
+                # The buffer has been played.
+                self._playing = False
+                if self.loop and self._buffer_end == self.loop_end:
+                    self._position = self.loop_start
+                    self._start()
+                    continue
+                self._position = self._buffer_end
+                self._finished = True
+                self._report_position(self._position)
+                self._condition.notify_all()
+            if self.on_finished:
+                self.on_finished()
+
 class Player:
-    @dataclass
-    class _Event:
-        tick: int
+    '''Long-lived playback worker process.
 
-    @dataclass
-    class _NoteOnEvent(_Event):
-        note: Note
+    Songs are loaded through shared memory, the worker keeps its audio sink between songs. All
+    commands go over one queue, replies (loaded blocks, output stats) come back over another.
+    The worker is idle between commands, the stream times the audio and reports the end of the song.
+    The playback position is published through shared memory, so it can be polled every frame.
+    '''
 
-    @dataclass
-    class _NoteOffEvent(_Event):
-        note: Note
+    # Notes as handed to the player process, sorted by start time.
+    EVENT_DTYPE = np.dtype([('start_us', '<i8'), ('end_us', '<i8'), ('pitch', 'u1'), ('buzzer', 'u1')])
 
-    def __init__(self, song: Song):
-        self.song = []
+    def __init__(self, sink_factory: Callable[[int], AudioSink] = default_sink):
         self.is_playing = False
-        self.current_tick = 0
-        for track in song.tracks:
-            for note in track.notes:
-                self.song.append(self._NoteOnEvent(tick=note.start_us, note=note))
-        self.duration = song.duration_us
+        self.sink_factory = sink_factory
         self.queue = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        # The playback the worker is at, the last position reported by the stream in microseconds or
+        # -1 when stopped, the monotonic clock time of the report, and the position up to which the
+        # playback can move on from there.
+        self._playhead = multiprocessing.Array('q', [0, -1, 0, -1])
+        self.stats: OutputStats | None = None
+        # Numbers the playbacks, so stats of an earlier playback are not taken for the current one.
+        self._playback = 0
+        self._process: multiprocessing.Process | None = None
+        # Blocks the worker has not confirmed yet, they are unlinked once it has copied them.
+        self._shared_memory: dict[str, shared_memory.SharedMemory] = {}
 
     def start(self):
-        self._start_player_process()
+        if self._process and self._process.is_alive():
+            return
+        # A forked worker must share the resource tracker of this process, otherwise its own tracker
+        # would unlink the shared memory blocks again when it exits.
+        resource_tracker.ensure_running()
+        self._process = multiprocessing.Process(target=Player._worker_process,
+                                                args=(self.sink_factory, self.queue, self.replies, self._playhead),
+                                                daemon=True)
+        self._process.start()
+
+    def load(self, song: Song):
+        self.start()
+        self._handle_replies()
+        columns = [track.columns for track in song.tracks]
+        count = sum(len(c) for c in columns)
+        memory = shared_memory.SharedMemory(create=True, size=max(count * self.EVENT_DTYPE.itemsize, 1))
+        events = np.ndarray(count, dtype=self.EVENT_DTYPE, buffer=memory.buf)
+        if count:
+            start_us = np.concatenate([c.start_us for c in columns])
+            order = np.argsort(start_us, kind='stable')
+            events['start_us'] = start_us[order]
+            events['end_us'] = np.concatenate([c.end_us for c in columns])[order]
+            events['pitch'] = np.concatenate([c.pitch for c in columns])[order]
+            events['buzzer'] = np.concatenate([c.buzzer for c in columns])[order]
+        del events
+        self._shared_memory[memory.name] = memory
+        self.queue.put(('load', memory.name, count, song.duration_us))
+
+    def play(self):
+        self._playback += 1
+        self.stats = None
+        self.queue.put(('play', self._playback))
         self.is_playing = True
 
     def stop(self):
-        self.queue.put('stop')
+        if self._process:
+            self.queue.put('stop')
+        self.is_playing = False
+
+    def seek(self, position_us: int):
+        self.queue.put(('seek', position_us))
+
+    def pause(self):
+        self.queue.put('pause')
+        self.is_playing = False
+
+    def resume(self):
+        self.queue.put('resume')
+        self.is_playing = True
+
+    def set_loop(self, enabled: bool):
+        self.queue.put(('loop', enabled))
+
+    def position_us(self) -> int | None:
+        '''Current position of the playback in microseconds, None if nothing is playing or paused.
+
+        The position follows the samples the stream has handed to the sink. Between two reports of the
+        worker it moves on with the clock, but not past the audio already handed over.
+        '''
+        with self._playhead.get_lock():
+            playback, position, reported, limit = self._playhead
+        if playback != self._playback:
+            # The worker has not started the current playback yet.
+            return 0 if self.is_playing else None
+        if position < 0:
+            return None
+        return min(position + max(Player._now_us() - reported, 0), limit)
+
+    def output_stats(self, timeout: float | None = None) -> OutputStats | None:
+        '''Output gaps of the last playback, sent by the worker when a playback finishes or is stopped.'''
+        if self.stats is None:
+            self._handle_replies(timeout, until_stats=True)
+        return self.stats
+
+    def shutdown(self):
+        '''Stops the worker process and releases all shared memory.'''
+        if self._process:
+            self.queue.put('shutdown')
+            self._process.join()
+            self._process = None
+        self._handle_replies()
+        for memory in self._shared_memory.values():
+            memory.close()
+            memory.unlink()
+        self._shared_memory.clear()
         self.is_playing = False
 
-    def _start_player_process(self):
-        proc = multiprocessing.Process(target=self._player_process, args=(self.song, self.duration, self.queue))
-        proc.start()
-        return proc
-
-    def _player_process(self, song_data, duration, queue):
-        song = SortedList(song_data, key=lambda e: e.tick)
-        is_playing = True
-        start = time.time_ns() // 1000  # microseconds
-        current_tick = 0
-        while is_playing and current_tick < duration:
-            current_tick = time.time_ns() // 1000 - start
-            while not queue.empty():
-                cmd = queue.get()
-                if cmd == 'stop':
-                    is_playing = False
-            while song and song[0].tick <= current_tick:
-                evt = song.pop(0)
-                if isinstance(evt, self._NoteOnEvent):
-                    self.play_note(evt.note)
-                elif isinstance(evt, self._NoteOffEvent):
-                    # Stop note
-                    pass
-
-    def play_note(self, note: Note):
-        duration_us = note.duration_us
-        frequency = note.frequency
-        volume = note.velocity / 127
-        sample_rate = 44100
-
-        t = np.linspace(0, duration_us / 1000000, int(sample_rate * duration_us / 1000000), endpoint=False)
-        wave = np.sign(np.sin(2 * np.pi * frequency * t)) * volume
-        audio = np.int16(wave * 32767)
-        sa.play_buffer(audio.tobytes(), 1, 2, sample_rate)
+    def _handle_replies(self, timeout: float | None = 0, until_stats: bool = False):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is None:
+                    reply = self.replies.get()
+                else:
+                    reply = self.replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue_module.Empty:
+                return
+            if reply[0] == 'loaded':
+                memory = self._shared_memory.pop(reply[1], None)
+                if memory:
+                    memory.close()
+                    memory.unlink()
+            elif reply[0] == 'stats' and reply[1] == self._playback:
+                self.stats = reply[2]
+                self.is_playing = False
+                if until_stats:
+                    return
+
+    @staticmethod
+    def _now_us() -> int:
+        return time.monotonic_ns() // 1000
+
+    @staticmethod
+    def _publish_playhead(playhead, playback: int, position: int, limit: int | None = None):
+        with playhead.get_lock():
+            playhead[0] = playback
+            playhead[1] = position
+            playhead[2] = Player._now_us()
+            playhead[3] = position if limit is None else limit
+
+    @staticmethod
+    def _worker_process(sink_factory: Callable[[int], AudioSink], queue, replies, playhead):
+        sink: AudioSink | None = None
+        stream: StreamingPlayer | BufferedPlayer | None = None
+        playback = 0
+        loop = False
+        playing = False
+        while True:
+            cmd = queue.get()
+
+            name = cmd[0] if isinstance(cmd, tuple) else cmd
+            if name == 'shutdown':
+                break
+            elif name == 'load':
+                _, memory_name, count, duration = cmd
+                memory = shared_memory.SharedMemory(name=memory_name)
+                events = np.ndarray(count, dtype=Player.EVENT_DTYPE, buffer=memory.buf).copy()
+                memory.close()
+                replies.put(('loaded', memory_name))
+                renderer = SquareWaveRenderer.from_arrays(events['start_us'], events['end_us'], events['pitch'],
+                                                          events['buzzer'])
+                if sink is None:
+                    sink = sink_factory(renderer.sample_rate)
+                if stream:
+                    stream.close(close_sink=False)
+                end_sample = duration * renderer.sample_rate // 1000000
+                on_finished = lambda: queue.put('finished')
+                def on_position(position: int, limit: int, sample_rate=renderer.sample_rate):
+                    Player._publish_playhead(playhead, playback, position * 1000000 // sample_rate,
+                                             limit * 1000000 // sample_rate)
+                player_class = StreamingPlayer if sink.streaming else BufferedPlayer
+                stream = player_class(renderer, sink, end_sample=end_sample, on_finished=on_finished,
+                                      on_position=on_position)
+                stream.set_loop(loop)
+                playing = False
+                Player._publish_playhead(playhead, playback, -1)
+            elif stream is None:
+                continue
+            elif name == 'play' and not playing:
+                playback = cmd[1]
+                stream.stats = OutputStats()
+                stream.play()
+                playing = True
+            elif name == 'stop' or (name == 'finished' and playing and not stream.is_playing):
+                if playing:
+                    replies.put(('stats', playback, stream.stats))
+                stream.pause()
+                stream.seek(0)
+                playing = False
+                Player._publish_playhead(playhead, playback, -1)
+            elif name == 'pause' and playing:
+                stream.pause()
+                playing = False
+            elif name == 'resume' and not playing:
+                stream.play()
+                playing = True
+            elif name == 'seek':
+                stream.seek_us(cmd[1])
+            elif name == 'loop':
+                loop = cmd[1]
+                stream.set_loop(loop)
+        if stream:
+            stream.close(close_sink=False)
+        if sink:
+            sink.close()
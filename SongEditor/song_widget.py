@@ -1,8 +1,8 @@
 from enum import Enum
-from typing import Iterable
+from typing import Callable, Iterable
 
-from PySide6.QtCore import Qt, QEvent, QPointF, QTimer, QRectF, Signal, QLineF
-from PySide6.QtGui import QKeyEvent, QPainter, QPen, QColor, QFont
+from PySide6.QtCore import Qt, QEvent, QPointF, QTimer, QRect, QRectF, Signal, QLineF
+from PySide6.QtGui import QKeyEvent, QPainter, QPen, QColor, QFont, QPixmap
 from PySide6.QtWidgets import QWidget, QSizePolicy
 
 from config import Config
@@ -45,6 +45,11 @@ class SongWidget(QWidget):
         self._notes = []  # Each note: (start_tick, duration, pitch)
         self._timer = QTimer(self)
         self._timer.timeout.connect(self.advance_playhead)
+        self._playhead_source: Callable[[], int | None] | None = None
+        self._playhead_us: int | None = None
+        self._playhead_drawn_x: int | None = None
+        # The canvas without the playhead, strips of it are restored while only the playhead moves.
+        self._canvas_cache: QPixmap | None = None
 
         self._zoom_x = 1.0
         self._zoom_y = 1.0
@@ -84,8 +89,37 @@ class SongWidget(QWidget):
     def song(self) -> Song:
         return self._song
 
+    def set_playhead_source(self, source: Callable[[], int | None] | None):
+        '''source returns the playback position in microseconds, or None once the playback has ended.
+
+        The playhead is polled from source until it returns None, set the source again for the next
+        playback.
+        '''
+        self._playhead_source = source
+        if source:
+            self._timer.start(Config.PLAYHEAD_INTERVAL_MS)
+        self.advance_playhead()
+
     def advance_playhead(self):
-        self.update()
+        self._playhead_us = self._playhead_source() if self._playhead_source else None
+        if self._playhead_us is None:
+            self._timer.stop()
+        x = self._playhead_x()
+        if x == self._playhead_drawn_x:
+            return
+        if self._playhead_drawn_x is not None:
+            self.update(self._playhead_rect(self._playhead_drawn_x))
+        if x is not None:
+            self.update(self._playhead_rect(x))
+
+    def _playhead_x(self) -> int | None:
+        if self._playhead_us is None:
+            return None
+        return round(self._shift.x() + self.time_to_x(self._playhead_us))
+
+    def _playhead_rect(self, x: int) -> QRect:
+        margin = Config.PLAYHEAD_WIDTH // 2 + 1
+        return QRect(x - margin, 0, 2 * margin + 1, self.height())
 
     def mousePressEvent(self, event):
         if event.button() == Config.SELECT_MOUSE_BUTTON:
@@ -113,17 +147,19 @@ class SongWidget(QWidget):
         if event.button() == Config.SELECT_MOUSE_BUTTON:
             last_selected = set(self._selected_notes)
             selection_frame_distance = QLineF(self._selection_frame_start, event.position()).length() if self._selection_frame_start else 0
-            if selection_frame_distance > 2 and self.selection_frame_notes:
+            frame_notes = self._notes_in_frame(QRectF(self._selection_frame_start, event.position()).normalized()) \
+                if selection_frame_distance > 2 else []
+            if frame_notes:
                 if event.modifiers() & Config.SELECT_NOTE_ADD_MODIFIER or event.modifiers() & Config.SELECT_NOTE_SPAN_MODIFIER:
-                    for note in self.selection_frame_notes:
+                    for note in frame_notes:
                         if note not in self._selected_notes:
                             self._selected_notes.append(note)
                 elif event.modifiers() & Config.SELECT_NOTE_REMOVE_MODIFIER:
-                    for note in self.selection_frame_notes:
+                    for note in frame_notes:
                         if note in self._selected_notes:
                             self._selected_notes.remove(note)
                 else:
-                    self._selected_notes = self.selection_frame_notes.copy()
+                    self._selected_notes = frame_notes
             elif self._pressed_note == self._hover_note:
                 if event.modifiers() & Config.SELECT_NOTE_ADD_MODIFIER:
                     if self._hover_note and self._hover_note not in self._selected_notes:
@@ -183,6 +219,30 @@ class SongWidget(QWidget):
         return super().keyReleaseEvent(event)
 
     def paintEvent(self, event):
+        dpr = self.devicePixelRatioF()
+        cache_size = self.size() * dpr
+        # Only the playhead repaints parts of the widget, everything else updates the whole canvas.
+        repaint_canvas = event.rect().contains(self.rect())
+        if (self._canvas_cache is None or self._canvas_cache.size() != cache_size or
+                self._canvas_cache.devicePixelRatio() != dpr):
+            self._canvas_cache = QPixmap(cache_size)
+            self._canvas_cache.setDevicePixelRatio(dpr)
+            repaint_canvas = True
+        if repaint_canvas:
+            canvas_painter = QPainter(self._canvas_cache)
+            self._paint_canvas(canvas_painter)
+            canvas_painter.end()
+
+        p = QPainter(self)
+        rect = QRectF(event.rect())
+        p.drawPixmap(rect, self._canvas_cache, QRectF(rect.topLeft() * dpr, rect.size() * dpr))
+        x = self._playhead_x()
+        if x is not None:
+            p.setPen(QPen(Config.PLAYHEAD_COLOR, Config.PLAYHEAD_WIDTH))
+            p.drawLine(QPointF(x, 0), QPointF(x, self.height()))
+        self._playhead_drawn_x = x
+
+    def _paint_canvas(self, p: QPainter):
         self._shift = QPointF(min(self._shift.x(), self._min_shift_x), min(self._shift.y(), 0))
 
         last_hover_track = self._hover_track
@@ -198,9 +258,6 @@ class SongWidget(QWidget):
         else:
             self._selection_frame = None
 
-        self.selection_frame_notes = []
-
-        p = QPainter(self)
         p.fillRect(self.rect(), Config.BACKGROUND_COLOR)
         p.save()
         y = self._pitch_height * 2 * self._zoom_y
@@ -226,9 +283,37 @@ class SongWidget(QWidget):
     def time_to_x(self, tick: int) -> float:
         return float(tick) / 1000000. * self._second_width * self._zoom_x
 
+    def x_to_time(self, x: float) -> int:
+        return int(x * 1000000. / (self._second_width * self._zoom_x))
+
+    def _track_height(self, track: Track) -> float:
+        return (track.max_pitch - track.min_pitch) * self._pitch_height * self._zoom_y + self._pitch_height * self._zoom_y
+
+    def _note_rect(self, track: Track, note: Note, y_offset: float) -> QRectF:
+        y = y_offset + (track.pitch_range - note.pitch + track.min_pitch) * (self._pitch_height * self._zoom_y)
+        return QRectF(self.time_to_x(note.start_us), y, self.time_to_x(note.duration_us), self._pitch_height * self._zoom_y)
+
+    def _notes_in_frame(self, frame: QRectF) -> list[Note]:
+        '''Notes touched by a selection frame in widget coordinates, including those outside of the view.'''
+        frame = frame.translated(-self._shift)
+        pitch_height = self._pitch_height * self._zoom_y
+        notes = []
+        y_offset = self._pitch_height * 2 * self._zoom_y
+        for track in self._song.tracks:
+            height = self._track_height(track)
+            if frame.bottom() >= y_offset and frame.top() <= y_offset + height:
+                for note in track.notes_in_range(
+                        self.x_to_time(frame.left()), self.x_to_time(frame.right()) + 1,
+                        track.max_pitch - int((frame.bottom() - y_offset) // pitch_height) - 1,
+                        track.max_pitch - int((frame.top() - y_offset) // pitch_height) + 1):
+                    if frame.intersects(self._note_rect(track, note, y_offset)):
+                        notes.append(note)
+            y_offset += height + self._pitch_height * 4 * self._zoom_y
+        return notes
+
     def _draw_track(self, p: QPainter, track_index: int, y_offset: float) -> float:
         track = self._song.tracks[track_index]
-        height = (track.max_pitch - track.min_pitch) * self._pitch_height * self._zoom_y + self._pitch_height * self._zoom_y
+        height = self._track_height(track)
         track_rect = QRectF(0, y_offset, self.time_to_x(track.duration_us), height)
         hovered = self._mouse_position is not None and track_rect.contains(self._mouse_position - self._shift)
 
@@ -259,19 +344,27 @@ class SongWidget(QWidget):
                 y = y_offset + (track.pitch_range - pitch + track.min_pitch) * (self._pitch_height * self._zoom_y)
                 p.drawLine(QPointF(0, y), QPointF(self.time_to_x(track.duration_us), y))
 
-        for note in track.notes:
-            x = self.time_to_x(note.start_us)
-            y = y_offset + (track.pitch_range - note.pitch + track.min_pitch) * (self._pitch_height * self._zoom_y)
-            w = self.time_to_x(note.duration_us)
-            h = self._pitch_height * self._zoom_y
-            if w > 0 and h > 0:
-                note_rect = QRectF(x, y, w, h)
+        visible_x = -self._shift.x()
+        visible_y = -self._shift.y()
+        pitch_height = self._pitch_height * self._zoom_y
+        if track_rect.bottom() >= visible_y and track_rect.top() <= visible_y + self.height():
+            visible_notes = track.notes_in_range(
+                self.x_to_time(visible_x), self.x_to_time(visible_x + self.width()) + 1,
+                track.max_pitch - int((visible_y + self.height() - y_offset) // pitch_height) - 1,
+                track.max_pitch - int((visible_y - y_offset) // pitch_height) + 1)
+            track_error_notes = track.error_notes
+        else:
+            visible_notes = iter(())
+            track_error_notes = set()
+        for note in visible_notes:
+            note_rect = self._note_rect(track, note, y_offset)
+            if note_rect.width() > 0 and note_rect.height() > 0:
                 shifted_selection_frame = self._selection_frame.translated(-self._shift) if self._selection_frame else None
                 note_hovered = hovered and self._mouse_position and note_rect.contains(self._mouse_position - self._shift)
-                if note in self.song.error_notes:
+                if note in track_error_notes:
                     fill_color = Config.NOTE_ERROR_FILL_COLOR
                 elif note.buzzer in (Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3):
-                    fill_color = Config.NOTE_BUZZER_FILL_COLORS[note.buzzer.value - 1]
+                    fill_color = Config.NOTE_BUZZER_FILL_COLORS[note.buzzer_index - 1]
                 elif note in self._error_notes:
                     fill_color = Config.NOTE_ERROR_FILL_COLOR
                 else:
@@ -280,7 +373,6 @@ class SongWidget(QWidget):
                 if shifted_selection_frame and shifted_selection_frame.intersects(note_rect):
                     frame_color = Config.SELECTION_FRAME_NOTE_BORDER_COLOR
                     frame_width = 2
-                    self.selection_frame_notes.append(note)
                 elif note_hovered or self._highlighted_note == note:
                     if note in self._selected_notes:
                         frame_color = Config.NOTE_HOVER_SELECTED_BORDER_COLOR
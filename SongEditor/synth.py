@@ -0,0 +1,156 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from song import Note, PLAYABLE_BUZZERS, Song
+
+class WaveformCache:
+    '''LRU cache of note waveforms (+1/-1 as int8), one tile per frequency.
+
+    Every note starts at the beginning of a period, so its waveform only depends on the frequency and
+    repeats every sample_rate / gcd(frequency, sample_rate) samples. A tile holds whole periods and
+    at least TILE_SAMPLES more, so the samples of a note are usually a view into the tile.
+    '''
+
+    TILE_SAMPLES = 1 << 16
+
+    def __init__(self, sample_rate: int, memory_limit: int = 16 * 1024 * 1024):
+        self.sample_rate = sample_rate
+        self.memory_limit = memory_limit
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles: OrderedDict[int, tuple[np.ndarray, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, frequency: int, offset: int, length: int) -> np.ndarray:
+        '''Samples [offset, offset + length) of a note, counted from the start of the note.'''
+        entry = self._tiles.get(frequency)
+        if entry is not None:
+            self._tiles.move_to_end(frequency)
+            self.hits += 1
+        else:
+            self.misses += 1
+            period = self.sample_rate // np.gcd(frequency, self.sample_rate)
+            size = period * (-(-self.TILE_SAMPLES // period) + 1)
+            phases = np.arange(size, dtype=np.int64) * frequency % self.sample_rate
+            entry = (np.where(2 * phases < self.sample_rate, 1, -1).astype(np.int8), period)
+            if entry[0].nbytes <= self.memory_limit:
+                self._tiles[frequency] = entry
+                self.memory += entry[0].nbytes
+                while self.memory > self.memory_limit:
+                    _, (evicted, _) = self._tiles.popitem(last=False)
+                    self.memory -= evicted.nbytes
+                    self.evictions += 1
+        tile, period = entry
+        start = offset % period
+        if start + length <= len(tile):
+            return tile[start:start + length]
+        return tile[np.arange(start, start + length, dtype=np.int64) % period]
+
+    def clear(self):
+        self._tiles.clear()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+@dataclass
+class BuzzerLane:
+    '''The notes of one buzzer as sample ranges, in the order the firmware plays them.'''
+    starts: np.ndarray
+    ends: np.ndarray
+    frequencies: np.ndarray
+
+    @staticmethod
+    def from_notes(notes: list[Note], sample_rate: int) -> BuzzerLane:
+        count = len(notes)
+        return BuzzerLane.from_arrays(np.fromiter((n.start_us for n in notes), np.int64, count),
+                                      np.fromiter((n.start_us + n.duration_us for n in notes), np.int64, count),
+                                      np.fromiter((n.pitch for n in notes), np.int64, count), sample_rate)
+
+    @staticmethod
+    def from_arrays(start_us: np.ndarray, end_us: np.ndarray, pitches: np.ndarray, sample_rate: int) -> BuzzerLane:
+        '''Notes sorted by start time.'''
+        count = len(start_us)
+        start_us = np.asarray(start_us, dtype=np.int64)
+        end_us = np.asarray(end_us, dtype=np.int64)
+        pitches = np.asarray(pitches, dtype=np.float64)
+        starts = (start_us * sample_rate + 500000) // 1000000
+        ends = (end_us * sample_rate + 500000) // 1000000
+        # A buzzer plays one note at a time, a note only starts when the previous one has ended.
+        if count:
+            previous_ends = np.maximum.accumulate(np.maximum(ends, starts))
+            starts[1:] = np.maximum(starts[1:], previous_ends[:-1])
+            ends = np.maximum(ends, starts)
+        # The firmware rounds the frequency to whole Hertz.
+        frequencies = np.round(440.0 * 2.0 ** ((pitches - 69) / 12.0)).astype(np.int64)
+        return BuzzerLane(starts=starts, ends=ends, frequencies=frequencies)
+
+    def render(self, start: int, count: int, cache: WaveformCache) -> np.ndarray:
+        '''Square wave of +1/-1 while a note sounds and 0 in between, for samples [start, start + count).'''
+        wave = np.zeros(count, dtype=np.int8)
+        first = np.searchsorted(self.ends, start, side='right')
+        last = np.searchsorted(self.starts, start + count, side='left')
+        end = start + count
+        for note_start, note_end, frequency in zip(self.starts[first:last].tolist(), self.ends[first:last].tolist(),
+                                                   self.frequencies[first:last].tolist()):
+            if note_end <= note_start:
+                continue
+            a = max(note_start, start)
+            b = min(note_end, end)
+            wave[a - start:b - start] = cache.get(frequency, a - note_start, b - a)
+        return wave
+
+class SquareWaveRenderer:
+    '''Renders the buzzer tracks of a song to 16 bit mono PCM.'''
+
+    SAMPLE_RATE = 44100
+
+    def __init__(self, lanes: list[BuzzerLane], sample_rate: int = SAMPLE_RATE, volume: float = 0.25,
+                 cache: WaveformCache | None = None):
+        self.sample_rate = sample_rate
+        self.volume = volume
+        self.cache = cache or WaveformCache(sample_rate)
+        self.lanes = lanes
+        self.sample_count = max((int(lane.ends[-1]) for lane in self.lanes if len(lane.ends)), default=0)
+
+    @staticmethod
+    def from_song(song: Song, sample_rate: int = SAMPLE_RATE, **kwargs) -> SquareWaveRenderer:
+        lanes = [BuzzerLane.from_notes(notes, sample_rate) for notes in song.to_buzzer_tracks().values()]
+        return SquareWaveRenderer(lanes, sample_rate, **kwargs)
+
+    @staticmethod
+    def from_arrays(start_us: np.ndarray, end_us: np.ndarray, pitch: np.ndarray, buzzer: np.ndarray,
+                    sample_rate: int = SAMPLE_RATE, **kwargs) -> SquareWaveRenderer:
+        '''Renderer for notes given as columns, in any order, with the buzzer as Buzzer value.'''
+        lanes = []
+        for buzzer_value in (b.value for b in PLAYABLE_BUZZERS):
+            selected = np.flatnonzero(buzzer == buzzer_value)
+            # The order of Song.all_notes: start, duration, pitch.
+            order = selected[np.lexsort((pitch[selected], end_us[selected] - start_us[selected], start_us[selected]))]
+            lanes.append(BuzzerLane.from_arrays(start_us[order], end_us[order], pitch[order], sample_rate))
+        return SquareWaveRenderer(lanes, sample_rate, **kwargs)
+
+    # Long renders are mixed in blocks to bound the memory of the intermediate float arrays.
+    BLOCK_SAMPLES = 1 << 20
+
+    def render(self, start: int = 0, count: int | None = None) -> np.ndarray:
+        if count is None:
+            count = max(self.sample_count - start, 0)
+        audio = np.empty(count, dtype=np.int16)
+        for offset in range(0, count, self.BLOCK_SAMPLES):
+            block = min(self.BLOCK_SAMPLES, count - offset)
+            mix = np.zeros(block)
+            for lane in self.lanes:
+                mix += lane.render(start + offset, block, self.cache)
+            audio[offset:offset + block] = np.clip(mix * self.volume, -1.0, 1.0) * 32767
+        return audio
+
+    def duration_us(self) -> int:
+        return self.sample_count * 1000000 // self.sample_rate
@@ -0,0 +1,40 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The editor modules import each other as top level modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from song import Buzzer, Note, Song, Track
+
+def make_song(*tracks: list[tuple], seed: int | None = None, track_count: int = 2, count: int = 100,
+              start_us: int = 100000, duration_us: tuple[int, int] = (0, 3000), pitch: tuple[int, int] = (30, 90),
+              velocity: tuple[int, int] = (100, 101), buzzers: tuple[Buzzer, ...] = tuple(Buzzer),
+              names: list[str] | None = None, name: str = "Test Song") -> Song:
+    '''Builds a song with one track per list of (start_us, duration_us, pitch[, buzzer[, velocity]]).
+
+    Notes get Buzzer.NONE and velocity 100 unless given. With a seed, track_count tracks of count
+    random notes are made instead: starts below start_us, the other fields drawn from the half open
+    ranges and from buzzers.
+    '''
+    if seed is not None:
+        rng = random.Random(seed)
+        tracks = tuple([(rng.randrange(start_us), rng.randrange(*duration_us), rng.randrange(*pitch),
+                         rng.choice(buzzers), rng.randrange(*velocity)) for _ in range(count)]
+                       for _ in range(track_count))
+    song = Song(name=name, tracks=[])
+    for i, notes in enumerate(tracks):
+        track = Track(names[i] if names else f"Track {i}", [], song)
+        track.notes = [Note(start_us=n[0], duration_us=n[1], pitch=n[2], velocity=n[4] if len(n) > 4 else 100,
+                            buzzer=n[3] if len(n) > 3 else Buzzer.NONE, track=track) for n in notes]
+        song.tracks.append(track)
+    return song
+
+@pytest.fixture(scope='session')
+def application():
+    '''The Qt application of the test session, widgets are drawn off screen.'''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,59 @@
+import random
+
+from conftest import make_song
+from song import Buzzer, Song
+
+def random_song(seed: int) -> Song:
+    return make_song(seed=seed, start_us=50000, duration_us=(1, 5000), velocity=(1, 128))
+
+def check_aggregates(song: Song):
+    for track in song.tracks:
+        notes = track.notes
+        assert track.notes_count == len(notes)
+        assert track.duration_us == max(n.end_us for n in notes)
+        assert (track.min_pitch, track.max_pitch) == (min(n.pitch for n in notes), max(n.pitch for n in notes))
+        assert (track.min_velocity, track.max_velocity) == (min(n.velocity for n in notes),
+                                                            max(n.velocity for n in notes))
+        assert track.buzzers_usage == {b: sum(1 for n in notes if n.buzzer == b) for b in Buzzer}
+    notes = [n for track in song.tracks for n in track.notes]
+    assert song.notes_count == len(notes)
+    assert song.duration_us == max(n.end_us for n in notes)
+    assert song.pitch_range == (min(n.pitch for n in notes), max(n.pitch for n in notes))
+    assert song.velocity_range == (min(n.velocity for n in notes), max(n.velocity for n in notes))
+    assert song.buzzer_usage == {b: sum(1 for n in notes if n.buzzer == b) for b in Buzzer}
+
+def test_aggregates_follow_single_edits():
+    rng = random.Random(3)
+    song = random_song(3)
+    check_aggregates(song)
+    for _ in range(300):
+        note = rng.choice(rng.choice(song.tracks).notes)
+        field = rng.choice(('start_us', 'duration_us', 'pitch', 'velocity', 'buzzer'))
+        if field == 'buzzer':
+            note.buzzer = rng.choice(tuple(Buzzer))
+        elif field in ('pitch', 'velocity'):
+            setattr(note, field, rng.randrange(1, 128))
+        else:
+            setattr(note, field, rng.randrange(1, 60000))
+        check_aggregates(song)
+
+def test_aggregates_follow_removals():
+    rng = random.Random(4)
+    song = random_song(4)
+    check_aggregates(song)
+    for track in song.tracks:
+        # The extremes are removed first, so the next ones have to be found.
+        by_pitch = sorted(track.notes, key=lambda n: n.pitch)
+        track.remove_notes([by_pitch[0], by_pitch[-1]])
+        check_aggregates(song)
+        track.remove_notes(rng.sample(track.notes, 20))
+        check_aggregates(song)
+
+def test_listeners_are_told_about_changes():
+    song = random_song(5)
+    calls = []
+    song.add_change_listener(lambda: calls.append('song'))
+    song.tracks[0].add_change_listener(lambda: calls.append('track'))
+    song.tracks[0].notes[0].pitch = 100
+    assert sorted(calls) == ['song', 'track']
+    assert song.pitch_range[1] == 100
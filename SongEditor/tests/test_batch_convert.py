@@ -0,0 +1,59 @@
+import os
+
+import mido
+import pytest
+
+from batch_convert import BatchConverter, ConversionOptions
+from midi_loader import MidiLoader
+from song_file import SongFile
+
+def write_midi(fname: str, pitches: list[int]):
+    midi = mido.MidiFile(ticks_per_beat=480)
+    track = mido.MidiTrack()
+    for pitch in pitches:
+        track.append(mido.Message('note_on', note=pitch, velocity=100, time=0))
+        track.append(mido.Message('note_off', note=pitch, velocity=0, time=240))
+    midi.tracks.append(track)
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    midi.save(fname)
+
+@pytest.fixture
+def sources(tmp_path) -> list[str]:
+    files = [str(tmp_path / "in" / name) for name in ("b.mid", "a.mid", "sub/c.midi")]
+    for i, fname in enumerate(files):
+        write_midi(fname, list(range(60, 64 + i)))
+    with open(tmp_path / "in" / "notes.txt", 'w') as f:
+        f.write("not a MIDI file")
+    return files
+
+def test_finds_midi_files_in_sorted_order(tmp_path, sources):
+    assert BatchConverter.find_midi_files([str(tmp_path / "in")]) == sorted(sources)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_converts_every_file_in_input_order(tmp_path, sources, workers):
+    options = ConversionOptions(output_dir=str(tmp_path / "out"), write_header=True, assign_buzzers=True)
+    progress = []
+    results = BatchConverter.convert_files(sources, options, workers=workers,
+                                           progress_callback=lambda done, total, result: progress.append(done))
+    assert [result.source for result in results] == sources
+    assert [result.error for result in results] == [None, None, None]
+    assert [result.notes_count for result in results] == [4, 5, 6]
+    assert progress == [1, 2, 3]
+    for source, result in zip(sources, results):
+        song = SongFile.load(result.outputs[0])
+        expected = MidiLoader.load_midi_file(source)
+        expected.auto_assign_buzzers()
+        assert song.to_dict() == expected.to_dict()
+        assert os.path.exists(result.outputs[1])
+
+def test_output_name_clashes_and_errors_are_reported(tmp_path, sources):
+    clash = str(tmp_path / "other" / "a.mid")
+    write_midi(clash, [70])
+    broken = str(tmp_path / "broken.mid")
+    with open(broken, 'wb') as f:
+        f.write(b'MThd')
+    options = ConversionOptions(output_dir=str(tmp_path / "out"))
+    results = BatchConverter.convert_files(sources + [clash, broken], options, workers=1)
+    assert results[3].error == f"Output name clashes with {sources[1]}"
+    assert results[4].error
+    assert all(result.error is None for result in results[:3])
@@ -0,0 +1,117 @@
+import os
+import sys
+import wave
+
+import mido
+import numpy as np
+import pytest
+
+from batch_jobs import BatchJobs
+import batch_render
+from batch_render import BatchRenderer, RenderOptions
+from conftest import make_song
+from midi_loader import MidiLoader
+from song import Buzzer, Song
+from song_file import SongFile
+
+SAMPLE_RATE = 8000
+
+def write_midi(fname: str, pitches: list[int]):
+    midi = mido.MidiFile(ticks_per_beat=480)
+    track = mido.MidiTrack()
+    for pitch in pitches:
+        track.append(mido.Message('note_on', note=pitch, velocity=100, time=0))
+        track.append(mido.Message('note_off', note=pitch, velocity=0, time=240))
+    midi.tracks.append(track)
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    midi.save(fname)
+
+def read_wav(fname: str) -> np.ndarray:
+    with wave.open(fname, 'rb') as f:
+        assert (f.getnchannels(), f.getsampwidth(), f.getframerate()) == (1, 2, SAMPLE_RATE)
+        return np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+
+def expected_audio(song: Song) -> np.ndarray:
+    return BatchRenderer.renderer(song, SAMPLE_RATE, 0.25).render()
+
+@pytest.fixture
+def options(tmp_path) -> RenderOptions:
+    return RenderOptions(output_dir=str(tmp_path / "out"), sample_rate=SAMPLE_RATE)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_midi_files_get_buzzers_by_default(tmp_path, options, workers):
+    sources = [str(tmp_path / "in" / f"song{i}.mid") for i in range(3)]
+    for i, fname in enumerate(sources):
+        write_midi(fname, list(range(60, 63 + i)))
+    results = BatchRenderer.render_files(sources, options, workers=workers)
+    assert [result.error for result in results] == [None, None, None]
+    for source, result in zip(sources, results):
+        song = MidiLoader.load_midi_file(source)
+        song.auto_assign_buzzers()
+        audio = read_wav(result.output)
+        assert audio.any()
+        assert np.array_equal(audio[:len(expected_audio(song))], expected_audio(song))
+        assert result.duration_us == len(audio) * 1000000 // SAMPLE_RATE
+
+def test_unassigned_songs_fail_as_silent(tmp_path, options):
+    fname = str(tmp_path / "in" / "song.mid")
+    write_midi(fname, [60, 62])
+    options.assign_buzzers = False
+    result = BatchRenderer.render_file(fname, options)
+    assert result.error == "No notes are assigned to a buzzer, the output would be silent"
+    assert result.output is None and not os.path.exists(BatchRenderer.output_name(fname, options))
+
+def test_song_files_keep_their_buzzers(tmp_path, options):
+    song = make_song([(0, 100000, 69, Buzzer.BUZZER_2), (0, 100000, 72, Buzzer.NONE)])
+    fname = str(tmp_path / "kept.fbsong")
+    SongFile.save(song, fname)
+    os.makedirs(options.output_dir)
+    result = BatchRenderer.render_file(fname, options)
+    assert result.error is None
+    assert np.array_equal(read_wav(result.output), expected_audio(song))
+
+def test_time_limit_removes_the_partial_output(tmp_path, options):
+    fname = str(tmp_path / "in" / "song.mid")
+    write_midi(fname, [60] * 20)
+    os.makedirs(options.output_dir)
+    options.time_limit = 0
+    result = BatchRenderer.render_file(fname, options)
+    assert result.error == "Time limit of 0 s exceeded"
+    assert os.listdir(options.output_dir) == []
+
+def test_command_line(tmp_path, monkeypatch, capsys):
+    write_midi(str(tmp_path / "in" / "song.mid"), [60, 64])
+    out = str(tmp_path / "out")
+    monkeypatch.setattr(sys, 'argv', ["batch_render.py", str(tmp_path / "in"), "-o", out, "-j", "1",
+                                      "-r", str(SAMPLE_RATE)])
+    assert batch_render.main() == 0
+    assert os.listdir(out) == ["song.wav"]
+    monkeypatch.setattr(sys, 'argv', sys.argv + ["--no-assign-buzzers"])
+    assert batch_render.main() == 1
+    assert "the output would be silent" in capsys.readouterr().out
+
+def double(source: str) -> str:
+    if source == "fail":
+        raise ValueError("failed")
+    return source * 2
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_jobs_keep_input_order_and_reject_clashes(workers):
+    progress = []
+    sources = ["a", "b", "A", "c"]
+    results = BatchJobs.run(sources, double, lambda source: [source.lower()],
+                            lambda source, error: f"{source}: {error}", workers=workers,
+                            progress_callback=lambda done, total, result: progress.append((done, total)))
+    assert results == ["aa", "bb", "A: Output name clashes with a", "cc"]
+    assert progress == [(i, 4) for i in range(1, 5)]
+
+def test_batch_jobs_report_a_failed_worker():
+    results = BatchJobs.run(["a", "fail"], double, lambda source: [source], lambda source, error: error, workers=2)
+    assert results == ["aa", "ValueError: failed"]
+
+def test_find_files(tmp_path):
+    for name in ("b.mid", "a.fbsong", "sub/c.MIDI", "notes.txt"):
+        os.makedirs(os.path.dirname(tmp_path / name), exist_ok=True)
+        (tmp_path / name).write_bytes(b'')
+    found = BatchJobs.find_files([str(tmp_path), "given.txt"], ('.mid', '.midi', '.fbsong'))
+    assert found == [str(tmp_path / name) for name in ("a.fbsong", "b.mid", "sub/c.MIDI")] + ["given.txt"]
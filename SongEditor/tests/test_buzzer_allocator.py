@@ -0,0 +1,63 @@
+from buzzer_allocator import AllocationPriority, BuzzerAllocator
+from conftest import make_song
+from song import Buzzer, PLAYABLE_BUZZERS
+
+def test_random_song_has_no_overlaps_after_allocation():
+    song = make_song(seed=9, track_count=3, count=300, start_us=200000, duration_us=(100, 20000),
+                     buzzers=(Buzzer.NONE,))
+    report = song.auto_assign_buzzers(preempt=True)
+    notes = [n for track in song.tracks for n in track.notes]
+    assert song.error_notes_count == 0
+    assigned = [n for n in notes if n.buzzer in PLAYABLE_BUZZERS]
+    assert report.assigned == len(assigned)
+    assert len(assigned) + len(report.unplaced) == len(notes)
+    assert all(n.buzzer is Buzzer.NONE for n in report.unplaced)
+    assert all(n.buzzer in PLAYABLE_BUZZERS for n in report.truncated)
+
+def test_notes_that_fit_are_all_assigned():
+    song = make_song([(0, 1000, 60), (0, 1000, 64), (0, 1000, 67), (1000, 1000, 72), (1000, 1500, 48)])
+    report = song.auto_assign_buzzers()
+    assert report.assigned == 5
+    assert not report.unplaced and not report.truncated
+    assert song.error_notes_count == 0
+
+def test_lowest_pitch_is_left_out_of_a_chord():
+    song = make_song([(0, 1000, 60), (0, 1000, 64), (0, 1000, 67), (0, 1000, 55)])
+    report = song.auto_assign_buzzers()
+    assert [n.pitch for n in report.unplaced] == [55]
+    assert report.assigned == 3
+
+def test_note_lengths_are_kept_by_default():
+    song = make_song([(0, 10000, 40), (0, 10000, 45), (0, 10000, 50), (4000, 1000, 80)])
+    report = song.auto_assign_buzzers()
+    assert [n.pitch for n in report.unplaced] == [80]
+    assert not report.truncated
+    assert [n.duration_us for n in song.tracks[0].notes] == [10000, 10000, 10000, 1000]
+
+def test_higher_note_truncates_the_lowest_holder():
+    song = make_song([(0, 10000, 40), (0, 10000, 45), (0, 10000, 50), (4000, 1000, 80)])
+    report = song.auto_assign_buzzers(preempt=True)
+    low, _, _, high = song.tracks[0].notes
+    assert report.truncated == [low]
+    assert low.duration_us == 4000
+    assert high.buzzer is not Buzzer.NONE
+    assert song.error_notes_count == 0
+
+def test_lower_note_does_not_preempt():
+    song = make_song([(0, 10000, 60), (0, 10000, 64), (0, 10000, 67), (4000, 1000, 40)])
+    report = song.auto_assign_buzzers(preempt=True)
+    assert [n.pitch for n in report.unplaced] == [40]
+    assert not report.truncated
+    assert song.tracks[0].notes[0].duration_us == 10000
+
+def test_priorities_decide_within_a_chord():
+    song = make_song([(0, 1000, 50)], [(0, 1000, 70), (0, 1000, 71), (0, 1000, 72)])
+    allocator = BuzzerAllocator(priorities=(AllocationPriority.PITCH,))
+    report = allocator.allocate(song)
+    assert [n.pitch for n in report.unplaced] == [50]
+
+    # The first track goes first, whatever its pitch.
+    song = make_song([(0, 1000, 50)], [(0, 1000, 70), (0, 1000, 71), (0, 1000, 72)])
+    report = BuzzerAllocator(priorities=(AllocationPriority.TRACK, AllocationPriority.PITCH)).allocate(song)
+    assert [n.pitch for n in report.unplaced] == [70]
+    assert song.tracks[0].notes[0].buzzer is not Buzzer.NONE
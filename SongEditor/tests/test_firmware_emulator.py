@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from conftest import make_song
+from firmware_emulator import FirmwareEmulator, FirmwareNote, FirmwareSong, FirmwareStreamError, LoopLatencyModel
+from funzl_board import FunzlBoard
+from song import Buzzer
+from synth import SquareWaveRenderer
+
+SAMPLE_RATE = 8000
+EXACT = LoopLatencyModel(poll_us=0, tone_us=0, off_us=0)
+
+def test_parses_the_play_command():
+    song = make_song([(0, 1000, 60, Buzzer.BUZZER_1), (2000, 500, 62, Buzzer.BUZZER_1),
+                      (100, 300, 70, Buzzer.BUZZER_3), (0, 100, 50, Buzzer.NONE)])
+    parsed = FirmwareEmulator.parse(FunzlBoard.song_bytes(song))
+    assert not parsed.loop
+    assert parsed.tracks == [[FirmwareNote(0, 1000, 60), FirmwareNote(2000, 2500, 62)], [],
+                             [FirmwareNote(100, 400, 70)]]
+
+@pytest.mark.parametrize('data', [b'', b'\nX', b'S\x01\x00', b'S' + (1).to_bytes(4, 'little') + b'\x00' * 5,
+                                  b'S' + b'\x00' * 12])
+def test_rejects_broken_streams(data):
+    with pytest.raises(FirmwareStreamError):
+        FirmwareEmulator.parse(data)
+
+def test_without_latency_notes_play_on_time():
+    song = make_song([(0, 1000, 60, Buzzer.BUZZER_1), (1000, 1000, 60, Buzzer.BUZZER_1),
+                      (500, 2000, 72, Buzzer.BUZZER_2)])
+    report = FirmwareEmulator.emulate(FunzlBoard.song_bytes(song), EXACT)
+    assert [(n.buzzer, n.on_us, n.off_us, n.frequency) for n in report.notes] == [
+        (0, 0, 1000, 262), (0, 1000, 2000, 262), (1, 500, 2500, 523)]
+    assert report.max_start_error_us == report.max_end_error_us == 0
+    assert report.tone_writes == 3
+    assert not report.late_notes(0) and not report.delayed_notes and not report.silent_notes
+
+def test_latency_delays_the_notes():
+    song = FirmwareSong(tracks=[[FirmwareNote(0, 1000, 60)], [FirmwareNote(0, 1000, 64)], []], loop=False)
+    report = FirmwareEmulator.run(song, LoopLatencyModel(poll_us=0, tone_us=15, off_us=5))
+    # The second buzzer waits for the writes of the first one, which switches off its buzzer a
+    # second time when its player finishes.
+    assert [n.start_error_us for n in report.notes] == [15, 30]
+    assert [n.end_error_us for n in report.notes] == [5, 15]
+    assert report.late_notes(20) == [report.notes[1]]
+
+def test_overlapping_and_empty_notes():
+    song = FirmwareSong(tracks=[[FirmwareNote(0, 1000, 60), FirmwareNote(500, 1500, 62), FirmwareNote(2000, 2000, 64)],
+                                [], []], loop=False)
+    report = FirmwareEmulator.run(song, EXACT)
+    assert report.delayed_notes == [report.notes[1]]
+    assert report.notes[1].on_us == 1000
+    assert report.silent_notes == [report.notes[2]]
+
+def test_jitter_is_reproducible():
+    song = FirmwareSong(tracks=[[FirmwareNote(i * 1000, i * 1000 + 500, 60 + i) for i in range(20)], [], []],
+                        loop=False)
+    latency = LoopLatencyModel(jitter_us=50, seed=3)
+    first = FirmwareEmulator.run(song, latency)
+    assert first.max_start_error_us > 0
+    assert FirmwareEmulator.run(song, latency) == first
+    assert FirmwareEmulator.run(song, LoopLatencyModel(jitter_us=50, seed=4)) != first
+
+def test_exact_emulation_renders_like_the_song():
+    song = make_song([(0, 100000, 69, Buzzer.BUZZER_1), (50000, 100000, 72, Buzzer.BUZZER_2),
+                      (150000, 50000, 64, Buzzer.BUZZER_3)])
+    report = FirmwareEmulator.emulate(FunzlBoard.song_bytes(song), EXACT)
+    emulated = FirmwareEmulator.renderer(report, SAMPLE_RATE).render()
+    assert np.array_equal(emulated, SquareWaveRenderer.from_song(song, SAMPLE_RATE).render())
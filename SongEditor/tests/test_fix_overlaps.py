@@ -0,0 +1,39 @@
+import random
+
+from conftest import make_song
+from song import Buzzer
+
+def test_no_errors_remain():
+    song = make_song(seed=10, track_count=1, count=500, duration_us=(0, 5000), pitch=(60, 61))
+    assert song.error_notes_count > 0
+    starts = {note: note.start_us for note in song.tracks[0].notes}
+    report = song.fix_overlaps()
+    assert song.error_notes_count == 0
+    assert all(note.start_us == start for note, start in starts.items())
+    assert report.truncated and not report.removed
+
+def test_truncates_at_the_next_note_on_the_same_buzzer():
+    song = make_song([(0, 1000, 60, Buzzer.BUZZER_1), (600, 1000, 60, Buzzer.BUZZER_1),
+                      (300, 1000, 60, Buzzer.BUZZER_2), (100, 100, 60, Buzzer.NONE)])
+    first, second, other, unassigned = song.tracks[0].notes
+    report = song.fix_overlaps()
+    assert report.truncated == [first]
+    assert (first.duration_us, second.duration_us, other.duration_us, unassigned.duration_us) == (600, 1000, 1000, 100)
+
+def test_drop_empty_removes_notes_cut_to_nothing():
+    song = make_song([(0, 1000, 60, Buzzer.BUZZER_1), (0, 500, 60, Buzzer.BUZZER_1), (800, 100, 60, Buzzer.BUZZER_1)])
+    # The shorter of the notes starting together comes first and is cut to nothing.
+    long, short, last = song.tracks[0].notes
+    report = song.fix_overlaps(drop_empty=True)
+    assert report.removed == [short]
+    assert song.tracks[0].notes == [long, last]
+    assert long.duration_us == 800
+    assert song.error_notes_count == 0
+
+def test_listeners_are_notified_once():
+    rng = random.Random(11)
+    song = make_song([(rng.randrange(0, 10000), 2000, 60, Buzzer.BUZZER_1) for _ in range(50)])
+    calls = []
+    song.add_change_listener(lambda: calls.append(1))
+    song.fix_overlaps()
+    assert calls == [1]
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+import funzl_board
+from funzl_board import FunzlBoard
+
+class FakeSerial:
+    '''Records the writes to the port instead of sending them.'''
+
+    opened = []
+
+    def __init__(self, port: str, baud_rate: int, timeout: float):
+        self.port = port
+        self.writes = []
+        self.flushed_after = None
+        FakeSerial.opened.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def flush(self):
+        self.flushed_after = len(self.writes)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    FakeSerial.opened = []
+    monkeypatch.setattr(funzl_board, 'time', clock)
+    monkeypatch.setattr(funzl_board.serial, 'Serial', FakeSerial)
+    monkeypatch.setattr(funzl_board.list_ports, 'comports',
+                        lambda: [SimpleNamespace(device='/dev/ttyS0'), SimpleNamespace(device='/dev/ttyACM0')])
+    return clock
+
+def test_no_device(monkeypatch):
+    monkeypatch.setattr(funzl_board.list_ports, 'comports', lambda: [SimpleNamespace(device='/dev/ttyS0')])
+    assert FunzlBoard.send(b'S') == 'No serial USB device found.'
+
+def test_writes_blocks_without_pacing(clock):
+    command = bytes(range(256)) * 10
+    progress = []
+    message = FunzlBoard.send(command, progress.append)
+    ser, = FakeSerial.opened
+    assert ser.port == '/dev/ttyACM0'
+    assert [len(block) for block in ser.writes] == [1024, 1024, 512]
+    assert b''.join(ser.writes) == command
+    assert ser.flushed_after == 3
+    assert clock.sleeps == []
+    assert len(progress) == 3 and progress[-1].startswith('Sending 2560 bytes: 100.00 %')
+    assert message.startswith('Sent 2560 bytes to /dev/ttyACM0')
+
+def test_rx_buffer_size_paces_the_writes(clock):
+    command = bytes(10000)
+    FunzlBoard.send(command, block_size=4096, rx_buffer_size=2000)
+    ser, = FakeSerial.opened
+    assert max(len(block) for block in ser.writes) == 2000
+    assert b''.join(ser.writes) == command
+    # The first buffer full goes out at once, the rest at the baud rate.
+    bytes_per_second = FunzlBoard.BAUD_RATE / 10
+    assert len(clock.sleeps) == 4
+    assert clock.now == pytest.approx((len(command) - 2000) / bytes_per_second)
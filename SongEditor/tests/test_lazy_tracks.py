@@ -0,0 +1,43 @@
+from conftest import make_song
+from song import Buzzer, Song
+from song_file import SongFile
+
+def three_tracks() -> Song:
+    return make_song(*[[(i * 1000, 1500, 50 + t + i % 10, Buzzer(1 + t) if i % 4 else Buzzer.NONE, 60 + i)
+                        for i in range(40)] for t in range(3)])
+
+def materialized(song: Song) -> list[bool]:
+    return [track.is_materialized for track in song.tracks]
+
+def test_opened_song_answers_queries_without_notes(tmp_path):
+    original = three_tracks()
+    for fname in (str(tmp_path / "song.fbsong"), str(tmp_path / "song.json")):
+        SongFile.save(original, fname)
+        song = SongFile.load(fname)
+        assert materialized(song) == [False, False, False]
+        assert song.notes_count == original.notes_count
+        assert song.duration_us == original.duration_us
+        assert song.pitch_range == original.pitch_range
+        assert song.velocity_range == original.velocity_range
+        assert song.buzzer_usage == original.buzzer_usage
+        assert song.error_notes_count == original.error_notes_count > 0
+        assert [song.track_error_notes_count(t) for t in song.tracks] == \
+            [original.track_error_notes_count(t) for t in original.tracks]
+        assert materialized(song) == [False, False, False]
+
+def test_only_the_accessed_track_is_materialized(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(three_tracks(), fname)
+    song = SongFile.load(fname)
+    song.tracks[1].notes[0].pitch = 90
+    assert materialized(song) == [False, True, False]
+    assert song.pitch_range == (50, 90)
+    assert song.tracks[1].columns.pitch[0] == 90
+
+def test_unmaterialized_tracks_serialize_like_materialized_ones(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(three_tracks(), fname)
+    lazy = SongFile.load(fname)
+    assert lazy.to_json() == three_tracks().to_json()
+    assert materialized(lazy) == [False, False, False]
+    assert Song.from_json(lazy.to_json()).to_dict() == three_tracks().to_dict()
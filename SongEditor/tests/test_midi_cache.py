@@ -0,0 +1,81 @@
+import os
+import shutil
+
+import mido
+import pytest
+
+from midi_cache import MidiCache
+from midi_loader import MidiLoader
+
+def write_midi(fname: str, pitch: int):
+    midi = mido.MidiFile(ticks_per_beat=480)
+    midi.tracks.append(mido.MidiTrack([mido.Message('note_on', note=pitch, velocity=100, time=0),
+                                       mido.Message('note_off', note=pitch, velocity=0, time=480)]))
+    midi.save(fname)
+
+@pytest.fixture
+def cache(tmp_path) -> MidiCache:
+    return MidiCache(str(tmp_path / "cache"))
+
+def test_second_import_comes_from_the_cache(tmp_path, cache, monkeypatch):
+    fname = str(tmp_path / "song.mid")
+    write_midi(fname, 60)
+    imported = cache.load(fname)
+    assert len(cache.entries()) == 1
+
+    def fail(*args):
+        raise AssertionError("The MIDI file was imported again")
+    monkeypatch.setattr(MidiLoader, 'load_midi_file', fail)
+    copy = str(tmp_path / "copy.mid")
+    shutil.copy(fname, copy)
+    cached = cache.load(copy)
+    assert cached.name == "copy.mid"
+    assert cached.tracks[0].notes[0].to_dict() == imported.tracks[0].notes[0].to_dict()
+
+def test_key_depends_on_content_and_loader_version(tmp_path, cache, monkeypatch):
+    first, second = str(tmp_path / "first.mid"), str(tmp_path / "second.mid")
+    write_midi(first, 60)
+    write_midi(second, 62)
+    with open(first, 'rb') as f:
+        data = f.read()
+    key = MidiCache.key(data)
+    with open(second, 'rb') as f:
+        assert MidiCache.key(f.read()) != key
+    monkeypatch.setattr(MidiLoader, 'VERSION', MidiLoader.VERSION + 1)
+    assert MidiCache.key(data) != key
+
+def test_unreadable_entry_is_imported_again(tmp_path, cache):
+    fname = str(tmp_path / "song.mid")
+    write_midi(fname, 60)
+    cache.load(fname)
+    entry = cache.entries()[0].path
+    with open(entry, 'rb') as f:
+        data = f.read()
+    for damaged in (b'garbage', data[:20]):
+        with open(entry, 'wb') as f:
+            f.write(damaged)
+        assert cache.load(fname).tracks[0].notes[0].pitch == 60
+        # The entry has been written again.
+        with open(entry, 'rb') as f:
+            assert f.read() == data
+
+def test_least_recently_used_entries_are_evicted(tmp_path, cache):
+    names = []
+    for i in range(4):
+        names.append(str(tmp_path / f"song{i}.mid"))
+        write_midi(names[-1], 60 + i)
+        cache.load(names[-1])
+        path = cache.entries()[-1].path
+        # Distinct modification times, the oldest entry is the least recently used.
+        os.utime(path, (1000 + i, 1000 + i))
+    entry_size = cache.entries()[0].stat().st_size
+    # Using the first entry again makes the second one the oldest.
+    cache.load(names[0])
+    cache.size_limit = 2 * entry_size
+    cache.evict()
+    with open(names[0], 'rb') as f:
+        first = cache._path(MidiCache.key(f.read()))
+    assert len(cache.entries()) == 2
+    assert first in [entry.path for entry in cache.entries()]
+    cache.clear()
+    assert cache.entries() == [] and cache.size() == 0
@@ -0,0 +1,57 @@
+import mido
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from midi_cache import MidiCache
+from midi_import_thread import MidiImportThread
+
+pytestmark = pytest.mark.usefixtures('application')
+
+@pytest.fixture
+def fname(tmp_path) -> str:
+    midi = mido.MidiFile(ticks_per_beat=480)
+    for t in range(2):
+        midi.tracks.append(mido.MidiTrack([mido.Message('note_on', note=60 + t, velocity=100, time=0),
+                                           mido.Message('note_off', note=60 + t, velocity=0, time=480)]))
+    path = str(tmp_path / "song.mid")
+    midi.save(path)
+    return path
+
+def record(thread: MidiImportThread) -> dict[str, list]:
+    signals = {'progress': [], 'imported': [], 'failed': [], 'cancelled': []}
+    thread.progress.connect(lambda *args: signals['progress'].append(args))
+    thread.imported.connect(lambda song: signals['imported'].append(song))
+    thread.failed.connect(lambda error: signals['failed'].append(error))
+    thread.cancelled.connect(lambda: signals['cancelled'].append(True))
+    return signals
+
+def test_emits_progress_and_the_song(tmp_path, fname):
+    thread = MidiImportThread(MidiCache(str(tmp_path / "cache")), fname)
+    signals = record(thread)
+    thread.run()
+    assert [song.notes_count for song in signals['imported']] == [2]
+    assert {args[:2] for args in signals['progress']} == {(0, 2), (1, 2)}
+    assert not signals['failed'] and not signals['cancelled']
+
+def test_cancel_stops_the_import(tmp_path, fname):
+    thread = MidiImportThread(MidiCache(str(tmp_path / "cache")), fname)
+    signals = record(thread)
+    thread.cancel()
+    thread.run()
+    assert signals['cancelled'] == [True]
+    assert not signals['imported'] and not signals['progress']
+
+def test_errors_are_reported(tmp_path):
+    thread = MidiImportThread(MidiCache(str(tmp_path / "cache")), str(tmp_path / "missing.mid"))
+    signals = record(thread)
+    thread.run()
+    assert len(signals['failed']) == 1 and signals['failed'][0].startswith("FileNotFoundError")
+
+def test_runs_in_a_thread(tmp_path, fname):
+    thread = MidiImportThread(MidiCache(str(tmp_path / "cache")), fname)
+    signals = record(thread)
+    thread.start()
+    assert thread.wait(10000)
+    # Queued signals are delivered by the event loop of this thread.
+    QCoreApplication.processEvents()
+    assert len(signals['imported']) == 1
@@ -0,0 +1,57 @@
+import gc
+import weakref
+
+import pytest
+
+from conftest import make_song
+from song import Buzzer, Note
+
+def make_note() -> Note:
+    return make_song([(1000, 500, 69, Buzzer.BUZZER_2)]).tracks[0].notes[0]
+
+def test_note_is_compact():
+    note = make_note()
+    assert not hasattr(note, '__dict__')
+    with pytest.raises(AttributeError):
+        note.comment = "no such field"
+
+def test_buzzer_is_stored_as_index():
+    note = make_note()
+    assert note.buzzer_index == Buzzer.BUZZER_2.value
+    note.buzzer = Buzzer.BUZZER_3
+    assert note.buzzer is Buzzer.BUZZER_3
+    assert note.buzzer_index == 3
+    assert note.end_us == 1500
+    assert note.frequency == 440.0
+    assert note.to_dict() == {'start_us': 1000, 'duration_us': 500, 'pitch': 69, 'velocity': 100, 'buzzer': 'BUZZER_3'}
+
+def test_listener_set_is_created_lazily():
+    note = make_note()
+    calls = []
+    listener = lambda: calls.append(note.pitch)
+    assert note._listeners is None
+    note.add_change_listener(listener)
+    note.pitch = 70
+    assert calls == [70]
+    note.remove_change_listener(listener)
+    assert note._listeners is None
+    note.pitch = 71
+    assert calls == [70]
+    # Removing a listener that was never added is allowed.
+    note.remove_change_listener(listener)
+
+def test_listeners_do_not_keep_notes_alive():
+    class Listener:
+        def __call__(self):
+            pass
+
+    note = make_note()
+    listener = Listener()
+    note.add_change_listener(listener)
+    alive = weakref.ref(listener)
+    del listener
+    note.track.song.tracks.clear()
+    note.track.notes = []
+    del note
+    gc.collect()
+    assert alive() is None
@@ -0,0 +1,42 @@
+import numpy as np
+
+from conftest import make_song
+from note_columns import NoteColumns
+from song import Buzzer, Track
+
+def make_track() -> Track:
+    return make_song([(i * 1000, 500 + i, 60 + i, (Buzzer.NONE, Buzzer.BUZZER_1, Buzzer.BUZZER_3)[i % 3], 100 - i)
+                      for i in range(10)]).tracks[0]
+
+def test_columns_round_trip_the_notes():
+    track = make_track()
+    columns = NoteColumns.from_notes(track.notes)
+    assert columns.start_us.dtype == NoteColumns.TIME_DTYPE
+    assert columns.pitch.dtype == NoteColumns.VALUE_DTYPE
+    notes = columns.to_notes(track)
+    assert [n.to_dict() for n in notes] == [n.to_dict() for n in track.notes]
+    assert columns.to_dicts() == [n.to_dict() for n in track.notes]
+    assert np.array_equal(columns.end_us, [n.end_us for n in track.notes])
+
+def test_columns_follow_note_changes():
+    track = make_track()
+    assert track.columns.pitch[3] == 63
+    track.notes[3].pitch = 70
+    track.notes[4].buzzer = Buzzer.BUZZER_2
+    assert track.columns.pitch[3] == 70
+    assert track.columns.buzzer[4] == Buzzer.BUZZER_2.value
+
+def test_track_from_columns_creates_notes_on_first_access():
+    columns = NoteColumns.from_notes(make_track().notes)
+    track = Track.from_columns("Columns", columns, None)
+    assert not track.is_materialized
+    assert track.notes_count == 10
+    assert track.duration_us == 9000 + 509
+    assert not track.is_materialized
+    assert track.notes[9].buzzer == Buzzer.NONE
+    assert track.is_materialized
+
+def test_empty_columns():
+    columns = NoteColumns.empty()
+    assert len(columns) == 0
+    assert columns.to_notes(Track("Empty", [], None)) == []
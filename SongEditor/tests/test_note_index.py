@@ -0,0 +1,51 @@
+import random
+
+from conftest import make_song
+from note_index import NoteIndex
+from song import Buzzer, Note, Song
+
+def random_song(seed: int) -> Song:
+    song = make_song(seed=seed, count=300, duration_us=(1, 8000), pitch=(40, 80), buzzers=(Buzzer.NONE,))
+    # Every other note is empty, those have their own rules.
+    for track in song.tracks:
+        for note in track.notes[::2]:
+            note.duration_us = 0
+    return song
+
+def expected_range(notes, start_us, end_us, min_pitch=None, max_pitch=None) -> list[Note]:
+    return sorted((n for n in notes
+                   if n.start_us < end_us and (n.end_us > start_us or (n.duration_us == 0 and n.start_us >= start_us))
+                   and (min_pitch is None or n.pitch >= min_pitch) and (max_pitch is None or n.pitch <= max_pitch)),
+                  key=NoteIndex.sort_key)
+
+def keys(notes) -> list[tuple]:
+    return [NoteIndex.sort_key(n) for n in notes]
+
+def test_range_queries_match_a_scan():
+    rng = random.Random(6)
+    song = random_song(6)
+    track = song.tracks[0]
+    for _ in range(100):
+        start = rng.randrange(-1000, 110000)
+        end = start + rng.randrange(0, 20000)
+        assert keys(track.notes_in_range(start, end)) == keys(expected_range(track.notes, start, end))
+        assert keys(track.notes_in_range(start, end, 50, 60)) == keys(expected_range(track.notes, start, end, 50, 60))
+
+def test_index_follows_edits_and_removals():
+    rng = random.Random(7)
+    song = random_song(7)
+    track = song.tracks[1]
+    track.notes_in_range(0, 1)
+    for _ in range(200):
+        note = rng.choice(track.notes)
+        note.start_us = rng.randrange(0, 100000)
+        note.duration_us = rng.randrange(0, 30000)
+    track.remove_notes(track.notes[:50])
+    assert keys(track.notes_in_range(20000, 40000)) == keys(expected_range(track.notes, 20000, 40000))
+    assert keys(track.index) == sorted(keys(track.notes))
+
+def test_song_merges_the_tracks_in_order():
+    song = random_song(8)
+    notes = [n for track in song.tracks for n in track.notes]
+    assert keys(song.all_notes) == sorted(keys(notes))
+    assert keys(song.notes_in_range(30000, 35000)) == keys(expected_range(notes, 30000, 35000))
@@ -0,0 +1,50 @@
+import random
+
+from conftest import make_song
+from song import Buzzer, Note, PLAYABLE_BUZZERS, Song
+
+def random_song(seed: int) -> Song:
+    return make_song(seed=seed, count=200, pitch=(60, 61))
+
+def expected_errors(song: Song) -> set[Note]:
+    '''Pairwise check: the later of two notes on the same buzzer starts before the earlier one ends.'''
+    errors = set()
+    for buzzer in PLAYABLE_BUZZERS:
+        lane = sorted((n for track in song.tracks for n in track.notes if n.buzzer == buzzer),
+                      key=lambda n: (n.start_us, n.end_us))
+        for i, first in enumerate(lane):
+            for second in lane[i + 1:]:
+                if second.start_us >= first.end_us:
+                    break
+                errors.update((first, second))
+    return errors
+
+def test_column_masks_match_pairwise_check():
+    song = random_song(1)
+    expected = expected_errors(song)
+    assert song.error_notes_count == len(expected)
+    for track in song.tracks:
+        assert song.track_error_notes_count(track) == len(expected & set(track.notes))
+        assert track.error_notes == expected & set(track.notes)
+
+def test_index_matches_pairwise_check_after_edits():
+    rng = random.Random(2)
+    song = random_song(2)
+    assert song.error_notes == expected_errors(song)
+    for _ in range(200):
+        note = rng.choice(rng.choice(song.tracks).notes)
+        field = rng.choice(('start_us', 'duration_us', 'buzzer'))
+        if field == 'buzzer':
+            note.buzzer = rng.choice(tuple(Buzzer))
+        else:
+            setattr(note, field, rng.randrange(0, 3000) if field == 'duration_us' else rng.randrange(0, 100000))
+        assert song.error_notes == expected_errors(song)
+    assert song.error_notes_count == len(expected_errors(song))
+
+def test_removed_notes_clear_their_conflicts():
+    song = make_song([(0, 1000, 60, Buzzer.BUZZER_1), (500, 1000, 62, Buzzer.BUZZER_1), (500, 1000, 64, Buzzer.BUZZER_2)])
+    track = song.tracks[0]
+    assert song.error_notes == set(track.notes[:2])
+    track.remove_notes([track.notes[1]])
+    assert song.error_notes == set()
+    assert song.error_notes_count == 0
@@ -0,0 +1,69 @@
+import random
+
+import mido
+import pytest
+
+from midi_loader import MidiLoader
+from smf_reader import SmfError, SmfReader
+
+def random_midi(seed: int, file_format: int = 1) -> mido.MidiFile:
+    rng = random.Random(seed)
+    midi = mido.MidiFile(type=file_format, ticks_per_beat=rng.choice((96, 480, 960)))
+    for t in range(3):
+        track = mido.MidiTrack([mido.MetaMessage('track_name', name=f"Track {t}")])
+        for _ in range(300):
+            time = rng.randrange(0, 200)
+            kind = rng.random()
+            channel = rng.randrange(16)
+            if kind < 0.4:
+                track.append(mido.Message('note_on', note=rng.randrange(30, 90), velocity=rng.randrange(1, 128),
+                                          channel=channel, time=time))
+            elif kind < 0.6:
+                track.append(mido.Message('note_on', note=rng.randrange(30, 90), velocity=0, channel=channel, time=time))
+            elif kind < 0.8:
+                track.append(mido.Message('note_off', note=rng.randrange(30, 90), channel=channel, time=time))
+            elif kind < 0.85:
+                track.append(mido.MetaMessage('set_tempo', tempo=rng.randrange(200000, 1000000), time=time))
+            elif kind < 0.9:
+                track.append(mido.Message('control_change', control=7, value=100, channel=channel, time=time))
+            elif kind < 0.95:
+                track.append(mido.Message('sysex', data=[1, 2, 3], time=time))
+            else:
+                track.append(mido.Message('pitchwheel', pitch=rng.randrange(-8192, 8191), channel=channel, time=time))
+        midi.tracks.append(track)
+    return midi
+
+@pytest.mark.parametrize('file_format', [0, 1, 2])
+def test_fast_reader_matches_mido(tmp_path, file_format):
+    for seed in range(3):
+        fname = str(tmp_path / f"song{seed}.mid")
+        midi = random_midi(seed, file_format)
+        if file_format == 0:
+            midi.tracks = [mido.merge_tracks(midi.tracks)]
+        midi.save(fname)
+        fast = MidiLoader.load_midi_file(fname)
+        reference = MidiLoader.load_midi_file_mido(fname)
+        assert fast.to_dict() == reference.to_dict()
+
+def test_reports_progress(tmp_path):
+    fname = str(tmp_path / "song.mid")
+    random_midi(4).save(fname)
+    calls = []
+    SmfReader.read(fname, lambda track, count, messages: calls.append((track, count)))
+    assert calls and {count for _, count in calls} == {3}
+
+def test_rejects_files_it_cannot_read():
+    with pytest.raises(SmfError):
+        SmfReader.parse(b'RIFF\x00\x00\x00\x06')
+    with pytest.raises(SmfError):
+        SmfReader.parse(b'MThd\x00\x00\x00\x06\x00\x01\x00\x01\x00\x60MTrk\x00\x00\x01\x00\x00\x90')
+
+def test_falls_back_to_mido_for_unsupported_files(tmp_path):
+    midi = random_midi(5)
+    fname = str(tmp_path / "song.mid")
+    midi.save(fname)
+    with open(fname, 'r+b') as f:
+        # SMPTE division, 25 frames per second with 40 ticks per frame.
+        f.seek(12)
+        f.write(bytes((0xE7, 40)))
+    assert MidiLoader.load_midi_file(fname).to_dict() == MidiLoader.load_midi_file_mido(fname).to_dict()
@@ -0,0 +1,66 @@
+from conftest import make_song
+from song import Buzzer, Song
+
+def ten_notes() -> Song:
+    return make_song([(i * 1000, 500, 60) for i in range(10)])
+
+def listen(song: Song) -> list[str]:
+    calls = []
+    song.add_change_listener(lambda: calls.append('song'))
+    song.tracks[0].add_change_listener(lambda: calls.append('track'))
+    song.tracks[0].notes[0].add_change_listener(lambda: calls.append('note'))
+    return calls
+
+def test_batch_notifies_once_at_the_end():
+    song = ten_notes()
+    calls = listen(song)
+    with song.batch():
+        for note in song.tracks[0].notes:
+            note.buzzer = Buzzer.BUZZER_1
+            note.pitch = 70
+        assert calls == []
+    assert sorted(calls) == ['note', 'song', 'track']
+    assert song.buzzer_usage[Buzzer.BUZZER_1] == 10
+    assert song.pitch_range == (70, 70)
+
+def test_nested_batches_notify_when_the_outermost_ends():
+    song = ten_notes()
+    calls = listen(song)
+    with song.batch():
+        with song.batch():
+            song.tracks[0].notes[0].velocity = 50
+        assert calls == []
+    assert sorted(calls) == ['note', 'song', 'track']
+
+def test_listeners_see_the_committed_song():
+    song = ten_notes()
+    seen = []
+    note = song.tracks[0].notes[0]
+    note.add_change_listener(lambda: seen.append((song.duration_us, song.error_notes_count)))
+    with song.batch():
+        note.duration_us = 20000
+    # The note overlaps the others, but none of them is on a buzzer yet.
+    assert seen == [(20000, 0)]
+    with song.batch():
+        for n in song.tracks[0].notes[:2]:
+            n.buzzer = Buzzer.BUZZER_2
+    assert seen[-1] == (20000, 2)
+
+def test_batch_commits_when_an_exception_is_raised():
+    song = ten_notes()
+    calls = listen(song)
+    try:
+        with song.batch():
+            song.tracks[0].notes[0].pitch = 80
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+    assert sorted(calls) == ['note', 'song', 'track']
+    assert song.pitch_range == (60, 80)
+
+def test_empty_batch_does_not_notify():
+    song = ten_notes()
+    calls = listen(song)
+    with song.batch():
+        pass
+    assert calls == []
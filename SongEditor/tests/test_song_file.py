@@ -0,0 +1,61 @@
+import os
+
+from conftest import make_song
+from song import Buzzer, Song
+from song_file import SongFile
+
+def melody_and_bass() -> Song:
+    return make_song([(i * 1000, 800, 60 + i % 12, Buzzer.BUZZER_1, 100 - i) for i in range(20)],
+                     [(i * 4000, 3000, 36, Buzzer.NONE, 80) for i in range(5)], names=["Melody", "Bass"])
+
+def note_tuples(song: Song) -> list:
+    return [(track.name, [(n.start_us, n.duration_us, n.pitch, n.velocity, n.buzzer) for n in track.notes])
+            for track in song.tracks]
+
+def test_binary_round_trip(tmp_path):
+    song = melody_and_bass()
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(song, fname)
+    assert SongFile.is_binary(fname)
+    loaded = SongFile.load(fname)
+    assert loaded.name == song.name
+    assert note_tuples(loaded) == note_tuples(song)
+
+def test_json_round_trip(tmp_path):
+    song = melody_and_bass()
+    fname = str(tmp_path / "song.json")
+    SongFile.save(song, fname)
+    assert not SongFile.is_binary(fname)
+    assert note_tuples(SongFile.load(fname)) == note_tuples(song)
+
+def test_summary_is_stored_with_the_tracks(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(melody_and_bass(), fname)
+    loaded = SongFile.load(fname)
+    melody = loaded.tracks[0]
+    assert melody._notes is None
+    assert (melody.min_pitch, melody.max_pitch) == (60, 71)
+    assert melody._notes is None
+
+def test_save_over_the_loaded_file(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(melody_and_bass(), fname)
+    loaded = SongFile.load(fname)
+    # The tracks are still unmaterialized, saving reads the columns of the file being replaced.
+    SongFile.save(loaded, fname)
+    reloaded = SongFile.load(fname)
+    assert note_tuples(reloaded) == note_tuples(melody_and_bass())
+
+def test_loaded_song_does_not_change_when_the_file_is_saved_again(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(melody_and_bass(), fname)
+    loaded = SongFile.load(fname)
+    assert loaded._mapped_file is not None
+    SongFile.save(Song(name="Other", tracks=[]), fname)
+    assert note_tuples(loaded) == note_tuples(melody_and_bass())
+
+def test_save_keeps_no_temporary_files(tmp_path):
+    fname = str(tmp_path / "song.fbsong")
+    SongFile.save(melody_and_bass(), fname)
+    SongFile.save(melody_and_bass(), fname)
+    assert os.listdir(tmp_path) == ["song.fbsong"]
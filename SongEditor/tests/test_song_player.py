@@ -0,0 +1,273 @@
+import functools
+import multiprocessing
+import os
+import time
+import wave
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from conftest import make_song
+from song import Buzzer, Song
+from song_player import AudioSink, BufferedPlayer, NullSink, Player, RingBuffer, StreamingPlayer, WaveFileSink
+from synth import SquareWaveRenderer
+
+def steps(count: int = 5, step_us: int = 100000) -> Song:
+    '''A note every step, cycling through the buzzers.'''
+    return make_song([(i * step_us, step_us * 9 // 10, 60 + i % 12, Buzzer(1 + i % 3)) for i in range(count)])
+
+class RecordingSink(AudioSink):
+    '''Keeps every block, on_write is called after each write with the number of samples so far.'''
+
+    def __init__(self, sample_rate: int, on_write=None):
+        super().__init__(sample_rate)
+        self.blocks = []
+        self.on_write = on_write
+
+    @property
+    def samples(self) -> np.ndarray:
+        return np.concatenate(self.blocks) if self.blocks else np.zeros(0, dtype=np.int16)
+
+    def write(self, samples: np.ndarray):
+        self.blocks.append(samples.copy())
+        if self.on_write:
+            self.on_write(sum(len(block) for block in self.blocks))
+
+class BufferSink(AudioSink):
+    '''Non-streaming sink that only records the buffers it is started with.'''
+
+    streaming = False
+
+    def __init__(self, sample_rate: int):
+        super().__init__(sample_rate)
+        self.buffers = []
+        self.stops = 0
+
+    def start(self, samples: np.ndarray):
+        self.buffers.append(samples.copy())
+
+    def stop(self):
+        self.stops += 1
+
+def make_renderer() -> SquareWaveRenderer:
+    return SquareWaveRenderer.from_song(steps(count=8, step_us=50000), 8000)
+
+@pytest.fixture
+def player():
+    player = Player(functools.partial(NullSink, realtime=True))
+    yield player
+    player.shutdown()
+
+def cpu_seconds(pid: int) -> float:
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def test_playback_finishes_with_stats(player):
+    player.load(steps())
+    started = time.monotonic()
+    player.play()
+    stats = player.output_stats(timeout=5)
+    elapsed = time.monotonic() - started
+    assert stats is not None
+    assert 0.4 < elapsed < 2
+    assert stats.writes > 0
+    assert not player.is_playing
+
+def test_stopped_playback_reports_its_own_stats(player):
+    player.load(steps(count=50))
+    player.play()
+    time.sleep(0.2)
+    player.stop()
+    first = player.output_stats(timeout=5)
+    assert first is not None and first.writes > 0
+    player.play()
+    assert player.stats is None
+    player.stop()
+    assert player.output_stats(timeout=5) is not first
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason="Needs /proc to measure the CPU time")
+def test_worker_does_not_spin_while_playing(player):
+    # A note every millisecond, a scheduler spinning before every event would keep a core busy.
+    player.load(steps(count=1000, step_us=1000))
+    player.play()
+    before = cpu_seconds(player._process.pid)
+    assert player.output_stats(timeout=5) is not None
+    assert cpu_seconds(player._process.pid) - before < 0.3
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(8)
+    buffer.write(np.arange(6, dtype=np.int16))
+    assert buffer.read(4).tolist() == [0, 1, 2, 3]
+    buffer.write(np.arange(6, 12, dtype=np.int16))
+    assert (buffer.available, buffer.free) == (8, 0)
+    assert buffer.read(100).tolist() == list(range(4, 12))
+    buffer.write(np.arange(3, dtype=np.int16))
+    buffer.clear()
+    assert buffer.available == 0 and buffer.read(4).tolist() == []
+
+def test_stream_plays_the_whole_song_in_chunks():
+    renderer = make_renderer()
+    sink = RecordingSink(renderer.sample_rate)
+    stream = StreamingPlayer(renderer, sink, chunk_samples=256, buffer_chunks=2)
+    stream.play()
+    assert stream.wait(5)
+    stream.close()
+    assert max(len(block) for block in sink.blocks) == 256
+    assert np.array_equal(sink.samples, renderer.render())
+    assert stream.position == renderer.sample_count
+
+def test_pause_and_resume_lose_no_samples():
+    renderer = make_renderer()
+    paused = []
+    def pause_once(written: int):
+        if not paused:
+            paused.append(written)
+            stream.pause()
+    sink = RecordingSink(renderer.sample_rate, pause_once)
+    stream = StreamingPlayer(renderer, sink, chunk_samples=256)
+    stream.play()
+    time.sleep(0.1)
+    assert len(sink.blocks) == 1 and not stream.is_playing
+    stream.play()
+    assert stream.wait(5)
+    stream.close()
+    assert np.array_equal(sink.samples, renderer.render())
+
+def test_seek_and_loop():
+    renderer = make_renderer()
+    stream = StreamingPlayer(renderer, RecordingSink(renderer.sample_rate), chunk_samples=100)
+    stream.seek(1000)
+    stream.play()
+    assert stream.wait(5)
+    stream.close()
+    assert np.array_equal(stream.sink.samples, renderer.render(1000, renderer.sample_count - 1000))
+
+    sink = RecordingSink(renderer.sample_rate, lambda written: written >= 2000 and stream.pause())
+    stream = StreamingPlayer(renderer, sink, chunk_samples=100)
+    stream.set_loop(True, 200, 700)
+    stream.seek(200)
+    stream.play()
+    assert not stream.wait(0.3)
+    stream.close()
+    samples = sink.samples
+    loop = renderer.render(200, 500)
+    assert len(samples) >= 2000
+    assert np.array_equal(samples[:2000], np.tile(loop, 4))
+
+def test_buffered_player_hands_over_the_rest_of_the_song():
+    renderer = make_renderer()
+    finished = []
+    stream = BufferedPlayer(renderer, BufferSink(renderer.sample_rate), on_finished=lambda: finished.append(1))
+    stream.seek(1000)
+    stream.play()
+    assert np.array_equal(stream.sink.buffers[0], renderer.render(1000, renderer.sample_count - 1000))
+    stream.seek(2000)
+    assert np.array_equal(stream.sink.buffers[1], renderer.render(2000, renderer.sample_count - 2000))
+    assert stream.wait(5)
+    assert finished == [1]
+    assert stream.position == renderer.sample_count
+    stream.close()
+
+def test_worker_uses_a_buffered_player_for_non_streaming_sinks():
+    player = Player(BufferSink)
+    try:
+        player.load(steps())
+        player.play()
+        assert player.output_stats(timeout=5) is not None
+    finally:
+        player.shutdown()
+
+def test_loaded_song_reaches_the_worker_intact(tmp_path):
+    # Two tracks whose notes interleave, the worker gets them as one array sorted by start time.
+    song = make_song([(i * 40000, 36000, 60 + i, Buzzer(1 + i % 3)) for i in range(6)],
+                     [(20000 + i * 40000, 30000, 70 + i, Buzzer.BUZZER_3) for i in range(6)])
+    fname = str(tmp_path / "preview.wav")
+    player = Player(functools.partial(WaveFileSink, fname))
+    try:
+        player.load(song)
+        player.play()
+        assert player.output_stats(timeout=5) is not None
+    finally:
+        player.shutdown()
+    with wave.open(fname, 'rb') as f:
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+    expected = SquareWaveRenderer.from_song(song).render()
+    assert len(samples) >= len(expected) > 0
+    assert np.array_equal(samples[:len(expected)], expected)
+
+def test_shared_memory_is_released(player):
+    player.load(steps())
+    name = next(iter(player._shared_memory))
+    deadline = time.monotonic() + 5
+    while player._shared_memory and time.monotonic() < deadline:
+        player._handle_replies(timeout=0.05)
+    assert not player._shared_memory
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+    # Blocks the worker has not confirmed yet are released by shutdown.
+    player.stop()
+    player.load(steps())
+    name = next(iter(player._shared_memory))
+    player.shutdown()
+    assert not player._shared_memory
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+def test_one_worker_serves_every_preview(player):
+    player.load(steps(count=2))
+    pid = player._process.pid
+    for count in (2, 3, 4):
+        player.load(steps(count=count, step_us=50000))
+        player.play()
+        assert player.output_stats(timeout=5) is not None
+        assert player._process.pid == pid
+    assert multiprocessing.active_children() == [player._process]
+    player.shutdown()
+    assert player._process is None
+    assert multiprocessing.active_children() == []
+
+def wait_for_position(player, timeout: float = 5) -> int | None:
+    deadline = time.monotonic() + timeout
+    while (position := player.position_us()) in (None, 0) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return position
+
+def test_position_follows_the_playback(player):
+    player.load(steps(count=10))
+    assert player.position_us() is None
+    player.play()
+    first = wait_for_position(player)
+    time.sleep(0.1)
+    second = player.position_us()
+    assert 0 < first < second < 1000000
+
+    player.pause()
+    time.sleep(0.1)
+    paused = player.position_us()
+    time.sleep(0.1)
+    assert player.position_us() == paused
+
+    player.seek(700000)
+    time.sleep(0.1)
+    assert 700000 <= player.position_us() < 750000
+    player.resume()
+    time.sleep(0.1)
+    assert player.position_us() > 750000
+
+    player.stop()
+    time.sleep(0.1)
+    assert player.position_us() is None
+
+def test_position_ends_with_the_song(player):
+    player.load(steps())
+    player.play()
+    assert wait_for_position(player) is not None
+    assert player.output_stats(timeout=5) is not None
+    # The worker clears the playhead right after sending the stats.
+    deadline = time.monotonic() + 1
+    while player.position_us() is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert player.position_us() is None
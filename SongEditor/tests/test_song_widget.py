@@ -0,0 +1,29 @@
+from PySide6.QtCore import QPoint, QRectF
+from PySide6.QtTest import QTest
+
+from config import Config
+from conftest import make_song
+from song_widget import SongWidget
+
+def make_widget(application, song) -> SongWidget:
+    widget = SongWidget()
+    widget.resize(800, 400)
+    widget.set_song(song)
+    widget.show()
+    application.processEvents()
+    return widget
+
+def test_selection_frame_reaches_past_the_view(application):
+    # A note every second, at 100 pixels per second only the first eight are in view.
+    song = make_song([(i * 1000000, 500000, 60 + i % 5) for i in range(100)])
+    widget = make_widget(application, song)
+    notes = song.tracks[0].notes
+    assert widget._notes_in_frame(QRectF(0, 0, 250, 2000)) == notes[:3]
+    assert widget._notes_in_frame(QRectF(0, 0, 20000, 2000)) == notes
+
+    selected = []
+    widget.note_selection_changed.connect(selected.append)
+    QTest.mousePress(widget, Config.SELECT_MOUSE_BUTTON, pos=QPoint(1, 1))
+    QTest.mouseMove(widget, QPoint(400, 300))
+    QTest.mouseRelease(widget, Config.SELECT_MOUSE_BUTTON, pos=QPoint(20000, 2000))
+    assert selected == [notes]
@@ -0,0 +1,101 @@
+import numpy as np
+
+from conftest import make_song
+from song import Buzzer, Song
+from synth import BuzzerLane, SquareWaveRenderer, WaveformCache
+
+SAMPLE_RATE = 8000
+
+def from_columns(song: Song, **kwargs) -> SquareWaveRenderer:
+    columns = song.tracks[0].columns
+    return SquareWaveRenderer.from_arrays(columns.start_us, columns.end_us, columns.pitch, columns.buzzer,
+                                          SAMPLE_RATE, **kwargs)
+
+def test_single_note_is_a_square_wave():
+    # Pitch 69 is 440 Hz, a tenth of a second starting at 0.1 s.
+    renderer = SquareWaveRenderer.from_song(make_song([(100000, 100000, 69, Buzzer.BUZZER_1)]), SAMPLE_RATE, volume=0.5)
+    audio = renderer.render()
+    assert renderer.sample_count == len(audio) == 1600
+    assert not audio[:800].any()
+    note = audio[800:]
+    assert set(note.tolist()) == {16383, -16383}
+    assert note[0] > 0
+    rising_edges = np.count_nonzero((note[1:] > 0) & (note[:-1] < 0))
+    assert rising_edges in (43, 44)
+
+def test_notes_without_buzzer_are_silent():
+    renderer = SquareWaveRenderer.from_song(make_song([(0, 100000, 69, Buzzer.NONE)]), SAMPLE_RATE)
+    assert renderer.sample_count == 0
+    assert len(renderer.render()) == 0
+
+def test_song_and_columns_render_the_same():
+    song = make_song(seed=13, track_count=1, count=200, start_us=2000000, duration_us=(1000, 300000),
+                     pitch=(30, 100))
+    expected = SquareWaveRenderer.from_song(song, SAMPLE_RATE).render()
+    assert np.array_equal(from_columns(song).render(), expected)
+
+def test_ranges_and_blocks_render_like_the_whole_song(monkeypatch):
+    song = make_song(seed=14, track_count=1, count=100, start_us=2000000, duration_us=(1000, 300000),
+                     pitch=(30, 100), buzzers=(Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3))
+    whole = from_columns(song).render()
+    for start, count in ((0, 1), (123, 4567), (len(whole) - 10, 100)):
+        part = from_columns(song).render(start, count)
+        assert len(part) == count
+        assert np.array_equal(part[:max(len(whole) - start, 0)], whole[start:start + count])
+        assert not part[len(whole) - start:].any()
+    monkeypatch.setattr(SquareWaveRenderer, 'BLOCK_SAMPLES', 1000)
+    assert np.array_equal(from_columns(song).render(), whole)
+
+def test_a_buzzer_plays_one_note_at_a_time():
+    # The second note only starts when the first has ended, like on the board.
+    lane = BuzzerLane.from_arrays(np.array([0, 50000]), np.array([100000, 120000]), np.array([69, 72]), SAMPLE_RATE)
+    assert lane.starts.tolist() == [0, 800]
+    assert lane.ends.tolist() == [800, 960]
+    assert lane.frequencies.tolist() == [440, 523]
+
+def test_buzzers_are_mixed_and_clipped():
+    notes = [(0, 100000, 69, buzzer) for buzzer in (Buzzer.BUZZER_1, Buzzer.BUZZER_2, Buzzer.BUZZER_3)]
+    audio = SquareWaveRenderer.from_song(make_song(notes), SAMPLE_RATE, volume=0.25).render()
+    assert audio.max() == int(0.75 * 32767)
+    audio = SquareWaveRenderer.from_song(make_song(notes), SAMPLE_RATE, volume=0.5).render()
+    assert audio.max() == 32767 and audio.min() == -32767
+
+def test_empty_song():
+    renderer = SquareWaveRenderer.from_arrays(*(np.array([], dtype=np.int64),) * 4, SAMPLE_RATE)
+    assert renderer.sample_count == 0
+    assert renderer.render(0, 10).tolist() == [0] * 10
+
+def square_wave(frequency: int, offset: int, length: int) -> np.ndarray:
+    phases = np.arange(offset, offset + length, dtype=np.int64) * frequency % SAMPLE_RATE
+    return np.where(2 * phases < SAMPLE_RATE, 1, -1)
+
+def test_waveform_cache_returns_the_square_wave_at_any_offset():
+    cache = WaveformCache(SAMPLE_RATE)
+    for frequency, offset, length in ((440, 0, 100), (440, 12345, 1000), (523, 7, WaveformCache.TILE_SAMPLES * 3),
+                                      (3, 100000, 5000)):
+        assert np.array_equal(cache.get(frequency, offset, length), square_wave(frequency, offset, length))
+    assert (cache.misses, cache.hits, len(cache)) == (3, 1, 3)
+
+def test_waveform_cache_short_ranges_are_views_into_the_tile():
+    cache = WaveformCache(SAMPLE_RATE)
+    first = cache.get(440, 0, 100)
+    assert first.base is not None
+    assert np.shares_memory(cache.get(440, 200, 100), first)
+
+def test_waveform_cache_evicts_the_least_recently_used_tile():
+    # 360, 440 and 680 Hz all repeat every 200 samples at 8 kHz, so their tiles have the same size.
+    cache = WaveformCache(SAMPLE_RATE)
+    cache.get(440, 0, 1)
+    cache.memory_limit = 2 * cache.memory
+    cache.clear()
+    for frequency in (440, 360, 440, 680):
+        cache.get(frequency, 0, 10)
+    assert cache.evictions == 1 and len(cache) == 2
+    assert cache.memory == cache.memory_limit
+    hits = cache.hits
+    cache.get(440, 0, 10)
+    assert cache.hits == hits + 1
+    cache.get(360, 0, 10)
+    assert cache.evictions == 2
+    cache.clear()
+    assert (cache.hits, cache.misses, cache.evictions, cache.memory, len(cache)) == (0, 0, 0, 0, 0)
@@ -0,0 +1,48 @@
+import random
+
+import mido
+import numpy as np
+
+from midi_loader import MidiLoader, TempoMap
+
+def naive_microseconds(changes: list[tuple[int, int]], ticks_per_beat: int, ticks: int) -> int:
+    '''Walks all changes up to the tick, the way the tempo was applied before the tempo map.'''
+    tempos = {0: TempoMap.DEFAULT_TEMPO}
+    for tick, tempo in changes:
+        tempos[tick] = tempo
+    elapsed = 0
+    position = 0
+    tempo = tempos[0]
+    for tick in sorted(tempos):
+        if tick > ticks:
+            break
+        elapsed += (tick - position) * tempo // ticks_per_beat
+        position, tempo = tick, tempos[tick]
+    return elapsed + (ticks - position) * tempo // ticks_per_beat
+
+def test_lookups_match_a_walk_over_all_changes():
+    rng = random.Random(12)
+    changes = [(rng.randrange(0, 100000), rng.randrange(200000, 1500000)) for _ in range(200)]
+    tempo_map = TempoMap(changes, 480)
+    ticks = [rng.randrange(0, 120000) for _ in range(500)] + [tick for tick, _ in changes]
+    expected = [naive_microseconds(changes, 480, tick) for tick in ticks]
+    assert [tempo_map.ticks_to_microseconds(tick) for tick in ticks] == expected
+    assert tempo_map.ticks_to_microseconds_array(np.array(ticks, dtype=np.int64)).tolist() == expected
+
+def test_last_change_at_the_same_tick_wins():
+    tempo_map = TempoMap([(0, 1000000), (480, 250000), (480, 2000000)], 480)
+    assert len(tempo_map) == 2
+    assert tempo_map.ticks_to_microseconds(480) == 1000000
+    assert tempo_map.ticks_to_microseconds(960) == 3000000
+
+def test_tempo_of_format_1_applies_to_all_tracks(tmp_path):
+    midi = mido.MidiFile(type=1, ticks_per_beat=480)
+    conductor = mido.MidiTrack([mido.MetaMessage('set_tempo', tempo=250000, time=480)])
+    notes = mido.MidiTrack([mido.Message('note_on', note=60, velocity=90, time=960),
+                            mido.Message('note_off', note=60, velocity=0, time=480)])
+    midi.tracks += [conductor, notes]
+    fname = str(tmp_path / "tempo.mid")
+    midi.save(fname)
+    for load in (MidiLoader.load_midi_file, MidiLoader.load_midi_file_mido):
+        note = load(fname).tracks[0].notes[0]
+        assert (note.start_us, note.duration_us) == (500000 + 250000, 250000)